@@ -0,0 +1,5 @@
+"""
+Benchmarks of tapestry hot paths. Run them from repository root, for example:
+
+    python3 -m benchmarks.decode
+"""
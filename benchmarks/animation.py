@@ -0,0 +1,157 @@
+"""
+Measure playback of long animated GIF in gallery.
+
+Synthetic GIF with many frames is generated and played headless (SDL dummy video driver) until
+given number of frames is shown. Printed JSON contains lateness of frames against their
+deadlines (in milliseconds), the shortest interval between shown frames, peak memory of the
+process and how much memory all scaled frames would take if the animation was expanded up front.
+
+The GIF is played once more (`late`) with decoding of every `--stall-every`-th frame delayed by
+`--stall` frame durations, so frames are late and buffer runs empty. Frames after stall should
+not be flashed in a burst (`min_interval_ms` is at least half of the frame duration).
+
+Usage:
+    python3 -m benchmarks.animation --frames 300 --duration 40 --size 1920x1080
+"""
+
+import argparse
+import contextlib
+import json
+import multiprocessing
+import os
+import resource
+import sys
+import tempfile
+import time
+
+os.environ['SDL_VIDEODRIVER'] = 'dummy'
+os.environ['PYGAME_HIDE_SUPPORT_PROMPT'] = '1'
+
+import pygame
+
+from benchmarks.latency import percentiles
+from tapestry import gallery as gallery_module
+from tapestry.animation import Animation
+from tapestry.config import MenuConfig
+from tapestry.display import Display
+from tapestry.gallery import Gallery
+
+
+def create_gif(path, frames, duration, size):
+    """
+    Save looped GIF with moving stripes. Run in separate process, so frames generated here don't
+    count into peak memory of the benchmark.
+    """
+    from PIL import Image, ImageDraw
+
+    images = []
+    for i in range(frames):
+        img = Image.new('P', size)
+        img.putpalette([channel for c in range(256) for channel in (c, 255 - c, (c * 7) % 256)])
+        draw = ImageDraw.Draw(img)
+        for x in range(-size[1], size[0], 24):
+            draw.line((x + i * 4, 0, x + i * 4 + size[1], size[1]), fill=(x // 24 + i) % 256, width=12)
+        images.append(img)
+    images[0].save(path, save_all=True, append_images=images[1:], duration=duration, loop=0)
+
+
+class MeasuredGallery(Gallery):
+    frames = 0
+    lateness = []
+    shown = []
+
+    def render_frame(self):
+        deadline = self.frame_deadline
+        super().render_frame()
+        if self.frame_deadline != deadline:
+            now = time.monotonic()
+            self.lateness.append(now - deadline)
+            self.shown.append(now)
+            self.frames -= 1
+            if self.frames <= 0:
+                pygame.event.post(pygame.event.Event(pygame.QUIT))
+
+
+class StalledAnimation(Animation):
+    """
+    Animation whose every `every`-th frame takes `stall` seconds longer to decode.
+    """
+    every = 0
+    stall = 0
+
+    def decode(self, index):
+        if index % self.every == 0:
+            time.sleep(self.stall)
+        return super().decode(index)
+
+
+def play(gallery, display, frames):
+    """
+    Play gallery until given number of frames is shown, return results.
+    """
+    MeasuredGallery.frames = frames
+    MeasuredGallery.lateness = []
+    MeasuredGallery.shown = []
+    baseline = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    view = MeasuredGallery(gallery, display)
+    start = time.monotonic()
+    view.run()
+    seconds = time.monotonic() - start
+    peak = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    shown = MeasuredGallery.shown
+    results = percentiles(MeasuredGallery.lateness)
+    results.update({
+        'frames': len(MeasuredGallery.lateness),
+        'seconds': round(seconds, 3),
+        'min_interval_ms': round(min(b - a for a, b in zip(shown, shown[1:])) * 1000, 1),
+        'frame_size': list(view.layers[0][0].get_size()),
+        'peak_rss_growth_mb': round((peak - baseline) / 1024, 1),
+    })
+    return results
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--frames', type=int, default=300, help='number of frames in GIF')
+    parser.add_argument('--duration', type=int, default=40, help='duration of frame in ms')
+    parser.add_argument('--gif-size', type=str, default='480x270')
+    parser.add_argument('--size', type=str, default='1920x1080')
+    parser.add_argument('--stall-every', type=int, default=10, help='delay decoding of every n-th frame in late run')
+    parser.add_argument('--stall', type=float, default=6, help='delay in frame durations')
+    args = parser.parse_args()
+    size = tuple(int(i) for i in args.size.split('x'))
+    gif_size = tuple(int(i) for i in args.gif_size.split('x'))
+
+    with tempfile.TemporaryDirectory() as dirpath:
+        gallery = os.path.join(dirpath, 'animation')
+        os.mkdir(gallery)
+        process = multiprocessing.Process(target=create_gif, args=(os.path.join(gallery, 'loop.gif'),
+                                                                   args.frames, args.duration, gif_size))
+        process.start()
+        process.join()
+
+        pygame.init()
+        pygame.display.set_mode(size)
+        with contextlib.redirect_stdout(sys.stderr):
+            display = Display(MenuConfig(dirpath).process()[1])
+            display.init_screen(complete=False)
+            results = play(gallery, display, args.frames)
+            StalledAnimation.every = args.stall_every
+            StalledAnimation.stall = args.stall * args.duration / 1000
+            gallery_module.Animation = StalledAnimation
+            try:
+                results['late'] = play(gallery, display, args.frames)
+            finally:
+                gallery_module.Animation = Animation
+        pygame.quit()
+
+    frame_size = results['frame_size']
+    results.update({
+        'expected_seconds': round(args.frames * args.duration / 1000, 3),
+        'expanded_frames_mb': round(args.frames * frame_size[0] * frame_size[1] * 4 / 1024 / 1024, 1),
+    })
+    print(json.dumps(results, indent=2, sort_keys=True))
+
+
+if __name__ == '__main__':
+    main()
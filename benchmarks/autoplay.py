@@ -0,0 +1,76 @@
+"""
+Measure how precisely autoplay keeps configured delay.
+
+Gallery of synthetic JPEGs in mixed resolutions (from small web images to big camera photos)
+runs headless (SDL dummy video driver) in autoplay mode, achieved intervals between images and
+jitter of flips against their deadlines are printed as JSON (see tapestry.autoplay).
+
+Decoding time differ a lot between images, with `--prefetch 0 --prepare-ahead 0` it is paid
+after the deadline, otherwise next image is decoded and composed before its deadline.
+
+Usage:
+    python3 -m benchmarks.autoplay --flips 30 --delay 1000
+    python3 -m benchmarks.autoplay --flips 30 --delay 1000 --prefetch 0 --prepare-ahead 0
+"""
+
+import argparse
+import contextlib
+import json
+import os
+import sys
+import tempfile
+
+os.environ['SDL_VIDEODRIVER'] = 'dummy'
+os.environ['PYGAME_HIDE_SUPPORT_PROMPT'] = '1'
+
+import pygame
+
+from benchmarks.latency import create_tree
+from tapestry import autoplay
+from tapestry.config import MenuConfig
+from tapestry.display import Display
+from tapestry.gallery import Gallery
+
+
+class CountingGallery(Gallery):
+    flips = 0
+
+    def render_screen(self, imgpath, title, direction=1):
+        super().render_screen(imgpath, title, direction)
+        self.flips -= 1
+        if self.flips < 0:
+            pygame.event.post(pygame.event.Event(pygame.QUIT))
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--flips', type=int, default=30)
+    parser.add_argument('--delay', type=int, default=1000, help='autoplay delay in ms')
+    parser.add_argument('--prefetch', type=int, default=2, help='prefetch option of gallery')
+    parser.add_argument('--prepare-ahead', type=float, default=autoplay.PREPARE_AHEAD,
+                        help='how many seconds before deadline next frame is prepared')
+    parser.add_argument('--size', type=str, default='1920x1080')
+    args = parser.parse_args()
+    size = tuple(int(i) for i in args.size.split('x'))
+    autoplay.PREPARE_AHEAD = args.prepare_ahead
+
+    with tempfile.TemporaryDirectory() as dirpath:
+        pygame.init()
+        pygame.display.set_mode(size)
+        gallery = create_tree(dirpath, 1, args.flips + 1)
+        with open(os.path.join(gallery, 'config.ini'), 'w') as f:
+            f.write('[gallery]\nautoplay = 1\ndelay = {}\nprefetch = {}\n'.format(args.delay, args.prefetch))
+
+        with contextlib.redirect_stdout(sys.stderr):
+            display = Display(MenuConfig(dirpath).process()[1])
+            display.init_screen(complete=False)
+            CountingGallery.flips = args.flips
+            view = CountingGallery(gallery, display)
+            view.run()
+        pygame.quit()
+
+    print(json.dumps(view.autoplay_clock.stats(), indent=2, sort_keys=True))
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,78 @@
+"""
+Measure time from process start to the first screen (and to menu ready for input).
+
+Presenter (`tapestry.py`) is started repeatedly as subprocess on generated data tree with SDL
+dummy video driver, milestones printed by tapestry.boot are collected and the process is
+terminated as soon as menu is ready. `cold` runs start with empty cache directory (no content
+index, no menu snapshot), `warm` runs with cache directory left by previous run, so menu is shown
+from snapshot. Medians of milestones in milliseconds are printed as JSON.
+
+Usage:
+    python3 -m benchmarks.boot --dirs 2000 --runs 5
+"""
+
+import argparse
+import json
+import os
+import re
+import shutil
+import statistics
+import subprocess
+import sys
+import tempfile
+
+from benchmarks.latency import create_tree
+
+BOOT_RE = re.compile(r'^Boot: (\w+) at ([\d.]+) ms$')
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+
+def run(datadir, cachedir):
+    """
+    Start presenter, return dict of milestones when menu is ready.
+    """
+    env = dict(os.environ, SDL_VIDEODRIVER='dummy', PYGAME_HIDE_SUPPORT_PROMPT='1')
+    process = subprocess.Popen([sys.executable, os.path.join(ROOT, 'tapestry.py'), datadir, '--cache-dir', cachedir,
+                                '--player', 'nonexistent-player'],
+                               cwd=ROOT, env=env, stdout=subprocess.PIPE, stderr=subprocess.DEVNULL,
+                               universal_newlines=True)
+    milestones = {}
+    for line in process.stdout:
+        match = BOOT_RE.match(line.strip())
+        if match:
+            milestones[match.group(1)] = float(match.group(2))
+            if match.group(1) == 'menu_ready':
+                break
+    process.terminate()
+    process.wait()
+    return milestones
+
+
+def medians(runs):
+    names = set().union(*runs)
+    return {name: round(statistics.median(r[name] for r in runs if name in r), 1) for name in names}
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--dirs', type=int, default=2000, help='number of menu directories')
+    parser.add_argument('--runs', type=int, default=5)
+    args = parser.parse_args()
+
+    with tempfile.TemporaryDirectory() as dirpath:
+        datadir = os.path.join(dirpath, 'data')
+        cachedir = os.path.join(dirpath, 'cache')
+        create_tree(datadir, args.dirs, 1)
+
+        cold = []
+        for _ in range(args.runs):
+            shutil.rmtree(cachedir, ignore_errors=True)
+            os.mkdir(cachedir)
+            cold.append(run(datadir, cachedir))
+        warm = [run(datadir, cachedir) for _ in range(args.runs)]
+
+    print(json.dumps({'cold': medians(cold), 'warm': medians(warm)}, indent=2, sort_keys=True))
+
+
+if __name__ == '__main__':
+    main()
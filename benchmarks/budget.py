@@ -0,0 +1,101 @@
+"""
+Check memory bounded decoding of oversized images.
+
+Synthetic images bigger than decode limit are generated (JPEG, PNG, plain and pyramidal TIFF),
+in throwaway process, then each of them is decoded with the limit in its own process and peak
+memory (VmHWM reset at the start, see benchmarks.decode) is reported. Images which can be decoded in reduced resolution must stay within the budget, others
+must be refused (gallery shows placeholder instead of them) without touching pixels.
+
+Usage:
+    python3 -m benchmarks.budget --megapixels 60 --limit 30 --target 1880x1016
+
+Requires Pillow.
+"""
+
+import argparse
+import multiprocessing
+import os
+import tempfile
+import time
+
+from PIL import Image
+
+from benchmarks.decode import create_jpeg, get_peak_rss, reset_peak_rss
+from tapestry.decoder import DecodeLimitError, load_image
+
+
+def create_images(dirpath, megapixels):
+    """
+    Create oversized images, return list of (name, path).
+    """
+    jpeg = os.path.join(dirpath, 'image.jpg')
+    size = create_jpeg(jpeg, megapixels)
+    img = Image.open(jpeg)
+    images = [('jpeg', jpeg)]
+
+    png = os.path.join(dirpath, 'image.png')
+    img.save(png, 'PNG', compress_level=1)
+    images.append(('png', png))
+
+    tiff = os.path.join(dirpath, 'image.tif')
+    img.save(tiff, 'TIFF')
+    images.append(('tiff', tiff))
+
+    # pyramid of subimages, each half of the previous one
+    pyramid = os.path.join(dirpath, 'pyramid.tif')
+    levels = [img.resize((size[0] >> i, size[1] >> i)) for i in range(1, 5)]
+    img.save(pyramid, 'TIFF', save_all=True, append_images=levels)
+    images.append(('pyramidal tiff', pyramid))
+    return size, images
+
+
+def measure(path, target, limit, queue):
+    """
+    Run in child process, put (result, time, peak memory increase in kB) into queue.
+    """
+    baseline = reset_peak_rss()
+    start = time.perf_counter()
+    try:
+        img = load_image(path, target, limit=limit)
+        result = 'decoded {}x{} px'.format(*img.get_size())
+    except DecodeLimitError as e:
+        result = 'refused ({})'.format(e)
+    elapsed = time.perf_counter() - start
+    queue.put((result, elapsed, get_peak_rss() - baseline))
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--megapixels', type=float, default=60)
+    parser.add_argument('--limit', type=float, default=30, help='decode limit in megapixels')
+    parser.add_argument('--target', type=str, default='1880x1016', help='size of image area on screen')
+    args = parser.parse_args()
+    target = tuple(int(i) for i in args.target.split('x'))
+    limit = int(args.limit * 1000000)
+    # decoded pixels take at most 4 bytes (RGBA surface), plus one copy during conversion
+    budget = limit * 4 * 2 / 1024
+
+    with tempfile.TemporaryDirectory() as tmpdir:
+        ctx = multiprocessing.get_context('spawn')
+        with ctx.Pool(1) as pool:
+            size, images = pool.apply(create_images, (tmpdir, args.megapixels))
+        print('Source images {}x{} px, decode limit {:.1f} Mpx, memory budget {:.1f} MB'.format(
+            size[0], size[1], args.limit, budget / 1024))
+
+        failed = 0
+        for name, path in images:
+            queue = ctx.Queue()
+            p = ctx.Process(target=measure, args=(path, target, limit, queue))
+            p.start()
+            result, elapsed, peak = queue.get()
+            p.join()
+            ok = peak <= budget
+            failed += not ok
+            print('{:>15}: {:8.1f} ms, peak memory +{:8.1f} MB {}, {}'.format(
+                name, elapsed * 1000, peak / 1024, 'OK' if ok else 'OVER BUDGET', result))
+
+        print('All images within budget' if not failed else '{} images over budget'.format(failed))
+
+
+if __name__ == '__main__':
+    main()
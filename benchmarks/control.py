@@ -0,0 +1,153 @@
+"""
+Check that control API doesn't slow down user interface.
+
+Gallery runs headless (SDL dummy video driver) with control API on Unix socket, scripted `down`
+presses are measured like in benchmarks.latency:
+
+* `idle` -- image switch latency, nobody talks to the API
+* `hammered` -- image switch latency while client processes request /status as fast as they can;
+  server accepts at most `--max-rate` connections per second (production limit by default, so
+  served requests per second are capped by it, raise it to see the cost of unlimited load)
+* `api_command` -- image switch triggered by `POST /command/next` instead of key press
+
+Result is printed as JSON, together with number of status requests served during hammering.
+
+Usage:
+    python3 -m benchmarks.control --clients 4 --switches 100
+"""
+
+import argparse
+import contextlib
+import json
+import multiprocessing
+import os
+import socket
+import sys
+import tempfile
+import time
+
+os.environ['SDL_VIDEODRIVER'] = 'dummy'
+os.environ['PYGAME_HIDE_SUPPORT_PROMPT'] = '1'
+
+import pygame
+
+from benchmarks.latency import create_tree, percentiles, Script, ScriptedGallery
+from tapestry.config import MenuConfig
+from tapestry.control import Control
+from tapestry.display import Display
+
+
+def request(address, method, path):
+    """
+    Send HTTP request to Unix socket, return response.
+    """
+    sock = socket.socket(socket.AF_UNIX, socket.SOCK_STREAM)
+    sock.connect(address)
+    sock.sendall('{} {} HTTP/1.0\r\n\r\n'.format(method, path).encode('ascii'))
+    chunks = []
+    while True:
+        data = sock.recv(65536)
+        if not data:
+            break
+        chunks.append(data)
+    sock.close()
+    return b''.join(chunks)
+
+
+def hammer(address, ready, stop, counter):
+    """
+    Run in child process, request status until stop is set.
+    """
+    count = 0
+    while not stop.is_set():
+        try:
+            request(address, 'GET', '/status')
+        except OSError:
+            continue
+        if not count:
+            ready.release()
+        count += 1
+    with counter.get_lock():
+        counter.value += count
+
+
+class ApiScript(Script):
+    """
+    Scripted presses of `down` (and `up`, see Script.turn) sent as commands through control API.
+    """
+    address = None
+    commands = {pygame.K_0: 'next', pygame.K_9: 'prev'}
+
+    def press(self, key):
+        if key in self.commands:
+            request(self.address, 'POST', '/command/' + self.commands[key])
+        else:
+            super().press(key)
+
+
+def bench(gallery, display, script):
+    ScriptedGallery.script = script
+    ScriptedGallery(gallery, display).run()
+    return percentiles(script.samples)
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--size', type=str, default='1920x1080')
+    parser.add_argument('--switches', type=int, default=100, help='number of image switches in each phase')
+    parser.add_argument('--interval', type=float, default=0.05, help='pause between key presses in seconds')
+    parser.add_argument('--clients', type=int, default=4, help='number of hammering client processes')
+    parser.add_argument('--max-rate', type=int, default=Control.max_rate,
+                        help='accepted connections per second, default is production limit')
+    args = parser.parse_args()
+    size = tuple(int(i) for i in args.size.split('x'))
+
+    with tempfile.TemporaryDirectory() as dirpath:
+        pygame.init()
+        pygame.display.set_mode(size)
+        # every switch show new image
+        gallery = create_tree(dirpath, 1, args.switches + 1)
+        address = os.path.join(dirpath, 'control.sock')
+
+        with contextlib.redirect_stdout(sys.stderr):
+            display = Display(MenuConfig(dirpath).process()[1])
+            display.init_screen(complete=False)
+            Control.max_rate = args.max_rate
+            Control(display, address).start()
+
+            results = {'idle': bench(gallery, display, Script(pygame.K_0, args.switches, pygame.K_q, args.interval))}
+
+            ctx = multiprocessing.get_context('spawn')
+            stop = ctx.Event()
+            ready = ctx.Semaphore(0)
+            counter = ctx.Value('l', 0)
+            clients = [ctx.Process(target=hammer, args=(address, ready, stop, counter)) for _ in range(args.clients)]
+            for p in clients:
+                p.start()
+            for p in clients:
+                ready.acquire()
+            start = time.perf_counter()
+            results['hammered'] = bench(gallery, display, Script(pygame.K_0, args.switches, pygame.K_q, args.interval))
+            elapsed = time.perf_counter() - start
+            stop.set()
+            for p in clients:
+                p.join()
+
+            ApiScript.address = address
+            results['api_command'] = bench(gallery, display,
+                                           ApiScript(pygame.K_0, args.switches, pygame.K_q, args.interval))
+            status = json.loads(request(address, 'GET', '/status').split(b'\r\n\r\n', 1)[1].decode('utf-8'))
+        pygame.quit()
+
+    results['status_requests'] = {
+        'clients': args.clients,
+        'max_rate': args.max_rate,
+        'count': counter.value,
+        'per_second': round(counter.value / elapsed),
+    }
+    results['status'] = status
+    print(json.dumps(results, indent=2, sort_keys=True))
+
+
+if __name__ == '__main__':
+    main()
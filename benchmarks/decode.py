@@ -0,0 +1,125 @@
+"""
+Compare full decode path (pygame.image.load + smoothscale) with reduced JPEG decoding.
+
+Synthetic JPEG of given size is generated in throwaway process, then each decode path runs in its
+own process, so peak memory of one path is not affected by the other (nor by the generator). Peak
+is read as VmHWM, reset at the start of the measurement (maxrss is inherited by spawned process
+from its parent on Linux).
+
+Usage:
+    python3 -m benchmarks.decode --megapixels 24 --target 1880x1016 --repeat 5
+
+Requires Pillow.
+"""
+
+import argparse
+import multiprocessing
+import os
+import resource
+import tempfile
+import time
+
+import pygame
+from PIL import Image
+
+from tapestry.decoder import get_image_size, load_image
+
+
+def create_jpeg(path, megapixels):
+    """
+    Create noisy JPEG with 3:2 aspect ratio and roughly given number of pixels.
+    """
+    height = int((megapixels * 1000000 / 1.5) ** 0.5)
+    width = int(height * 1.5)
+    img = Image.effect_noise((width // 8, height // 8), 64).convert('RGB').resize((width, height))
+    img.save(path, 'JPEG', quality=90)
+    return (width, height)
+
+
+def fit(size, target):
+    ratio = min(target[0] / size[0], target[1] / size[1])
+    return (int(size[0] * ratio), int(size[1] * ratio))
+
+
+def reset_peak_rss():
+    """
+    Reset peak memory of current process to its current size (Linux only), return it in kB.
+    """
+    try:
+        with open('/proc/self/clear_refs', 'w') as f:
+            f.write('5')
+    except OSError:
+        pass
+    return get_peak_rss()
+
+
+def get_peak_rss():
+    """
+    Return peak memory of current process in kB (VmHWM, or maxrss where /proc is not available).
+    """
+    try:
+        with open('/proc/self/status') as f:
+            for line in f:
+                if line.startswith('VmHWM:'):
+                    return int(line.split()[1])
+    except OSError:
+        pass
+    return resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+
+
+def full_decode(path, target):
+    img = pygame.image.load(path)
+    return pygame.transform.smoothscale(img, fit(img.get_size(), target))
+
+
+def fast_decode(path, target):
+    optimal_size = fit(get_image_size(path), target)
+    img = load_image(path, optimal_size)
+    return pygame.transform.smoothscale(img, optimal_size)
+
+
+def measure(method, path, target, repeat, queue):
+    """
+    Run in child process, put (best time, peak memory increase in kB) into queue.
+    """
+    fn = {'full': full_decode, 'fast': fast_decode}[method]
+    baseline = reset_peak_rss()
+    times = []
+    for _ in range(repeat):
+        start = time.perf_counter()
+        fn(path, target)
+        times.append(time.perf_counter() - start)
+    queue.put((min(times), get_peak_rss() - baseline))
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--megapixels', type=float, default=24)
+    parser.add_argument('--target', type=str, default='1880x1016', help='size of image area on screen')
+    parser.add_argument('--repeat', type=int, default=5)
+    args = parser.parse_args()
+    target = tuple(int(i) for i in args.target.split('x'))
+
+    with tempfile.TemporaryDirectory() as tmpdir:
+        path = os.path.join(tmpdir, 'image.jpg')
+        ctx = multiprocessing.get_context('spawn')
+        with ctx.Pool(1) as pool:
+            size = pool.apply(create_jpeg, (path, args.megapixels))
+        print('Source image {}x{} px, {:.1f} MB, target area {}x{} px'.format(
+            size[0], size[1], os.path.getsize(path) / 1024 / 1024, *target))
+
+        results = {}
+        for method in ['full', 'fast']:
+            queue = ctx.Queue()
+            p = ctx.Process(target=measure, args=(method, path, target, args.repeat, queue))
+            p.start()
+            results[method] = queue.get()
+            p.join()
+            print('{:>4} decode: {:8.1f} ms, peak memory +{:8.1f} MB'.format(
+                method, results[method][0] * 1000, results[method][1] / 1024))
+
+        print('Speedup {:.1f}x'.format(results['full'][0] / results['fast'][0]))
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,99 @@
+"""
+Measure CPU usage and wakeups of idle menu screen.
+
+Menu is displayed (SDL dummy video driver) and nobody touch the buttons. Two modes are compared:
+
+* `poll` -- legacy main loop calling `clock.tick(50)` and `get_state()` in cycle
+* `event` -- current `Menu.run` sleeping in scheduler until some event arrive
+
+Scheduler sleeps in `select` on input devices if /dev/input/event* are readable (run as root on
+Raspberry Pi), otherwise it falls back to sleeping in short intervals.
+
+Usage:
+    python3 -m benchmarks.idle --seconds 10
+"""
+
+import argparse
+import os
+import tempfile
+import threading
+import time
+
+os.environ['SDL_VIDEODRIVER'] = 'dummy'
+
+import pygame
+
+from tapestry import scheduler, states
+from tapestry.config import MenuConfig
+from tapestry.detective import source_exist
+from tapestry.display import Display
+from tapestry.menu import Menu
+
+
+class PollingMenu(Menu):
+    """
+    Menu with main loop as it was before event driven scheduler.
+    """
+    fps = 50
+
+    def run(self):
+        self.choices = ['dir{}'.format(i) for i in range(10)]
+        self.layout()
+        self.set_position(0)
+        self.render()
+
+        state = None
+        clock = pygame.time.Clock()
+        counter = 0
+        while state not in [states.STATE_QUIT, states.STATE_MISSING_SOURCE, states.STATE_ACTION]:
+            clock.tick(self.fps)
+            scheduler.scheduler.wakeups += 1
+            state = states.get_state()
+            if counter == self.sleep * self.fps:
+                if not source_exist(self.dirpath):
+                    return states.STATE_MISSING_SOURCE
+                counter = 0
+            else:
+                counter += 1
+        return state
+
+
+def measure(cls, dirpath, display, config, seconds):
+    """
+    Run menu for given number of seconds, return (CPU usage in %, wakeups per second).
+    """
+    timer = threading.Timer(seconds, lambda: scheduler.post(pygame.event.Event(pygame.QUIT)))
+    scheduler.scheduler.wakeups = 0
+    cpu_start = time.process_time()
+    start = time.perf_counter()
+    timer.start()
+    cls(dirpath, display, config).run()
+    elapsed = time.perf_counter() - start
+    cpu = time.process_time() - cpu_start
+    return (cpu / elapsed * 100, scheduler.scheduler.wakeups / elapsed)
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--seconds', type=float, default=10)
+    args = parser.parse_args()
+
+    with tempfile.TemporaryDirectory() as dirpath:
+        for i in range(10):
+            os.mkdir(os.path.join(dirpath, 'dir{}'.format(i)))
+
+        pygame.init()
+        pygame.display.set_mode((1920, 1080))
+        config = MenuConfig(dirpath).process()[1]
+        display = Display(config)
+        display.init_screen(complete=False)
+
+        for name, cls in [('poll', PollingMenu), ('event', Menu)]:
+            cpu, wakeups = measure(cls, dirpath, display, config, args.seconds)
+            print('{:>5}: CPU {:5.2f} %, {:7.2f} wakeups/s'.format(name, cpu, wakeups))
+
+        pygame.quit()
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,265 @@
+"""
+Measure latency of gallery and menu hot paths on synthetic data tree (SDL dummy video driver).
+
+Synthetic source directory is generated: many menu directories, first of them is gallery with
+JPEGs in mixed resolutions. Then scripted key events are injected into pygame queue and it is
+measured how long it take until the result is pushed to display:
+
+* `image_switch` -- `down` button in Gallery, from key press to displayed next image (at the last
+  image the script turns and presses `up` back to the first one, so any number of switches can
+  be measured in gallery of at least two images)
+* `menu_move` -- `down` button in Menu, from key press to displayed new cursor position
+* `tree_scan` -- `get_entries` listing of source directory (menu directories)
+
+Next key is pressed right after previous one is handled (plus optional `--interval`, which give
+prefetching a chance). Result is printed as JSON with p50/p95/p99 latencies in milliseconds, so
+it can be compared between commits.
+
+Usage:
+    python3 -m benchmarks.latency --dirs 10000 --images 5000 --output before.json
+    python3 -m benchmarks.latency --data /tmp/synthetic  # keep generated tree for next runs
+"""
+
+import argparse
+import contextlib
+import json
+import os
+import platform
+import random
+import sys
+import tempfile
+import time
+
+os.environ['SDL_VIDEODRIVER'] = 'dummy'
+os.environ['PYGAME_HIDE_SUPPORT_PROMPT'] = '1'
+
+import pygame
+
+from tapestry.config import MenuConfig
+from tapestry.detective import check_dir, get_entries
+from tapestry.display import Display
+from tapestry.gallery import Gallery
+from tapestry.menu import Menu
+
+# resolutions of synthetic images, from small web images to big camera photos (and portrait)
+RESOLUTIONS = [(800, 600), (1920, 1080), (1080, 1920), (3000, 2000), (4000, 3000), (6000, 4000)]
+
+
+def create_image(path, size, seed):
+    """
+    Save JPEG with some structure (gradient stripes and random rectangles) of given size.
+    """
+    rnd = random.Random(seed)
+    surface = pygame.Surface(size)
+    for x in range(0, size[0], 16):
+        surface.fill((x * 255 // size[0], rnd.randrange(256), 128), (x, 0, 16, size[1]))
+    for _ in range(200):
+        rect = (rnd.randrange(size[0]), rnd.randrange(size[1]), rnd.randrange(size[0] // 4), rnd.randrange(size[1] // 4))
+        surface.fill((rnd.randrange(256), rnd.randrange(256), rnd.randrange(256)), rect)
+    pygame.image.save(surface, path)
+
+
+def create_tree(dirpath, dirs, images):
+    """
+    Create synthetic source directory, skip it if the same tree was already generated there.
+    Return path of gallery directory.
+    """
+    params = {'dirs': dirs, 'images': images, 'resolutions': RESOLUTIONS}
+    marker = os.path.join(dirpath, '.synthetic.json')
+    gallery = os.path.join(dirpath, 'dir00000')
+    if os.path.exists(marker):
+        with open(marker) as f:
+            if json.load(f) == json.loads(json.dumps(params)):
+                return gallery
+
+    start = time.perf_counter()
+    for i in range(dirs):
+        os.makedirs(os.path.join(dirpath, 'dir{:05d}'.format(i)), exist_ok=True)
+
+    # few distinct source images, gallery files are hard links (copies) of them
+    sources = []
+    for i, size in enumerate(RESOLUTIONS):
+        path = os.path.join(dirpath, '.source{}.jpg'.format(i))
+        create_image(path, size, i)
+        sources.append(path)
+    for i in range(images):
+        path = os.path.join(gallery, 'img{:05d}.jpg'.format(i))
+        if os.path.exists(path):
+            os.remove(path)
+        try:
+            os.link(sources[i % len(sources)], path)
+        except OSError:
+            with open(sources[i % len(sources)], 'rb') as src, open(path, 'wb') as dst:
+                dst.write(src.read())
+
+    with open(marker, 'w') as f:
+        json.dump(params, f)
+    print('Synthetic tree generated in {:.1f} s'.format(time.perf_counter() - start), file=sys.stderr)
+    return gallery
+
+
+def percentiles(samples):
+    """
+    Return dict with count, mean and p50/p95/p99 (nearest rank) of samples in milliseconds.
+    """
+    if not samples:
+        return {'count': 0}
+    ordered = sorted(samples)
+
+    def rank(p):
+        return round(ordered[min(len(ordered) - 1, int(len(ordered) * p / 100))] * 1000, 3)
+
+    return {
+        'count': len(ordered),
+        'mean': round(sum(ordered) / len(ordered) * 1000, 3),
+        'p50': rank(50),
+        'p95': rank(95),
+        'p99': rank(99),
+        'max': round(ordered[-1] * 1000, 3),
+    }
+
+
+class Script:
+    """
+    Scripted key presses: press `key` given number of times, then `final_key`. Each press is
+    posted into pygame queue when the previous one was handled.
+    """
+    # direction keys and their opposites, see turn
+    opposite = {pygame.K_0: pygame.K_9, pygame.K_9: pygame.K_0}
+
+    def __init__(self, key, count, final_key, interval=0):
+        self.key = key
+        self.remaining = count
+        self.final_key = final_key
+        self.interval = interval
+        self.pressed_at = None
+        self.samples = []
+
+    def handled(self):
+        """
+        Called after key press was handled (result is on display), record latency and press next key.
+        """
+        if self.pressed_at is not None:
+            self.samples.append(time.perf_counter() - self.pressed_at)
+        if self.interval:
+            time.sleep(self.interval)
+        key = self.key if self.remaining > 0 else self.final_key
+        self.remaining -= 1
+        self.pressed_at = time.perf_counter() if key == self.key else None
+        self.press(key)
+
+    def turn(self):
+        """
+        Press the opposite direction key from now on.
+        """
+        self.key = self.opposite[self.key]
+
+    def press(self, key):
+        pygame.event.post(pygame.event.Event(pygame.KEYDOWN, key=key))
+
+
+class ScriptedGallery(Gallery):
+    script = None
+    # first and last file of gallery, `down` at the last image wouldn't render anything
+    edges = None
+
+    def render_screen(self, imgpath, title, direction=1):
+        super().render_screen(imgpath, title, direction)
+        if self.edges is None:
+            # only at the first image, before any latency sample is recorded
+            files = self.get_files()
+            self.edges = (files[0], files[-1])
+        edge = self.edges[1] if self.script.key == pygame.K_0 else self.edges[0]
+        if os.path.basename(imgpath) == edge and self.edges[0] != self.edges[1]:
+            self.script.turn()
+        self.script.handled()
+
+
+class ScriptedMenu(Menu):
+    script = None
+
+    def run(self):
+        # first key is waiting in queue until menu is rendered
+        self.script.handled()
+        return super().run()
+
+    def move(self, offset):
+        super().move(offset)
+        self.script.handled()
+
+
+def bench_gallery(dirpath, display, switches, interval):
+    ScriptedGallery.script = Script(pygame.K_0, switches, pygame.K_q, interval)
+    ScriptedGallery(dirpath, display).run()
+    return ScriptedGallery.script.samples
+
+
+def bench_menu(dirpath, display, config, moves, interval):
+    ScriptedMenu.script = Script(pygame.K_0, moves, pygame.K_ESCAPE, interval)
+    ScriptedMenu(dirpath, display, config).run()
+    return ScriptedMenu.script.samples
+
+
+def bench_scan(dirpath, repeat):
+    samples = []
+    for _ in range(repeat):
+        start = time.perf_counter()
+        get_entries(dirpath, condition=check_dir)
+        samples.append(time.perf_counter() - start)
+    return samples
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--data', type=str, default=None,
+                        help='directory for synthetic tree (kept for next runs), temporary directory by default')
+    parser.add_argument('--dirs', type=int, default=10000, help='number of menu directories')
+    parser.add_argument('--images', type=int, default=5000, help='number of images in gallery')
+    parser.add_argument('--size', type=str, default='1920x1080')
+    parser.add_argument('--switches', type=int, default=200, help='number of image switches')
+    parser.add_argument('--moves', type=int, default=1000, help='number of menu moves')
+    parser.add_argument('--scans', type=int, default=20, help='number of tree scans')
+    parser.add_argument('--interval', type=float, default=0, help='pause between key presses in seconds')
+    parser.add_argument('--output', type=str, default=None, help='write JSON into file instead of stdout')
+    args = parser.parse_args()
+    size = tuple(int(i) for i in args.size.split('x'))
+
+    with contextlib.ExitStack() as stack:
+        dirpath = args.data or stack.enter_context(tempfile.TemporaryDirectory())
+        os.makedirs(dirpath, exist_ok=True)
+
+        pygame.init()
+        pygame.display.set_mode(size)
+        gallery = create_tree(dirpath, args.dirs, args.images)
+
+        # log messages of tapestry don't mix with JSON result
+        with contextlib.redirect_stdout(sys.stderr):
+            config = MenuConfig(dirpath).process()[1]
+            display = Display(config)
+            display.init_screen(complete=False)
+            results = {
+                'image_switch': percentiles(bench_gallery(gallery, display, args.switches, args.interval)),
+                'menu_move': percentiles(bench_menu(dirpath, display, config, args.moves, args.interval)),
+                'tree_scan': percentiles(bench_scan(dirpath, args.scans)),
+            }
+        pygame.quit()
+
+    results['params'] = {
+        'dirs': args.dirs,
+        'images': args.images,
+        'size': args.size,
+        'interval': args.interval,
+        'python': platform.python_version(),
+        'pygame': pygame.version.ver,
+        'machine': platform.machine(),
+    }
+    output = json.dumps(results, indent=2, sort_keys=True)
+    if args.output:
+        with open(args.output, 'w') as f:
+            f.write(output + '\n')
+    else:
+        print(output)
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,75 @@
+"""
+Compare image switch latency with and without frame pack.
+
+Synthetic gallery (JPEGs in mixed resolutions) is generated, its frame pack is built and then
+scripted `down` presses are measured like in benchmarks.latency, once with JPEG decoding and once
+with the pack. Prefetching is turned off (and memory cache cleared), so every switch pays the
+whole cost of getting the image. Result is printed as JSON.
+
+Usage:
+    python3 -m benchmarks.pack --switches 50 --size 1920x1080
+"""
+
+import argparse
+import contextlib
+import json
+import os
+import sys
+import tempfile
+import time
+
+os.environ['SDL_VIDEODRIVER'] = 'dummy'
+os.environ['PYGAME_HIDE_SUPPORT_PROMPT'] = '1'
+
+import pygame
+
+from benchmarks.latency import create_tree, percentiles, Script, ScriptedGallery
+from tapestry.config import MenuConfig
+from tapestry.display import Display
+from tapestry.gallery import Gallery
+from tapestry.pack import build_pack, PACK_NAME
+
+
+def bench(gallery, display, switches):
+    display.image_cache.clear()
+    ScriptedGallery.script = Script(pygame.K_0, switches, pygame.K_q)
+    ScriptedGallery(gallery, display).run()
+    return percentiles(ScriptedGallery.script.samples)
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--switches', type=int, default=50)
+    parser.add_argument('--size', type=str, default='1920x1080')
+    args = parser.parse_args()
+    size = tuple(int(i) for i in args.size.split('x'))
+
+    with tempfile.TemporaryDirectory() as dirpath:
+        pygame.init()
+        pygame.display.set_mode(size)
+        gallery = create_tree(dirpath, 1, args.switches + 1)
+        with open(os.path.join(gallery, 'config.ini'), 'w') as f:
+            f.write('[gallery]\nprefetch = 0\n')
+
+        with contextlib.redirect_stdout(sys.stderr):
+            display = Display(MenuConfig(dirpath).process()[1])
+            display.init_screen(complete=False)
+            results = {'jpeg': bench(gallery, display, args.switches)}
+
+            start = time.perf_counter()
+            builder = Gallery(gallery, display)
+            builder.config = builder.load_config()
+            frames = build_pack(builder, gallery, builder.get_layout())
+            results['build'] = {
+                'frames': frames,
+                'seconds': round(time.perf_counter() - start, 3),
+                'bytes': os.path.getsize(os.path.join(gallery, PACK_NAME)),
+            }
+            results['pack'] = bench(gallery, display, args.switches)
+        pygame.quit()
+
+    print(json.dumps(results, indent=2, sort_keys=True))
+
+
+if __name__ == '__main__':
+    main()
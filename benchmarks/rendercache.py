@@ -0,0 +1,90 @@
+"""
+Compare render cache hit with decoding of the source image.
+
+Synthetic JPEG photos are generated, each is decoded like in gallery (reduced JPEG decoding and
+smoothscale to the image area) and stored in RenderCache. Then it is measured how long it takes:
+
+* `decode` -- decoding and scaling source image again (render cache miss)
+* `hit` -- RenderCache.get of stored entry (read, decompress, checksum)
+* `raw` -- reading the same pixels stored uncompressed with crc32 (previous format of entries)
+
+Files are read from page cache here, so `raw` looks fast -- on USB disk of Raspberry Pi (~30 MB/s)
+reading is what counts and compressed entry is about half of raw pixels (compare `entry_mb` and
+`raw_mb`). Best times in milliseconds are printed as JSON.
+
+Usage:
+    python3 -m benchmarks.rendercache --megapixels 12 --images 5 --repeat 5
+
+Requires Pillow.
+"""
+
+import argparse
+import contextlib
+import json
+import os
+import sys
+import tempfile
+import time
+import zlib
+
+os.environ['SDL_VIDEODRIVER'] = 'dummy'
+os.environ['PYGAME_HIDE_SUPPORT_PROMPT'] = '1'
+
+import pygame
+
+from benchmarks.decode import create_jpeg, fast_decode
+from tapestry.diskcache import RenderCache
+
+
+def best(fn, repeat):
+    times = []
+    for _ in range(repeat):
+        start = time.perf_counter()
+        fn()
+        times.append(time.perf_counter() - start)
+    return min(times) * 1000
+
+
+def read_raw(path, size):
+    with open(path, 'rb') as f:
+        pixels = f.read()
+    zlib.crc32(pixels)
+    return pygame.image.fromstring(pixels, size, 'RGB')
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--megapixels', type=float, default=12)
+    parser.add_argument('--target', type=str, default='1880x1016', help='size of image area on screen')
+    parser.add_argument('--images', type=int, default=5)
+    parser.add_argument('--repeat', type=int, default=5)
+    args = parser.parse_args()
+    target = tuple(int(i) for i in args.target.split('x'))
+
+    results = {'decode': [], 'hit': [], 'raw': [], 'entry_mb': [], 'raw_mb': []}
+    with tempfile.TemporaryDirectory() as dirpath:
+        with contextlib.redirect_stdout(sys.stderr):
+            cache = RenderCache(os.path.join(dirpath, 'cache'))
+        for i in range(args.images):
+            path = os.path.join(dirpath, 'image{}.jpg'.format(i))
+            create_jpeg(path, args.megapixels)
+            img = fast_decode(path, target)
+            key = cache.get_key(path)
+            cache.put(key, img)
+            rawpath = os.path.join(dirpath, 'image{}.raw'.format(i))
+            with open(rawpath, 'wb') as f:
+                f.write(pygame.image.tostring(img, 'RGB'))
+
+            results['decode'].append(best(lambda: fast_decode(path, target), args.repeat))
+            results['hit'].append(best(lambda: cache.get(key), args.repeat))
+            results['raw'].append(best(lambda: read_raw(rawpath, img.get_size()), args.repeat))
+            results['entry_mb'].append(os.path.getsize(os.path.join(cache.dirpath, key)) / 1024 / 1024)
+            results['raw_mb'].append(os.path.getsize(rawpath) / 1024 / 1024)
+
+    results = {name: round(sum(values) / len(values), 2) for name, values in results.items()}
+    results['speedup'] = round(results['decode'] / results['hit'], 1)
+    print(json.dumps(results, indent=2, sort_keys=True))
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,64 @@
+"""
+Compare scaler backends and gallery image switch latency with each `scaler` mode.
+
+Backends are calibrated first (see tapestry.scaler, milliseconds and error against `smooth`),
+then scripted `down` presses are measured like in benchmarks.latency on synthetic gallery (JPEGs
+in mixed resolutions) once for every mode. Prefetching is turned off (and memory cache cleared),
+so every switch pays decoding and scaling. Result is printed as JSON.
+
+Usage:
+    python3 -m benchmarks.scaler --switches 30 --size 1920x1080
+"""
+
+import argparse
+import contextlib
+import json
+import os
+import sys
+import tempfile
+
+os.environ['SDL_VIDEODRIVER'] = 'dummy'
+os.environ['PYGAME_HIDE_SUPPORT_PROMPT'] = '1'
+
+import pygame
+
+from benchmarks.latency import create_tree, percentiles, Script, ScriptedGallery
+from tapestry import scaler
+from tapestry.config import MenuConfig
+from tapestry.display import Display
+
+
+def bench(gallery, display, switches, mode):
+    with open(os.path.join(gallery, 'config.ini'), 'w') as f:
+        f.write('[gallery]\nprefetch = 0\nscaler = {}\n'.format(mode))
+    display.image_cache.clear()
+    ScriptedGallery.script = Script(pygame.K_0, switches, pygame.K_q)
+    ScriptedGallery(gallery, display).run()
+    return percentiles(ScriptedGallery.script.samples)
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--switches', type=int, default=30)
+    parser.add_argument('--size', type=str, default='1920x1080')
+    args = parser.parse_args()
+    size = tuple(int(i) for i in args.size.split('x'))
+
+    with tempfile.TemporaryDirectory() as dirpath:
+        pygame.init()
+        pygame.display.set_mode(size)
+        gallery = create_tree(dirpath, 1, args.switches + 1)
+
+        with contextlib.redirect_stdout(sys.stderr):
+            results = {'calibration': scaler.calibrate((size[0] // 2, size[1] // 2))}
+            display = Display(MenuConfig(dirpath).process()[1])
+            display.init_screen(complete=False)
+            for mode in ['quality', 'fast', 'auto']:
+                results[mode] = bench(gallery, display, args.switches, mode)
+        pygame.quit()
+
+    print(json.dumps(results, indent=2, sort_keys=True))
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,114 @@
+"""
+Measure how precisely synchronized devices flip images.
+
+Leader and followers run as separate processes on localhost (SDL dummy video driver, multicast
+on loopback interface), all of them show the same synthetic gallery in autoplay mode. Every
+process records when each image was pushed to display; since all processes share system
+monotonic clock, skew between devices is directly measured.
+
+Usage:
+    python3 -m benchmarks.sync --followers 3 --flips 10 --delay 1000
+"""
+
+import argparse
+import multiprocessing
+import os
+import tempfile
+import threading
+import time
+
+from benchmarks.latency import create_image, percentiles
+
+
+def run_device(role, dirpath, args, queue):
+    """
+    Run gallery in child process, put (role, [(filename, time)], clock offset) into queue.
+    """
+    os.environ['SDL_VIDEODRIVER'] = 'dummy'
+    os.environ['PYGAME_HIDE_SUPPORT_PROMPT'] = '1'
+    import pygame
+
+    from tapestry import scheduler
+    from tapestry.config import MenuConfig
+    from tapestry.display import Display
+    from tapestry.gallery import Gallery
+    from tapestry.sync import Sync
+
+    flips = []
+
+    class RecordingGallery(Gallery):
+        def render_screen(self, imgpath, title, direction=1):
+            super().render_screen(imgpath, title, direction)
+            if self.layers_rendered:
+                flips.append((os.path.basename(imgpath), time.monotonic()))
+            self.layers_rendered = True
+            if role == 'leader' and len(flips) >= args.flips:
+                scheduler.post(pygame.event.Event(pygame.QUIT))
+
+    pygame.init()
+    pygame.display.set_mode((640, 360))
+    sync = Sync(role, port=args.port, interface='127.0.0.1')
+    sync.start()
+    display = Display(MenuConfig(dirpath).process()[1], sync=sync)
+    display.init_screen(complete=False)
+
+    if role == 'follower':
+        # followers end a while after the leader
+        timeout = (args.flips + 2) * args.delay / 1000 + 2
+        threading.Timer(timeout, lambda: scheduler.post(pygame.event.Event(pygame.QUIT))).start()
+    gallery = RecordingGallery(os.path.join(dirpath, 'gallery'), display)
+    gallery.layers_rendered = False
+    gallery.run()
+    queue.put((role, flips, sync.offset))
+    pygame.quit()
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--followers', type=int, default=3)
+    parser.add_argument('--flips', type=int, default=10)
+    parser.add_argument('--delay', type=int, default=1000, help='autoplay delay in ms')
+    parser.add_argument('--port', type=int, default=5043)
+    args = parser.parse_args()
+
+    with tempfile.TemporaryDirectory() as dirpath:
+        gallery = os.path.join(dirpath, 'gallery')
+        os.mkdir(gallery)
+        for i in range(args.flips + 2):
+            create_image(os.path.join(gallery, 'img{:03d}.jpg'.format(i)), (1920, 1080), i)
+        with open(os.path.join(gallery, 'config.ini'), 'w') as f:
+            f.write('[gallery]\nautoplay = 1\ndelay = {}\n'.format(args.delay))
+
+        ctx = multiprocessing.get_context('spawn')
+        queue = ctx.Queue()
+        processes = [ctx.Process(target=run_device, args=('follower', dirpath, args, queue))
+                     for _ in range(args.followers)]
+        for p in processes:
+            p.start()
+        # let followers subscribe before leader start
+        time.sleep(1)
+        leader = ctx.Process(target=run_device, args=('leader', dirpath, args, queue))
+        leader.start()
+        processes.append(leader)
+
+        results = [queue.get() for _ in processes]
+        for p in processes:
+            p.join()
+
+    times = {}
+    for role, flips, offset in results:
+        if role == 'follower':
+            print('follower: {} flips, estimated clock offset {}'.format(
+                len(flips), '{:.3f} ms'.format(offset * 1000) if offset is not None else 'unknown'))
+        for name, at in flips:
+            times.setdefault(name, []).append(at)
+
+    skews = [max(t) - min(t) for t in times.values() if len(t) == len(results)]
+    print('{} images shown on all {} devices'.format(len(skews), len(results)))
+    stats = percentiles(skews)
+    if stats['count']:
+        print('skew between devices: p50 {p50:.2f} ms, p95 {p95:.2f} ms, max {max:.2f} ms'.format(**stats))
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,52 @@
+"""
+Measure achieved frame rate of gallery transitions with SDL dummy video driver.
+
+Usage:
+    python3 -m benchmarks.transition --size 1920x1080 --duration 500 --repeat 5 [--fps 1000]
+"""
+
+import argparse
+import os
+
+os.environ['SDL_VIDEODRIVER'] = 'dummy'
+
+import pygame
+
+from tapestry import transition
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--size', type=str, default='1920x1080')
+    parser.add_argument('--duration', type=int, default=500, help='transition duration in ms')
+    parser.add_argument('--repeat', type=int, default=5)
+    parser.add_argument('--fps', type=int, default=transition.Transition.fps,
+                        help='frame rate limit, use some big number to find out maximal frame rate')
+    args = parser.parse_args()
+    size = tuple(int(i) for i in args.size.split('x'))
+    transition.Transition.fps = args.fps
+
+    pygame.init()
+    screen = pygame.display.set_mode(size)
+    print('Screen {}x{} px, {} bits'.format(size[0], size[1], screen.get_bitsize()))
+
+    variants = [('crossfade', 'numpy'), ('crossfade', 'pygame'), ('slide', 'pygame')]
+    for kind, backend in variants:
+        t = transition.Transition(screen, kind, args.duration, backend)
+        if t.backend != backend:
+            print('{:>20}: NumPy not available'.format(kind))
+            continue
+        results = []
+        for i in range(args.repeat):
+            screen.fill((200, 50, 50) if i % 2 else (50, 50, 200))
+            t.frame.fill((50, 200, 50))
+            t.run(direction=1)
+            results.append(t.stats['fps'])
+        name = '{} ({})'.format(kind, backend)
+        print('{:>20}: {:6.1f} fps average, {:6.1f} fps worst'.format(name, sum(results) / len(results), min(results)))
+
+    pygame.quit()
+
+
+if __name__ == '__main__':
+    main()
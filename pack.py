@@ -0,0 +1,119 @@
+"""
+Build frame packs of galleries for tapestry presenter.
+
+Walk through data tree with the same rules as tapestry presenter does and write `.frames.pack`
+file into every gallery directory, with all images already scaled for given display size (see
+tapestry/pack.py). Presenter use the pack automatically if it matches its display, images are
+then shown without decoding. Galleries whose pack is up to date are skipped, so the command could
+be run repeatedly (after content update). All CPU cores are used.
+
+Usage:
+    python3 pack.py /media/usb/data --size 1920x1080 --scaler smooth
+
+Galleries with `auto` scaler are packed with backend given by `--scaler` (calibration done by
+presenter is in `scaler.json` in its cache directory), pack is used only if presenter resolves
+`auto` to the same backend.
+
+Pack takes width * height * 4 bytes per image (~8 MB for full HD), check free space on USB disk.
+"""
+
+import argparse
+import multiprocessing
+import os
+import time
+
+os.environ.setdefault('SDL_VIDEODRIVER', 'dummy')
+
+import pygame
+
+from tapestry.config import MenuConfig
+from tapestry.detective import check_dir, get_entries
+from tapestry.display import Display
+from tapestry.gallery import Gallery
+from tapestry.pack import build_pack, FramePack
+from tapestry.scaler import BACKENDS
+
+
+def size_parser(value):
+    width, height = value.lower().split('x')
+    return (int(width), int(height))
+
+
+def is_uptodate(gallery, dirpath, size, layout):
+    """
+    Return True if gallery has pack for given size and layout which contains all its images.
+    """
+    pack = FramePack.open(dirpath, size, layout)
+    if pack is None:
+        return False
+    try:
+        for filename in gallery.get_files():
+            frame = pack.frames.get(filename)
+            stat = os.stat(os.path.join(dirpath, filename))
+            if frame is None or frame['mtime_ns'] != stat.st_mtime_ns or frame['bytes'] != stat.st_size:
+                return False
+        return len(pack.frames) == len(gallery.get_files())
+    finally:
+        pack.close()
+
+
+def process_gallery(task):
+    """
+    Build pack of single gallery. Run in worker process.
+
+    Return tuple (dirpath, number of frames or None if skipped, error).
+    """
+    srcdir, dirpath, size, backend, force = task
+    try:
+        pygame.font.init()
+        display = Display(MenuConfig(srcdir).process()[1])
+        display.size = list(size)
+        gallery = Gallery(dirpath, display)
+        gallery.config = gallery.load_config()
+        # calibration needs the target device, auto is not resolved here
+        if gallery.config['scaler'] == 'auto':
+            gallery.config['scaler'] = backend
+        layout = gallery.get_layout()
+        if not force and is_uptodate(gallery, dirpath, size, layout):
+            return (dirpath, None, None)
+        return (dirpath, build_pack(gallery, dirpath, layout), None)
+    except Exception as e:
+        return (dirpath, 0, str(e))
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Build frame packs of galleries for tapestry presenter.')
+    parser.add_argument('srcdir', type=str, help='data tree (for example data directory on USB disk)')
+    parser.add_argument('--size', type=size_parser, default=(1920, 1080), help='display resolution, default 1920x1080')
+    parser.add_argument('--scaler', type=str, choices=sorted(BACKENDS), default='smooth',
+                        help='scaler backend for galleries with auto scaler, default smooth')
+    parser.add_argument('--jobs', type=int, default=multiprocessing.cpu_count(), help='number of worker processes')
+    parser.add_argument('--force', action='store_true', help='build all packs, even if they are up to date')
+    args = parser.parse_args()
+
+    start = time.time()
+    tasks = []
+    for dirname in get_entries(args.srcdir, condition=check_dir) or []:
+        dirpath = os.path.join(args.srcdir, dirname)
+        if Gallery.filter_files(os.listdir(dirpath)):
+            tasks.append((args.srcdir, dirpath, args.size, args.scaler, args.force))
+    print('{} galleries'.format(len(tasks)))
+
+    frames = 0
+    errors = 0
+    with multiprocessing.Pool(args.jobs) as pool:
+        for idx, (dirpath, count, error) in enumerate(pool.imap_unordered(process_gallery, tasks), 1):
+            if error:
+                errors += 1
+                print('[{}/{}] {} FAILED: {}'.format(idx, len(tasks), dirpath, error))
+            elif count is None:
+                print('[{}/{}] {} up to date'.format(idx, len(tasks), dirpath))
+            else:
+                frames += count
+                print('[{}/{}] {} {} frames'.format(idx, len(tasks), dirpath, count))
+
+    print('Packed {} frames ({} galleries failed) in {:.1f} s'.format(frames, errors, time.time() - start))
+
+
+if __name__ == '__main__':
+    main()
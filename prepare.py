@@ -0,0 +1,145 @@
+"""
+Prepare content of USB disk for tapestry presenter.
+
+Walk through source data tree with the same rules as tapestry presenter does (menu directories,
+gallery images) and create copy of the tree where every image is rescaled to target resolution,
+converted to RGB and re-encoded. All CPU cores are used. Files which are already prepared
+(output is newer than source) are skipped, so the command could be run repeatedly.
+
+Usage:
+    python3 prepare.py /path/to/source/data /media/usb/data --size 1920x1080 --quality 96
+
+Requires Pillow (`pip3 install Pillow`) and Pygame.
+"""
+
+import argparse
+import multiprocessing
+import os
+import shutil
+import time
+
+from PIL import Image
+
+from tapestry.detective import check_dir, check_file, get_entries
+from tapestry.gallery import Gallery
+
+
+def size_parser(value):
+    width, height = value.lower().split('x')
+    return (int(width), int(height))
+
+
+def is_uptodate(src, dst):
+    """
+    Return True if destination file exists and it is not older than source.
+    """
+    return os.path.exists(dst) and os.path.getmtime(dst) >= os.path.getmtime(src)
+
+
+def get_tasks(srcdir, dstdir, force=False):
+    """
+    Walk through source tree, return tuple (images, copies, skipped), where
+        images is list of (src, dst) image paths which need processing
+        copies is list of (src, dst) paths of other files (configs, titles, videos)
+        skipped is number of images which are already up to date
+    """
+    images = []
+    copies = []
+    skipped = 0
+
+    for filename in get_entries(srcdir, condition=check_file) or []:
+        copies.append((os.path.join(srcdir, filename), os.path.join(dstdir, filename)))
+
+    for dirname in get_entries(srcdir, condition=check_dir) or []:
+        subdir = os.path.join(srcdir, dirname)
+        files = get_entries(subdir, condition=check_file) or []
+        gallery_files = set(Gallery.filter_files(files))
+        for filename in files:
+            task = (os.path.join(subdir, filename), os.path.join(dstdir, dirname, filename))
+            if filename not in gallery_files or filename.lower().endswith('.gif'):
+                # animated GIFs and non image files are copied as they are
+                copies.append(task)
+            elif not force and is_uptodate(*task):
+                skipped += 1
+            else:
+                images.append(task)
+
+    copies = [(src, dst) for src, dst in copies if force or not is_uptodate(src, dst)]
+    return images, copies, skipped
+
+
+def process_image(task):
+    """
+    Rescale, convert and re-encode single image. Run in worker process.
+
+    Return tuple (src, input bytes, output bytes, error).
+    """
+    src, dst, size, quality = task
+    try:
+        img = Image.open(src)
+        img.draft('RGB', size)  # fast JPEG downscaling during decoding
+        if img.mode != 'RGB':
+            img = img.convert('RGB')  # CMYK, palette, grayscale, alpha...
+        img.thumbnail(size, Image.LANCZOS)
+
+        os.makedirs(os.path.dirname(dst), exist_ok=True)
+        tmp = dst + '.tmp'
+        ext = os.path.splitext(dst)[1].lower()
+        if ext in ['.jpg', '.jpeg']:
+            img.save(tmp, 'JPEG', quality=quality, progressive=True, optimize=True)
+        elif ext == '.png':
+            img.save(tmp, 'PNG', optimize=True)
+        elif ext in ['.tif', '.tiff']:
+            img.save(tmp, 'TIFF')
+        else:
+            img.save(tmp, 'BMP')
+        os.replace(tmp, dst)
+    except Exception as e:
+        return (src, os.path.getsize(src), 0, str(e))
+
+    return (src, os.path.getsize(src), os.path.getsize(dst), None)
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Prepare data tree for tapestry presenter.')
+    parser.add_argument('srcdir', type=str, help='source data tree')
+    parser.add_argument('dstdir', type=str, help='output data tree (for example data directory on USB disk)')
+    parser.add_argument('--size', type=size_parser, default=(1920, 1080), help='target resolution, default 1920x1080')
+    parser.add_argument('--quality', type=int, default=96, help='JPEG quality, default 96')
+    parser.add_argument('--jobs', type=int, default=multiprocessing.cpu_count(), help='number of worker processes')
+    parser.add_argument('--force', action='store_true', help='process all files, even if they are up to date')
+    args = parser.parse_args()
+
+    start = time.time()
+    images, copies, skipped = get_tasks(args.srcdir, args.dstdir, force=args.force)
+    print('{} images to process, {} up to date, {} other files to copy'.format(len(images), skipped, len(copies)))
+
+    for src, dst in copies:
+        os.makedirs(os.path.dirname(dst), exist_ok=True)
+        shutil.copy2(src, dst)
+
+    bytes_in = 0
+    bytes_out = 0
+    errors = 0
+    tasks = [(src, dst, args.size, args.quality) for src, dst in images]
+    with multiprocessing.Pool(args.jobs) as pool:
+        for idx, (src, size_in, size_out, error) in enumerate(pool.imap_unordered(process_image, tasks), 1):
+            bytes_in += size_in
+            bytes_out += size_out
+            if error:
+                errors += 1
+                print('[{}/{}] {} FAILED: {}'.format(idx, len(tasks), src, error))
+            else:
+                print('[{}/{}] {}'.format(idx, len(tasks), src))
+
+    elapsed = time.time() - start
+    processed = len(images) - errors
+    print('Processed {} images ({} failed, {} skipped) in {:.1f} s using {} processes'.format(
+        processed, errors, skipped, elapsed, args.jobs))
+    if elapsed > 0:
+        print('Throughput: {:.1f} images/s, {:.1f} MB/s read, {:.1f} MB/s written'.format(
+            processed / elapsed, bytes_in / elapsed / 1024 / 1024, bytes_out / elapsed / 1024 / 1024))
+
+
+if __name__ == '__main__':
+    main()
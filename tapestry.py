@@ -1,22 +1,28 @@
+from tapestry import boot  # the first import, startup is measured from the process start
+
 import argparse
 import json
 import os
 import pygame
 import pygame.locals
 import signal
-from time import sleep
 
 from tapestry.config import MenuConfig
-from tapestry.detective import check_file, get_entries, source_exist
+from tapestry.detective import source_exist
+from tapestry.diskcache import RENDER_CACHE_SIZE, RenderCache
 from tapestry.display import Display
-from tapestry.gallery import Gallery
-from tapestry.menu import Menu
-from tapestry.states import STATE_MISSING_SOURCE, STATE_QUIT
-from tapestry.video import Video
+from tapestry.index import ContentIndex
+from tapestry.menu import load_snapshot, Menu
+from tapestry.player import Player
+from tapestry.states import get_state, STATE_MISSING_SOURCE, STATE_QUIT
+from tapestry.sync import GROUP as SYNC_GROUP, PORT as SYNC_PORT, Sync
+from tapestry.trace import tracer
+from tapestry.watcher import Watcher
 
 
 def handler(signum, frame):
     print('Signal handler called with signal', signum)
+    tracer.dump()
     pygame.display.quit()
     pygame.quit()
     raise OSError("Couldn't open device!")
@@ -30,39 +36,149 @@ SLEEP = 3
 # CLI args initialization
 parser = argparse.ArgumentParser()
 parser.add_argument('dirpath', type=str)
+parser.add_argument('--cache-dir', type=str, default=None,
+                    help='writable directory for persistent cache of scaled images and content index (USB disk, tmpfs)')
+parser.add_argument('--cache-size', type=int, default=RENDER_CACHE_SIZE // (1024 * 1024),
+                    help='size limit of persistent cache in MB')
+parser.add_argument('--trace', type=str, default=None,
+                    help='collect timings of hot paths, dump them into given path on SIGUSR1 and at exit')
+parser.add_argument('--sync', type=str, default=None, choices=['leader', 'follower'],
+                    help='synchronized slideshow of more devices, one of them is leader')
+parser.add_argument('--sync-group', type=str, default=SYNC_GROUP, help='multicast group of synchronized devices')
+parser.add_argument('--sync-port', type=int, default=SYNC_PORT)
+parser.add_argument('--sync-interface', type=str, default='0.0.0.0', help='address of network interface for sync')
+parser.add_argument('--control', type=str, default=None,
+                    help='serve status and control API on host:port or Unix socket path (GET /status, POST /command/next)')
+parser.add_argument('--player', type=str, default='mplayer',
+                    help='video player binary speaking mplayer slave protocol')
 args = parser.parse_args()
 print('Starting tapestry. Source dirpath={}'.format(args.dirpath), flush=True)
 
+# timing instrumentation, disabled by default
+if args.trace:
+    tracer.enable(args.trace)
+boot.mark('imports')
+
+# menu shown at the end of last run, it is put on screen before anything else is done (source
+# directory scan, loading of content index, starting of player) and revalidated afterwards
+snapshot_path = os.path.join(args.cache_dir, 'menu.json') if args.cache_dir else None
+snapshot = None
+if snapshot_path and source_exist(args.dirpath):
+    snapshot = load_snapshot(snapshot_path, args.dirpath)
+
+# get menu configuration (from snapshot, real one is parsed in main loop)
+mc = MenuConfig(args.dirpath)
+menu_config_mtime = None
+if snapshot is not None:
+    menu_config = snapshot['config']
+else:
+    menu_config_mtime = mc.get_mtime()
+    status, menu_config = mc.process()
+    print('Menu configuration: {}'.format(json.dumps(menu_config)), flush=True)
+
+# initialize display, it lives for whole program run
+display = Display(menu_config)
+display.init_screen()
+print('Display initialized', flush=True)
+boot.mark('display')
+
+last_menu_position = 0
+if snapshot is not None:
+    last_menu_position = snapshot['position']
+    Menu(args.dirpath, display, menu_config, position=last_menu_position).show(snapshot['choices'])
+    print('Menu snapshot shown', flush=True)
+
+# views (and Pillow they need) are not needed for the first screen
+from tapestry.control import Control
+from tapestry.gallery import Gallery
+from tapestry.grid import Grid
+from tapestry.scaler import scaler
+from tapestry.video import Video
+
+# persistent cache of scaled images
+render_cache = None
+if args.cache_dir:
+    try:
+        render_cache = RenderCache(args.cache_dir, max_bytes=args.cache_size * 1024 * 1024)
+    except OSError as e:
+        print('Render cache disabled: {}'.format(e), flush=True)
+
+# scaler backends are measured at the first use of `auto` scaler (only once if there is cache directory)
+if args.cache_dir:
+    scaler.set_cache(os.path.join(args.cache_dir, 'scaler.json'))
+
+# index of USB disk content
+VIEWS = [Video, Gallery]
+index_path = os.path.join(args.cache_dir, 'index.json') if args.cache_dir else None
+index = ContentIndex(args.dirpath, views=VIEWS, cache_path=index_path)
+
+# watching of USB disk (un)mounting and content changes
+watcher = Watcher(args.dirpath)
+watcher.start()
+
+# video player is started in advance and waits in idle mode
+player = Player(args.player)
+player.start()
+
+# synchronization with other devices
+sync = None
+if args.sync:
+    try:
+        sync = Sync(args.sync, group=args.sync_group, port=args.sync_port, interface=args.sync_interface)
+        sync.start()
+    except OSError as e:
+        print('Sync disabled: {}'.format(e), flush=True)
+
+display.render_cache = render_cache
+display.watcher = watcher
+display.index = index
+display.player = player
+display.sync = sync
+boot.mark('services')
+
+# local status and control API
+if args.control:
+    try:
+        Control(display, args.control).start()
+    except (OSError, ValueError) as e:
+        print('Control API disabled: {}'.format(e), flush=True)
+
 # main loop
 state = None
-last_menu_position = 0
 while state != STATE_QUIT:
     print('Entering main loop', flush=True)
 
-    # get menu configuration
-    mc = MenuConfig(args.dirpath)
-    status, menu_config = mc.process()
-    print('Menu configuration: {}'.format(json.dumps(menu_config)), flush=True)
+    # menu configuration is parsed again only if it changed (or it was taken from snapshot)
+    shown, snapshot = snapshot, None
+    if shown is not None or mc.get_mtime() != menu_config_mtime:
+        menu_config_mtime = mc.get_mtime()
+        status, menu_config = mc.process()
+        display.set_config(menu_config)
+        print('Menu configuration: {}'.format(json.dumps(menu_config)), flush=True)
+
+    # video mode could be released in the meantime
+    if display.ensure_screen():
+        print('Display re-initialized', flush=True)
 
-    # initialize display
-    display = Display(menu_config)
-    display.init_screen()
-    print('Display initialized', flush=True)
-    
     # source directory detection
     # if there are no data on USB disk, we need to display message and wait until it will be mounted
     if not source_exist(args.dirpath):
     #if 1:
         display.render_no_source()
+        print("Source doesn't exists.", flush=True)
         while not source_exist(args.dirpath):
-            print("Source doesn't exists.", flush=True)
-            sleep(SLEEP)
-        sleep(SLEEP)
-        continue  # ie. go back to menu config and display init
+            state = get_state(wait=True)
+            if state == STATE_QUIT:
+                break
+        if state == STATE_QUIT:
+            break
+        continue  # ie. go back to menu config
 
     # menu
-    menu = Menu(args.dirpath, display, menu_config, position=last_menu_position, sleep=SLEEP)
+    menu = Menu(args.dirpath, display, menu_config, position=last_menu_position, sleep=SLEEP, shown=shown,
+                snapshot_path=snapshot_path)
     state = menu.run()
+    index.save()
     if state == STATE_MISSING_SOURCE:
         continue
     elif state == STATE_QUIT:
@@ -73,23 +189,30 @@ while state != STATE_QUIT:
     if state is not None:
         # item in menu was choosen
         choosen_path = os.path.join(args.dirpath, menu.get_choice())
-        files = get_entries(choosen_path, condition=check_file)
 
         # find appropriate view according to directory content
+        record = index.get_dir(menu.get_choice())
         View = None
-        for cls in [Video, Gallery]:
-            fn = getattr(cls, 'filter_files')
-            if len(fn(files)):
+        for cls in VIEWS:
+            if record is not None and record['view'] == cls.__name__:
                 View = cls
                 break
         if View is None:
             continue
+        if View is Gallery and record['config'][1]['grid']:
+            View = Grid
 
         # pass control to gallery or video view
         p = View(choosen_path, display)
         state = p.run()
-
-# close pygame
+        if render_cache is not None:
+            render_cache.flush()
+
+# close player and pygame
+if render_cache is not None:
+    render_cache.flush()
+tracer.dump()
+player.quit()
 pygame.display.quit()
 pygame.quit()
 
@@ -0,0 +1,148 @@
+"""
+Playback of animated GIFs.
+
+* Animation decode frames of animated GIF one by one in background thread, scale them to the size
+  of the still image shown by gallery (with the same scaler) and keep only few of them ahead in
+  bounded buffer, so even GIFs with hundreds of frames take fixed amount of memory
+
+Frames are decoded again in every loop instead of being kept. Frame durations are taken from GIF
+(too short ones are shown for 100 ms, like web browsers do). GIF without loop extension is played
+once, others are looped forever.
+
+Usage:
+    animation = Animation.open(path, size, limit, 'auto')  # None if image isn't animated (or Pillow is missing)
+    animation.start()
+    frame = animation.get_frame()                          # (surface, duration in seconds), or None if
+                                                           # it isn't decoded yet (EVENT_ANIMATION is
+                                                           # posted as soon as it is)
+    animation.stop()
+
+Requires Pillow, without it GIFs are shown as still images.
+"""
+
+import queue
+import threading
+
+import pygame
+
+from . import scheduler
+from .decoder import check_limit, to_rgb
+from .scaler import scaler
+from .states import EVENT_ANIMATION
+from .trace import tracer
+
+try:
+    from PIL import Image
+except ImportError:
+    Image = None
+
+# memory for decoded frames waiting in buffer
+ANIMATION_BUFFER = 16 * 1024 * 1024
+# frames shorter than this (in ms) are shown for DEFAULT_DURATION
+MIN_DURATION = 20
+DEFAULT_DURATION = 100
+
+
+def get_duration(img):
+    """
+    Return duration of current frame in seconds.
+    """
+    duration = img.info.get('duration') or 0
+    if duration < MIN_DURATION:
+        duration = DEFAULT_DURATION
+    return duration / 1000
+
+
+class Animation(threading.Thread):
+    def __init__(self, img, size, scaler_mode='quality', background=(0, 0, 0), budget=ANIMATION_BUFFER):
+        super().__init__(daemon=True)
+        self.img = img
+        self.size = tuple(size)
+        self.scaler_mode = scaler_mode
+        self.background = background
+        self.frames = img.n_frames
+        self.loop = img.info.get('loop') is not None
+        # first frame is already on screen as still image, decoding starts from the second one
+        self.first_duration = get_duration(img)
+        self.buffer = queue.Queue(maxsize=max(2, budget // (self.size[0] * self.size[1] * 4)))
+        self.lock = threading.Lock()
+        self.waiting = False
+        self.stopped = threading.Event()
+
+    @classmethod
+    def open(cls, path, size, limit=None, scaler_mode='quality', background=(0, 0, 0)):
+        """
+        Return Animation of given GIF, or None if it has only one frame or it can't be decoded.
+        Transparent pixels of frames are composed onto background.
+        """
+        if Image is None:
+            return None
+        try:
+            img = Image.open(path)
+            if img.format != 'GIF' or getattr(img, 'n_frames', 1) < 2:
+                img.close()
+                return None
+            check_limit(img.size, limit)
+        except Exception as e:
+            print('Animation of {} not available: {}'.format(path, e), flush=True)
+            return None
+        return cls(img, size, scaler_mode, background)
+
+    def decode(self, index):
+        """
+        Return (scaled surface, duration) of frame with given index.
+        """
+        with tracer.span('animation.decode'):
+            self.img.seek(index)
+            duration = get_duration(self.img)
+            frame = to_rgb(self.img, self.background)
+            surface = pygame.image.frombuffer(frame.tobytes(), frame.size, 'RGB')
+        with tracer.span('animation.scale'):
+            surface = scaler.scale(surface, self.size, self.scaler_mode)
+        return surface, duration
+
+    def put(self, frame):
+        """
+        Put frame into buffer, block while buffer is full. Return False if animation was stopped.
+        """
+        while not self.stopped.is_set():
+            try:
+                self.buffer.put(frame, timeout=0.1)
+            except queue.Full:
+                continue
+            with self.lock:
+                if self.waiting:
+                    self.waiting = False
+                    scheduler.post(pygame.event.Event(EVENT_ANIMATION))
+            return True
+        return False
+
+    def run(self):
+        index = 1
+        try:
+            while not self.stopped.is_set():
+                if not self.put(self.decode(index)):
+                    break
+                index += 1
+                if index == self.frames:
+                    if not self.loop:
+                        break
+                    index = 0
+        except Exception as e:
+            print('Animation stopped: {}'.format(e), flush=True)
+        finally:
+            self.img.close()
+
+    def get_frame(self):
+        """
+        Return next frame (surface, duration), or None if it isn't ready (or animation ended).
+        """
+        with self.lock:
+            try:
+                return self.buffer.get_nowait()
+            except queue.Empty:
+                self.waiting = True
+                return None
+
+    def stop(self):
+        self.stopped.set()
@@ -0,0 +1,111 @@
+"""
+Autoplay timing of gallery.
+
+* AutoplayClock plan flips of autoplay to absolute deadlines (every `delay` after the previous
+  deadline, not after the previous image was finally shown), ask for preparation of the next
+  frame a while before its deadline, and measure achieved intervals and jitter of flips
+
+Without absolute deadlines, every image would stay on screen `delay` plus time of its decoding
+and scaling, which differ from image to image and accumulate over the day. If a flip is late by
+more than half of the delay (image could not be prepared in time), plan is anchored again to the
+late flip instead of trying to catch up with quick flips.
+
+Usage:
+    clock = AutoplayClock(delay=5000)
+    clock.start()                 # next flip `delay` from now (also after user action)
+    clock.fired()                 # EVENT_AUTOPLAY arrived, plan the next deadline
+    clock.flipped(shown_at)       # image was shown, record its interval and jitter
+    clock.stop()
+    clock.stats()                 # dict with intervals and jitter in milliseconds
+"""
+
+import collections
+import time
+
+from . import scheduler
+from .states import EVENT_AUTOPLAY, EVENT_AUTOPLAY_PREPARE
+
+# how long before deadline the next frame is prepared (at most, half of delay for short ones)
+PREPARE_AHEAD = 1.0
+
+
+class AutoplayClock:
+    # number of recent flips kept for statistics
+    capacity = 512
+
+    def __init__(self, delay):
+        self.delay = delay / 1000
+        self.prepare_ahead = min(PREPARE_AHEAD, self.delay / 2)
+        self.running = False
+        self.deadline = None
+        self.target = None  # planned time of flip which is being shown
+        self.last_flip = None
+        self.intervals = collections.deque(maxlen=self.capacity)
+        self.jitters = collections.deque(maxlen=self.capacity)
+
+    def schedule(self):
+        scheduler.set_deadline(EVENT_AUTOPLAY_PREPARE, self.deadline - self.prepare_ahead)
+        scheduler.set_deadline(EVENT_AUTOPLAY, self.deadline)
+
+    def start(self):
+        """
+        Plan next flip `delay` from now. Interval of the current image isn't measured.
+        """
+        self.running = True
+        self.deadline = time.monotonic() + self.delay
+        self.target = None
+        self.last_flip = None
+        self.schedule()
+
+    def stop(self):
+        self.running = False
+        self.target = None
+        scheduler.set_deadline(EVENT_AUTOPLAY_PREPARE, None)
+        scheduler.set_deadline(EVENT_AUTOPLAY, None)
+
+    def fired(self, lead=0):
+        """
+        Deadline was reached, plan the next one. Flip is expected at the deadline (plus `lead`
+        seconds, if it is postponed, like in synchronized slideshow).
+        """
+        self.target = self.deadline + lead
+        now = time.monotonic()
+        self.deadline += self.delay
+        if self.deadline - now < self.delay / 2:
+            # too late, don't catch up
+            self.deadline = now + self.delay
+        self.schedule()
+
+    def flipped(self, at):
+        """
+        New image was shown at given time. Only planned flips are measured (not user's ones).
+        """
+        if self.target is not None:
+            jitter = at - self.target
+            self.jitters.append(jitter)
+            message = 'Autoplay flip {:+.1f} ms from deadline'.format(jitter * 1000)
+            if self.last_flip is not None:
+                interval = at - self.last_flip
+                self.intervals.append(interval)
+                message += ', image shown for {:.1f} ms'.format(interval * 1000)
+            print(message, flush=True)
+        self.target = None
+        self.last_flip = at
+
+    def stats(self):
+        """
+        Return statistics of recent flips in milliseconds (jitter percentiles are of absolute values).
+        """
+        stats = {'delay': round(self.delay * 1000), 'flips': len(self.jitters)}
+        if self.intervals:
+            intervals = sorted(self.intervals)
+            stats['interval_mean'] = round(sum(intervals) / len(intervals) * 1000, 3)
+            stats['interval_min'] = round(intervals[0] * 1000, 3)
+            stats['interval_max'] = round(intervals[-1] * 1000, 3)
+        if self.jitters:
+            jitters = sorted(abs(jitter) for jitter in self.jitters)
+            stats['jitter_mean'] = round(sum(self.jitters) / len(self.jitters) * 1000, 3)
+            stats['jitter_p50'] = round(jitters[len(jitters) // 2] * 1000, 3)
+            stats['jitter_p95'] = round(jitters[min(len(jitters) - 1, int(len(jitters) * 0.95))] * 1000, 3)
+            stats['jitter_max'] = round(jitters[-1] * 1000, 3)
+        return stats
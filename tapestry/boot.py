@@ -0,0 +1,56 @@
+"""
+Startup timeline.
+
+* boot mark milestones of program startup as time since the process was started (so interpreter
+  start and imports are included), up to the first screen pushed to display and beyond
+
+Every milestone is recorded only once (the first time it is reached), printed and recorded as
+tracer span `boot.<name>` if tracing is enabled. Whole timeline is in status of control API.
+
+Usage:
+    from tapestry import boot      # import it first, before pygame
+    boot.mark('imports')
+    boot.mark('first_update')      # called after the first pygame.display.update
+"""
+
+import os
+import time
+
+from .trace import tracer
+
+
+def get_process_age():
+    """
+    Return how many seconds ago the process was started (from /proc), or 0 if it is unknown.
+    """
+    try:
+        with open('/proc/self/stat') as f:
+            # fields after process name (which could contain spaces), starttime is 22nd field
+            start_ticks = int(f.read().rsplit(')', 1)[1].split()[19])
+        with open('/proc/uptime') as f:
+            uptime = float(f.read().split()[0])
+        return max(0, uptime - start_ticks / os.sysconf('SC_CLK_TCK'))
+    except (OSError, ValueError, IndexError):
+        return 0
+
+
+started = time.monotonic() - get_process_age()
+# list of (milestone, milliseconds since process start)
+timeline = [('interpreter', round((time.monotonic() - started) * 1000, 1))]
+
+
+def mark(name):
+    """
+    Record milestone of startup (ignored if it was already reached).
+    """
+    if any(milestone == name for milestone, _ in timeline):
+        return
+    elapsed = time.monotonic() - started
+    timeline.append((name, round(elapsed * 1000, 1)))
+    print('Boot: {} at {:.1f} ms'.format(name, elapsed * 1000), flush=True)
+    if tracer.enabled:
+        tracer.record('boot.' + name, elapsed)
+
+
+def get_timeline():
+    return dict(timeline)
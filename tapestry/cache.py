@@ -0,0 +1,83 @@
+"""
+In-memory cache of display ready images.
+
+* SurfaceCache is LRU cache of already scaled pygame surfaces limited by total size in bytes
+"""
+
+import collections
+import threading
+
+
+# default limit of cached surfaces, ie. roughly a dozen of 1920x1080 images
+CACHE_SIZE = 96 * 1024 * 1024
+
+
+class SurfaceCache:
+    """
+    LRU cache of scaled surfaces.
+
+    Usage:
+        cache = SurfaceCache(max_bytes=64 * 1024 * 1024)
+        cache.put(key, surface)
+        surface = cache.get(key)  # None if key is not cached
+
+    Key is arbitrary hashable value, Gallery use tuple (path, mtime, target_size). Once the sum of
+    surface sizes exceed `max_bytes`, least recently used surfaces are dropped.
+    """
+
+    def __init__(self, max_bytes=CACHE_SIZE):
+        self.max_bytes = max_bytes
+        self.bytes = 0
+        self.hits = 0
+        self.misses = 0
+        self.items = collections.OrderedDict()
+        self.lock = threading.Lock()
+
+    def __contains__(self, key):
+        with self.lock:
+            return key in self.items
+
+    def __len__(self):
+        return len(self.items)
+
+    def get(self, key):
+        """
+        Return cached surface for given key (and mark it as recently used) or None.
+        """
+        with self.lock:
+            surface = self.items.get(key)
+            if surface is None:
+                self.misses += 1
+                return None
+            self.items.move_to_end(key)
+            self.hits += 1
+            return surface
+
+    def put(self, key, surface):
+        """
+        Store surface under given key, drop least recently used surfaces if cache is full.
+        """
+        size = self.surface_bytes(surface)
+        with self.lock:
+            if key in self.items:
+                self.bytes -= self.surface_bytes(self.items.pop(key))
+            if size > self.max_bytes:
+                return
+            self.items[key] = surface
+            self.bytes += size
+            while self.bytes > self.max_bytes:
+                _, old = self.items.popitem(last=False)
+                self.bytes -= self.surface_bytes(old)
+
+    def clear(self):
+        with self.lock:
+            self.items.clear()
+            self.bytes = 0
+
+    @staticmethod
+    def surface_bytes(surface):
+        """
+        Return memory occupied by pixels of given surface.
+        """
+        width, height = surface.get_size()
+        return width * height * surface.get_bytesize()
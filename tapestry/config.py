@@ -26,6 +26,16 @@ class BaseConfig:
         """
         return os.path.exists(self.filepath) and os.path.isfile(self.filepath)
 
+    def get_mtime(self):
+        """
+        Return modification time of file (or None if it doesn't exist), so caller can find out
+        whether file need to be processed again.
+        """
+        try:
+            return os.stat(self.filepath).st_mtime_ns
+        except OSError:
+            return None
+
     def process(self):
         """
         Main method returning (status, config_dict), where status=True represent fact that provided
@@ -97,24 +107,61 @@ class GalleryConfig(BaseIniConfig):
     """
     defaults = {
         'autoplay': False,
+        'decode_limit': 30,
         'delay': 5000,
         'fontsize': 24,
+        'grid': False,
+        'grid_columns': 5,
         'margin': 20,
+        'prefetch': 2,
+        'scaler': 'quality',
         'screen_background': (0, 0, 0),
         'screen_color': (255, 255, 255),
+        'transition': 'none',
+        'transition_backend': 'pygame',
+        'transition_duration': 500,
     }
     section = 'gallery'
+    scalers = ['auto', 'fast', 'quality']
+    transitions = ['none', 'crossfade', 'slide']
+    transition_backends = ['numpy', 'pygame']
 
     def process_content(self, section):
         return [
             self.parse_item(section, 'autoplay', 'getboolean'),
+            self.parse_item(section, 'decode_limit', 'getint'),
             self.parse_item(section, 'delay', 'getint'),
             self.parse_item(section, 'fontsize', 'getint'),
+            self.parse_item(section, 'grid', 'getboolean'),
+            self.parse_item(section, 'grid_columns', 'getint'),
             self.parse_item(section, 'margin', 'getint'),
+            self.parse_item(section, 'prefetch', 'getint'),
+            self.parse_item(section, 'scaler', 'get', self.scaler_parser),
             self.parse_item(section, 'screen_background', 'get', self.color_parser),
             self.parse_item(section, 'screen_color', 'get', self.color_parser),
+            self.parse_item(section, 'transition', 'get', self.transition_parser),
+            self.parse_item(section, 'transition_backend', 'get', self.transition_backend_parser),
+            self.parse_item(section, 'transition_duration', 'getint'),
         ]
 
+    def scaler_parser(self, value):
+        value = value.strip().lower()
+        if value not in self.scalers:
+            raise RuntimeError
+        return value
+
+    def transition_parser(self, value):
+        value = value.strip().lower()
+        if value not in self.transitions:
+            raise RuntimeError
+        return value
+
+    def transition_backend_parser(self, value):
+        value = value.strip().lower()
+        if value not in self.transition_backends:
+            raise RuntimeError
+        return value
+
 
 class MenuConfig(BaseIniConfig):
     """
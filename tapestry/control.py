@@ -0,0 +1,279 @@
+"""
+Local control and status API.
+
+* Control thread serve tiny HTTP API on TCP address or Unix socket: what is on screen (view,
+  gallery and image index), hit rates of caches and render timings, and navigation commands which
+  are injected into main loop as the same states as button presses
+
+Server runs in its own thread with non-blocking sockets multiplexed by selector, so slow or
+numerous clients never block main loop, which only publish its status (one dict assignment, see
+`Display.set_status`). Still, the thread compete with main loop for CPU (and GIL), so its work is
+bounded: connections are accepted at most `max_rate` times per second (others wait in listen
+backlog of the kernel, which cost nothing) and status body is built at most once per `status_ttl`
+seconds, repeated requests get the same bytes.
+
+Usage:
+    control = Control(display, '127.0.0.1:8080')    # or path of Unix socket '/run/tapestry.sock'
+    control.start()
+
+    curl http://127.0.0.1:8080/status
+    curl -X POST http://127.0.0.1:8080/command/next  # next, prev, action, long_action, back
+    curl --unix-socket /run/tapestry.sock http://localhost/status
+"""
+
+import json
+import os
+import selectors
+import socket
+import stat
+import threading
+import time
+
+import pygame
+
+from . import boot, scheduler
+from .states import EVENT_CONTROL, STATE_ACTION, STATE_BACK, STATE_LONG_ACTION, STATE_NEXT, STATE_PREV
+from .trace import tracer
+
+# commands accepted by API, they have the same effect as buttons
+COMMANDS = {
+    'next': STATE_NEXT,
+    'prev': STATE_PREV,
+    'action': STATE_ACTION,
+    'long_action': STATE_LONG_ACTION,
+    'back': STATE_BACK,
+}
+
+REASONS = {200: 'OK', 202: 'Accepted', 400: 'Bad Request', 404: 'Not Found', 405: 'Method Not Allowed',
+           503: 'Service Unavailable'}
+
+
+def parse_address(address):
+    """
+    Return (family, address) for 'host:port', ':port' or path of Unix socket.
+    """
+    if '/' in address:
+        return socket.AF_UNIX, address
+    host, _, port = address.rpartition(':')
+    return socket.AF_INET, (host or '127.0.0.1', int(port))
+
+
+class Connection:
+    __slots__ = ('sock', 'inbuf', 'outbuf', 'deadline')
+
+    def __init__(self, sock, deadline):
+        self.sock = sock
+        self.inbuf = b''
+        self.outbuf = b''
+        self.deadline = deadline
+
+
+class Control(threading.Thread):
+    """
+    Background HTTP server. Connections are closed after each response (no keep-alive).
+    """
+    # max size of request head, longer requests are refused
+    max_request = 8192
+    # more clients are refused immediately
+    max_connections = 32
+    # accepted connections per second
+    max_rate = 50
+    # clients which don't send whole request in time are disconnected
+    timeout = 5
+    # status body is cached for this many seconds
+    status_ttl = 0.2
+
+    def __init__(self, display, address):
+        super().__init__(daemon=True)
+        self.display = display
+        self.address = address
+        self.family, self.bind_address = parse_address(address)
+        self.connections = {}  # fd -> Connection
+        self.status_body = None
+        self.status_expire = 0
+        self.started_at = time.time()
+        self.requests = 0
+        self.accept_after = 0
+        self.listening = True
+        self.selector = selectors.DefaultSelector()
+        self.sock = self.open_socket()
+
+    def open_socket(self):
+        sock = socket.socket(self.family, socket.SOCK_STREAM)
+        if self.family == socket.AF_UNIX:
+            try:
+                # stale socket of previous run (anything else at the path is not ours to remove)
+                if not stat.S_ISSOCK(os.stat(self.bind_address).st_mode):
+                    sock.close()
+                    raise ValueError('{} exists and it is not a socket'.format(self.bind_address))
+                os.remove(self.bind_address)
+            except FileNotFoundError:
+                pass
+        else:
+            sock.setsockopt(socket.SOL_SOCKET, socket.SO_REUSEADDR, 1)
+        sock.bind(self.bind_address)
+        sock.listen(16)
+        sock.setblocking(False)
+        self.selector.register(sock, selectors.EVENT_READ)
+        return sock
+
+    def get_cache_stats(self):
+        caches = {
+            'image': self.display.image_cache,
+            'text': self.display.text_cache,
+            'tile': self.display.tile_cache,
+            'thumb': self.display.thumb_cache,
+        }
+        if self.display.render_cache is not None:
+            caches['render'] = self.display.render_cache
+        stats = {}
+        for name, cache in caches.items():
+            total = cache.hits + cache.misses
+            stats[name] = {
+                'hits': cache.hits,
+                'misses': cache.misses,
+                'hit_rate': round(cache.hits / total, 3) if total else None,
+                'items': len(cache.entries if name == 'render' else cache.items),
+                'bytes': cache.bytes,
+            }
+        return stats
+
+    def get_status(self):
+        """
+        Return JSON encoded status, rebuilt only if cached one is too old.
+        """
+        now = time.monotonic()
+        if self.status_body is None or now >= self.status_expire:
+            status = {
+                'screen': self.display.get_status(),
+                'uptime': round(time.time() - self.started_at, 1),
+                'boot': boot.get_timeline(),
+                'requests': self.requests,
+                'scheduler_wakeups': scheduler.scheduler.wakeups,
+                'caches': self.get_cache_stats(),
+                'timings': tracer.snapshot(spans=False)['histograms'] if tracer.enabled else None,
+            }
+            self.status_body = json.dumps(status, sort_keys=True).encode('utf-8')
+            self.status_expire = now + self.status_ttl
+        return self.status_body
+
+    def handle(self, head):
+        """
+        Return (HTTP status code, JSON body) for request with given head.
+        """
+        try:
+            method, path, _ = head.split(b'\r\n', 1)[0].decode('ascii').split(' ', 2)
+        except (UnicodeDecodeError, ValueError):
+            return 400, b'{"error": "malformed request"}'
+        path = path.split('?', 1)[0].rstrip('/')
+
+        if path == '/status':
+            if method not in ['GET', 'HEAD']:
+                return 405, b'{"error": "use GET"}'
+            return 200, self.get_status()
+
+        if path.startswith('/command/'):
+            name = path[len('/command/'):]
+            if name not in COMMANDS:
+                return 404, json.dumps({'error': 'unknown command', 'commands': sorted(COMMANDS)}).encode('utf-8')
+            if method != 'POST':
+                return 405, b'{"error": "use POST"}'
+            scheduler.post(pygame.event.Event(EVENT_CONTROL, state=COMMANDS[name]))
+            return 202, json.dumps({'command': name}).encode('utf-8')
+
+        return 404, b'{"error": "not found"}'
+
+    def respond(self, conn, code, body, head_only=False):
+        """
+        Queue response for sending, only headers (with length of the body) if `head_only` is set.
+        """
+        head = 'HTTP/1.0 {} {}\r\nContent-Type: application/json\r\nContent-Length: {}\r\nConnection: close\r\n\r\n'
+        conn.outbuf = head.format(code, REASONS[code], len(body)).encode('ascii') + (b'' if head_only else body)
+        self.selector.modify(conn.sock, selectors.EVENT_WRITE)
+
+    def accept(self):
+        """
+        Accept one connection and stop listening until next one is allowed by rate limit.
+        """
+        try:
+            sock, _ = self.sock.accept()
+        except (BlockingIOError, InterruptedError):
+            return
+        except OSError as e:
+            print('Control: unable to accept connection: {}'.format(e), flush=True)
+            return
+        now = time.monotonic()
+        self.accept_after = now + 1 / self.max_rate
+        self.selector.unregister(self.sock)
+        self.listening = False
+
+        sock.setblocking(False)
+        conn = Connection(sock, now + self.timeout)
+        self.connections[sock.fileno()] = conn
+        self.selector.register(sock, selectors.EVENT_READ)
+        if len(self.connections) > self.max_connections:
+            self.respond(conn, 503, b'{"error": "too many connections"}')
+
+    def read(self, conn):
+        try:
+            data = conn.sock.recv(4096)
+        except (BlockingIOError, InterruptedError):
+            return
+        except OSError:
+            data = b''
+        if not data:
+            self.close(conn)
+            return
+        conn.inbuf += data
+        if b'\r\n\r\n' in conn.inbuf:
+            self.requests += 1
+            code, body = self.handle(conn.inbuf)
+            self.respond(conn, code, body, head_only=conn.inbuf.startswith(b'HEAD '))
+        elif len(conn.inbuf) > self.max_request:
+            self.respond(conn, 400, b'{"error": "request too long"}')
+
+    def write(self, conn):
+        try:
+            sent = conn.sock.send(conn.outbuf)
+        except (BlockingIOError, InterruptedError):
+            return
+        except OSError:
+            sent = len(conn.outbuf)
+        conn.outbuf = conn.outbuf[sent:]
+        if not conn.outbuf:
+            self.close(conn)
+
+    def close(self, conn):
+        self.connections.pop(conn.sock.fileno(), None)
+        self.selector.unregister(conn.sock)
+        conn.sock.close()
+
+    def expire(self):
+        now = time.monotonic()
+        for conn in list(self.connections.values()):
+            if conn.deadline < now:
+                self.close(conn)
+
+    def run(self):
+        print('Control API listening on {}'.format(self.address), flush=True)
+        while True:
+            timeout = 1
+            if not self.listening:
+                remaining = self.accept_after - time.monotonic()
+                if remaining <= 0:
+                    self.selector.register(self.sock, selectors.EVENT_READ)
+                    self.listening = True
+                else:
+                    timeout = remaining
+            for key, events in self.selector.select(timeout):
+                if key.fileobj is self.sock:
+                    self.accept()
+                    continue
+                conn = self.connections.get(key.fd)
+                if conn is None:
+                    continue
+                if events & selectors.EVENT_READ:
+                    self.read(conn)
+                elif events & selectors.EVENT_WRITE:
+                    self.write(conn)
+            self.expire()
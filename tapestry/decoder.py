@@ -0,0 +1,221 @@
+"""
+Image decoding.
+
+* get_image_size read image dimensions from file header without decoding pixels
+* load_image decode image, JPEGs are decoded directly in reduced resolution if possible
+
+Reduced decoding require Pillow (`python3-pil` package). If it is not installed, images are
+decoded by pygame in full resolution (and TIFFs can't be decoded at all).
+
+Decoding can be limited by number of pixels, so huge scans don't exhaust memory: JPEGs are
+decoded in reduced scale, from pyramidal TIFFs the smallest sufficient subimage is decoded. If
+image can't be decoded within limit, DecodeLimitError is raised before any pixel is decoded.
+
+Decoded images are opaque: transparent pixels (alpha channel, GIF transparency) are composed onto
+given background, as they would look on the screen, so scaled images can be converted to display
+format and stored in render cache without alpha.
+"""
+
+import struct
+
+import pygame
+
+try:
+    from PIL import Image
+except ImportError:
+    Image = None
+
+
+# default limit of decoded image size in pixels (~120 MB as RGBA surface)
+DECODE_LIMIT = 30 * 1000 * 1000
+
+JPEG_SOF_MARKERS = {0xc0, 0xc1, 0xc2, 0xc3, 0xc5, 0xc6, 0xc7, 0xc9, 0xca, 0xcb, 0xcd, 0xce, 0xcf}
+
+
+def get_jpeg_size(f):
+    """
+    Return (width, height) from JPEG start of frame segment.
+    """
+    if f.read(2) != b'\xff\xd8':
+        return None
+    while True:
+        marker = f.read(2)
+        if len(marker) != 2 or marker[0] != 0xff:
+            return None
+        if marker[1] == 0xff:
+            # fill byte, marker follows
+            f.seek(-1, 1)
+            continue
+        if marker[1] in (0x01, 0xd0, 0xd1, 0xd2, 0xd3, 0xd4, 0xd5, 0xd6, 0xd7):
+            # markers without payload
+            continue
+        length = f.read(2)
+        if len(length) != 2:
+            return None
+        length = struct.unpack('>H', length)[0]
+        if marker[1] in JPEG_SOF_MARKERS:
+            data = f.read(5)
+            if len(data) != 5:
+                return None
+            height, width = struct.unpack('>xHH', data)
+            return (width, height)
+        f.seek(length - 2, 1)
+
+
+def get_png_size(f):
+    data = f.read(24)
+    if len(data) != 24 or data[:8] != b'\x89PNG\r\n\x1a\n' or data[12:16] != b'IHDR':
+        return None
+    return struct.unpack('>II', data[16:24])
+
+
+def get_gif_size(f):
+    data = f.read(10)
+    if len(data) != 10 or data[:6] not in (b'GIF87a', b'GIF89a'):
+        return None
+    return struct.unpack('<HH', data[6:10])
+
+
+def get_bmp_size(f):
+    data = f.read(26)
+    if len(data) != 26 or data[:2] != b'BM':
+        return None
+    width, height = struct.unpack('<ii', data[18:26])
+    return (width, abs(height))
+
+
+def get_tiff_size(f):
+    """
+    Return (width, height) from the first image file directory of TIFF.
+    """
+    data = f.read(8)
+    if len(data) != 8 or data[:4] not in (b'II*\x00', b'MM\x00*'):
+        return None
+    order = '<' if data[:2] == b'II' else '>'
+    f.seek(struct.unpack(order + 'I', data[4:8])[0])
+    count = struct.unpack(order + 'H', f.read(2))[0]
+    size = {}
+    for _ in range(count):
+        tag, kind, _, value = struct.unpack(order + 'HHI4s', f.read(12))
+        if tag in (256, 257):
+            # SHORT or LONG value stored directly in entry
+            size[tag] = struct.unpack(order + ('H' if kind == 3 else 'I'), value[:2 if kind == 3 else 4])[0]
+    if 256 not in size or 257 not in size:
+        return None
+    return (size[256], size[257])
+
+
+def get_image_size(path):
+    """
+    Return (width, height) of image read from file header, or None if format is not recognized.
+    """
+    try:
+        with open(path, 'rb') as f:
+            for fn in [get_jpeg_size, get_png_size, get_gif_size, get_bmp_size, get_tiff_size]:
+                f.seek(0)
+                size = fn(f)
+                if size is not None:
+                    return tuple(size)
+    except (OSError, struct.error):
+        pass
+    return None
+
+
+def is_jpeg(path):
+    try:
+        with open(path, 'rb') as f:
+            return f.read(3) == b'\xff\xd8\xff'
+    except OSError:
+        return False
+
+
+class DecodeLimitError(Exception):
+    """
+    Image can't be decoded within given limit of pixels.
+    """
+
+
+def check_limit(size, limit):
+    if limit and size[0] * size[1] > limit:
+        raise DecodeLimitError('{}x{} px exceeds decode limit of {:.1f} Mpx'.format(
+            size[0], size[1], limit / 1000000))
+
+
+def select_subimage(img, size):
+    """
+    Seek multi-page (pyramidal) TIFF to the smallest subimage which still cover given size, or to
+    the largest one if none of them does.
+    """
+    candidates = []
+    for frame in range(getattr(img, 'n_frames', 1)):
+        img.seek(frame)
+        candidates.append((img.size[0] * img.size[1], frame, img.size))
+    covering = [c for c in candidates if size is None or (c[2][0] >= size[0] and c[2][1] >= size[1])]
+    if size is not None and covering:
+        img.seek(min(covering)[1])
+    else:
+        img.seek(max(candidates)[1])
+
+
+def to_truecolor(surface, background=(0, 0, 0)):
+    """
+    Return 24-bit opaque copy of palette (8-bit) surface like GIF, which can't be smoothly scaled,
+    or of transparent surface (composed onto background).
+    """
+    if surface.get_bitsize() >= 24 and not surface.get_flags() & pygame.SRCALPHA and surface.get_colorkey() is None:
+        return surface
+    converted = pygame.Surface(surface.get_size(), 0, 24)
+    converted.fill(background)
+    converted.blit(surface, (0, 0))
+    return converted
+
+
+def to_rgb(img, background=(0, 0, 0)):
+    """
+    Return Pillow image in RGB mode, transparent pixels are composed onto background.
+    """
+    if img.mode in ('RGBA', 'LA', 'PA') or 'transparency' in img.info:
+        img = img.convert('RGBA')
+        composed = Image.new('RGB', img.size, tuple(background))
+        composed.paste(img, mask=img.split()[3])
+        return composed
+    if img.mode != 'RGB':
+        return img.convert('RGB')
+    return img
+
+
+def load_image(path, size=None, limit=None, background=(0, 0, 0)):
+    """
+    Return pygame surface with decoded image.
+
+    If size is provided and image is JPEG, it is decoded at the largest 1/2, 1/4 or 1/8 scale
+    which still cover given size (so returned surface could be smaller than original image,
+    but never smaller than requested size). Other formats are decoded in full resolution.
+
+    If limit is provided, image is never decoded in resolution with more pixels, DecodeLimitError
+    is raised instead. Transparent images are composed onto background.
+    """
+    if Image is None:
+        header_size = get_image_size(path)
+        if header_size is not None:
+            check_limit(header_size, limit)
+        return to_truecolor(pygame.image.load(path), background)
+
+    try:
+        img = Image.open(path)
+    except getattr(Image, 'DecompressionBombError', ()) as e:
+        raise DecodeLimitError(str(e))
+
+    with img:
+        # only header is read so far, size can be reduced before decoding
+        if img.format == 'JPEG' and size is not None:
+            img.draft('RGB', tuple(size))
+        elif img.format == 'TIFF':
+            select_subimage(img, size)
+        check_limit(img.size, limit)
+
+        if img.format not in ('JPEG', 'TIFF'):
+            return to_truecolor(pygame.image.load(path), background)
+
+        img = to_rgb(img, background)
+        return pygame.image.frombuffer(img.tobytes(), img.size, 'RGB')
@@ -0,0 +1,209 @@
+"""
+Persistent cache of scaled images.
+
+* RenderCache store already scaled images as zlib compressed pixels in writable directory (USB
+  disk, tmpfs)
+* recency of entries is kept in memory, modification times of files (used to restore it after
+  restart) are updated only by flush
+"""
+
+import hashlib
+import os
+import struct
+import threading
+import time
+import zlib
+
+import pygame
+
+
+# default limit of cache directory size
+RENDER_CACHE_SIZE = 1024 * 1024 * 1024
+# fastest zlib level, reading and decompressing is still much cheaper than reading raw pixels
+# (and it is a lot cheaper than decoding JPEG)
+COMPRESS_LEVEL = 1
+
+
+class RenderCache:
+    """
+    Directory with scaled images stored as compressed RGB pixels, limited by total size in bytes.
+
+    Usage:
+        cache = RenderCache('/media/usb/cache', max_bytes=512 * 1024 * 1024)
+        key = cache.get_key(path, extra=(margin, fontsize, display_size))
+        surface = cache.get(key)  # None if image is not cached (or entry is corrupted)
+        cache.put(key, surface)
+        cache.flush()             # store recency of used entries (when it is not busy)
+
+    Key contains source path, mtime and size of the source file and all values which affect
+    final look of the image, so stale entries are never returned. They are just not used anymore
+    and sooner or later they are evicted as least recently used ones.
+    """
+    magic = b'TPST2'
+    header = struct.Struct('<5sHHI')  # magic, width, height, payload length (zlib has its own checksum)
+    suffix = '.raw'
+
+    def __init__(self, dirpath, max_bytes=RENDER_CACHE_SIZE):
+        self.dirpath = os.path.abspath(dirpath)
+        self.max_bytes = max_bytes
+        self.lock = threading.Lock()
+        self.entries = {}  # filename -> (last usage, size)
+        self.used = set()  # filenames with last usage not written to disk yet
+        self.bytes = 0
+        self.hits = 0
+        self.misses = 0
+        os.makedirs(self.dirpath, exist_ok=True)
+        self.scan()
+
+    def scan(self):
+        """
+        Read content of cache directory into memory index.
+        """
+        with self.lock:
+            self.entries = {}
+            self.used = set()
+            for entry in os.scandir(self.dirpath):
+                if not entry.name.endswith(self.suffix) or not entry.is_file():
+                    continue
+                stat = entry.stat()
+                self.entries[entry.name] = (stat.st_mtime, stat.st_size)
+            self.bytes = sum(size for _, size in self.entries.values())
+        print('Render cache {}: {} entries, {} bytes'.format(self.dirpath, len(self.entries), self.bytes), flush=True)
+
+    def get_key(self, path, extra=None):
+        """
+        Return cache key (ie. filename in cache directory) for given source image and extra values.
+        """
+        stat = os.stat(path)
+        raw = repr((os.path.abspath(path), stat.st_mtime_ns, stat.st_size, extra))
+        return hashlib.sha1(raw.encode('utf-8')).hexdigest() + self.suffix
+
+    def get(self, key):
+        """
+        Return cached surface or None if there is no valid entry for given key.
+        """
+        with self.lock:
+            if key not in self.entries:
+                self.misses += 1
+                return None
+
+        filepath = os.path.join(self.dirpath, key)
+        try:
+            with open(filepath, 'rb') as f:
+                data = f.read()
+            surface = self.decode(data)
+        except (OSError, ValueError, struct.error, zlib.error, pygame.error) as e:
+            print('Ignoring render cache entry {}: {}'.format(key, e), flush=True)
+            self.remove(key)
+            self.misses += 1
+            return None
+
+        self.touch(key)
+        self.hits += 1
+        return surface
+
+    def put(self, key, surface):
+        """
+        Store surface in cache, evict least recently used entries if cache is full.
+        """
+        data = self.encode(surface)
+        if len(data) > self.max_bytes:
+            return
+
+        filepath = os.path.join(self.dirpath, key)
+        tmppath = '{}.{}.tmp'.format(filepath, threading.get_ident())
+        try:
+            with open(tmppath, 'wb') as f:
+                f.write(data)
+            os.replace(tmppath, filepath)
+        except OSError as e:
+            print('Unable to write render cache entry {}: {}'.format(key, e), flush=True)
+            try:
+                os.remove(tmppath)
+            except OSError:
+                pass
+            return
+
+        with self.lock:
+            old = self.entries.get(key)
+            if old is not None:
+                self.bytes -= old[1]
+            self.entries[key] = (os.path.getmtime(filepath), len(data))
+            self.bytes += len(data)
+        self.evict()
+
+    def touch(self, key):
+        """
+        Mark entry as recently used (in memory only, see flush).
+        """
+        with self.lock:
+            if key in self.entries:
+                self.entries[key] = (time.time(), self.entries[key][1])
+                self.used.add(key)
+
+    def flush(self):
+        """
+        Write last usage of entries used since previous flush as modification time of their files.
+        """
+        with self.lock:
+            used = [(key, self.entries[key][0]) for key in self.used if key in self.entries]
+            self.used = set()
+        for key, mtime in used:
+            try:
+                os.utime(os.path.join(self.dirpath, key), (mtime, mtime))
+            except OSError:
+                pass
+
+    def remove(self, key):
+        with self.lock:
+            self.used.discard(key)
+            entry = self.entries.pop(key, None)
+            if entry is not None:
+                self.bytes -= entry[1]
+        try:
+            os.remove(os.path.join(self.dirpath, key))
+        except OSError:
+            pass
+
+    def evict(self):
+        """
+        Remove least recently used entries until cache fit into its byte budget.
+        """
+        with self.lock:
+            if self.bytes <= self.max_bytes:
+                return
+            victims = []
+            for key, (mtime, size) in sorted(self.entries.items(), key=lambda i: i[1][0]):
+                if self.bytes <= self.max_bytes:
+                    break
+                victims.append(key)
+                self.bytes -= size
+                del self.entries[key]
+                self.used.discard(key)
+        for key in victims:
+            try:
+                os.remove(os.path.join(self.dirpath, key))
+            except OSError:
+                pass
+
+    def encode(self, surface):
+        """
+        Return surface serialized into bytes (header + compressed RGB pixels).
+        """
+        width, height = surface.get_size()
+        payload = zlib.compress(pygame.image.tostring(surface, 'RGB'), COMPRESS_LEVEL)
+        return self.header.pack(self.magic, width, height, len(payload)) + payload
+
+    def decode(self, data):
+        """
+        Return surface deserialized from bytes. Raise ValueError (or zlib.error) if data are
+        corrupted.
+        """
+        magic, width, height, length = self.header.unpack_from(data)
+        payload = data[self.header.size:]
+        if magic != self.magic or length != len(payload):
+            raise ValueError('invalid header')
+        pixels = zlib.decompress(payload)
+        if len(pixels) != width * height * 3:
+            raise ValueError('invalid size')
+        return pygame.image.fromstring(pixels, (width, height), 'RGB')
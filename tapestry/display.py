@@ -1,36 +1,118 @@
 import os
 import pygame
 import pygame.locals
+import threading
+import time
 
+from . import boot
+from .cache import SurfaceCache
+
+# limit of cached rendered texts (menu items, gallery titles)
+TEXT_CACHE_SIZE = 16 * 1024 * 1024
+# limit of cached tiles of zoomed images
+TILE_CACHE_SIZE = 32 * 1024 * 1024
+# limit of cached thumbnails of grid view
+THUMB_CACHE_SIZE = 16 * 1024 * 1024
 
 SCRIPT_PATH = os.path.realpath(__file__)
 SCRIPT_DIR = os.path.dirname(SCRIPT_PATH)
 
 
 class Display:
+    """
+    Long-lived display session. Screen, fonts and assets are initialized once and kept for whole
+    run of the program, video mode is re-created only if it was released.
+    """
     size = None
     screen = None
     font = None
     pause = None
+    back_pressed_at = None
 
-    def __init__(self, config):
+    def __init__(self, config, render_cache=None, watcher=None, index=None, player=None, sync=None):
         self.config = config
+        self.render_cache = render_cache
+        self.watcher = watcher
+        self.index = index
+        self.player = player
+        self.sync = sync
         self.fontpath = self.get_asset_path('roboto_condensed.ttf')
         self.pausepath = self.get_asset_path('pause.png')
+        self.image_cache = SurfaceCache()
+        self.fonts = {}
+        self.text_cache = SurfaceCache(TEXT_CACHE_SIZE)
+        self.tile_cache = SurfaceCache(TILE_CACHE_SIZE)
+        self.thumb_cache = SurfaceCache(THUMB_CACHE_SIZE)
+        self.text_lock = threading.Lock()  # SDL_ttf is not thread safe
+        self.prerender_stop = None
+        self.status = {}  # what is on screen, see set_status
 
     def init_screen(self, complete=True):
         """
         Basic initialization, mostly related to PyGame and framebuffer.
         """
         if complete:
-            os.putenv('SDL_VIDEODRIVER', 'fbcon')
+            if 'SDL_VIDEODRIVER' not in os.environ:
+                # framebuffer by default, other drivers (like dummy in benchmarks) could be set explicitly
+                os.putenv('SDL_VIDEODRIVER', 'fbcon')
             pygame.init()
+        self.set_mode()
+        self.font = self.load_font(self.config['fontsize'])
+        self.pause = self.load_pause()
+
+    def set_mode(self):
+        """
+        Set fullscreen video mode in native resolution.
+        """
         self.size = [pygame.display.Info().current_w, pygame.display.Info().current_h]
         print('Setting resolution to {}x{} pixels'.format(*self.size))
         pygame.mouse.set_visible(False)
+        # main loops sleep until some event arrive, don't wake them up by irrelevant events
+        pygame.event.set_blocked([pygame.MOUSEMOTION, pygame.MOUSEBUTTONDOWN, pygame.MOUSEBUTTONUP])
         self.screen = pygame.display.set_mode(self.size, pygame.FULLSCREEN)
-        self.font = self.load_font(self.config['fontsize'])
-        self.pause = self.load_pause()
+
+    def ensure_screen(self):
+        """
+        Re-create video mode if it was released (for example video player need framebuffer for itself).
+        Return True if video mode was re-created.
+        """
+        if pygame.display.get_init() and pygame.display.get_surface() is not None:
+            return False
+        pygame.display.init()
+        size = self.size
+        self.set_mode()
+        if self.size != size:
+            self.pause = self.load_pause()
+        return True
+
+    def set_config(self, config):
+        """
+        Use new menu configuration, font is reloaded only if its size changed.
+        """
+        if config['fontsize'] != self.config['fontsize']:
+            self.font = self.load_font(config['fontsize'])
+        self.config = config
+
+    def set_status(self, view, **values):
+        """
+        Publish what is on screen (for control API). Whole dict is replaced, so other threads can
+        read it without locking.
+        """
+        values['view'] = view
+        values['since'] = round(time.time(), 3)
+        self.status = values
+
+    def get_status(self):
+        return dict(self.status)
+
+    def report_back_latency(self):
+        """
+        Print how long it took from leaving gallery/video to visible menu.
+        """
+        if self.back_pressed_at is None:
+            return
+        print('Back to menu in {:.1f} ms'.format((time.perf_counter() - self.back_pressed_at) * 1000), flush=True)
+        self.back_pressed_at = None
 
     def render_no_source(self):
         """
@@ -39,17 +121,19 @@ class Display:
         """
         self.screen.fill(self.config['screen_background'])
         msg = 'Čekám na připojení USB klíčenky s daty pro projekci.'
-        text = self.font.render(msg, True, self.config['screen_color'])
+        text = self.render_text(msg, self.config['fontsize'], self.config['screen_color'])
         text_size = text.get_rect().size
         text_x = self.size[0] / 2 - text_size[0] / 2
         text_y = self.size[1] / 2 - text_size[1] / 2
         self.screen.blit(text, (text_x, text_y))
         pygame.display.update()
+        boot.mark('first_update')
+        self.set_status('no_source')
 
     def render_no_entries(self):
         self.screen.fill(self.config['screen_background'])
         msg = 'Na zadané cestě jsem nic nenašel...'
-        text = self.font.render(msg, True, self.config['screen_color'])
+        text = self.render_text(msg, self.config['fontsize'], self.config['screen_color'])
         text_size = text.get_rect().size
         text_x = self.size[0] / 2 - text_size[0] / 2
         text_y = self.size[1] / 2 - text_size[1] / 2
@@ -67,9 +151,50 @@ class Display:
 
     def load_font(self, size):
         """
-        Return Font instance of given size.
+        Return Font instance of given size. Fonts are loaded from file only once.
+        """
+        font = self.fonts.get(size)
+        if font is None:
+            font = pygame.font.Font(self.fontpath, size)
+            self.fonts[size] = font
+        return font
+
+    def render_text(self, text, size, color):
         """
-        return pygame.font.Font(self.fontpath, size)
+        Return surface with rendered text. Rendered texts are cached, so each combination of text,
+        font size and color is rendered only once (until it is evicted from cache).
+        """
+        key = (text, size, tuple(color))
+        surface = self.text_cache.get(key)
+        if surface is None:
+            font = self.load_font(size)
+            with self.text_lock:
+                surface = font.render(text, True, color)
+            self.text_cache.put(key, surface)
+        return surface
+
+    def prerender_texts(self, texts, size, color):
+        """
+        Render given texts into cache in background thread. Previous unfinished prerendering
+        is stopped.
+        """
+        self.stop_prerender()
+        stop = threading.Event()
+        self.prerender_stop = stop
+        self.load_font(size)  # fonts are loaded in main thread
+
+        def worker():
+            for text in texts:
+                if stop.is_set():
+                    break
+                self.render_text(text, size, color)
+
+        threading.Thread(target=worker, daemon=True).start()
+
+    def stop_prerender(self):
+        if self.prerender_stop is not None:
+            self.prerender_stop.set()
+            self.prerender_stop = None
 
     def load_pause(self):
         """
@@ -5,23 +5,44 @@ import pygame.locals
 import re
 import time
 
+from . import scheduler
+from .animation import Animation
+from .autoplay import AutoplayClock
 from .config import GalleryConfig, TitlesConfig
-from .detective import get_entries, check_file
-from .states import get_state, STATE_ACTION, STATE_BACK, STATE_MISSING_SOURCE, STATE_NEXT, STATE_PREV, STATE_QUIT
+from .decoder import get_image_size, load_image, DecodeLimitError
+from .pack import FramePack
+from .prefetch import Prefetcher
+from .scaler import scaler
+from .states import get_state, EVENT_ANIMATION, STATE_ACTION, STATE_ANIMATION, STATE_AUTOPLAY, STATE_AUTOPLAY_PREPARE, \
+    STATE_BACK, STATE_LONG_ACTION, STATE_MISSING_SOURCE, STATE_NEXT, STATE_PREV, STATE_QUIT, STATE_SOURCE_CHANGED, STATE_SOURCE_MOUNTED, STATE_SYNC
+from .trace import tracer
+from .transition import Transition
 from .view import View
+from .zoom import TilePyramid, Zoom
 
 
 class Gallery(View):
-    filename_re = re.compile(r'^[^.].+\.(jpg|jpeg|gif|png|bmp)$', re.IGNORECASE)
+    filename_re = re.compile(r'^[^.].+\.(jpg|jpeg|gif|png|bmp|tif|tiff)$', re.IGNORECASE)
+    # pack of already scaled images (see pack module), opened in run
+    pack = None
+    # playback of animated GIF which is on screen (see animation module)
+    animation = None
+
+    def __init__(self, dirpath, display, sleep=3, position=0):
+        super().__init__(dirpath, display, sleep)
+        self.position = position
 
     def load_config(self):
-        gc = GalleryConfig(self.dirpath)
-        status, config = gc.process()
+        record = self.get_record()
+        if record is not None and 'config' in record:
+            status, config = record['config']
+        else:
+            gc = GalleryConfig(self.dirpath)
+            status, config = gc.process()
 
         self.autoplay = config['autoplay']
         self.x_spacing = config['margin'] * 2
         self.y_spacing = config['margin'] * 3 + config['fontsize']
-        self.font = self.display.load_font(config['fontsize'])
 
         if not status:
             print('No configuration file found.', flush=True)
@@ -34,8 +55,12 @@ class Gallery(View):
         return config
 
     def load_titles(self):
-        tc = TitlesConfig(self.dirpath)
-        status, config = tc.process()
+        record = self.get_record()
+        if record is not None and 'titles' in record:
+            status, config = record['titles']
+        else:
+            tc = TitlesConfig(self.dirpath)
+            status, config = tc.process()
 
         if not status:
             print('No titles file found.', flush=True)
@@ -69,87 +94,463 @@ class Gallery(View):
 
         return (int(width), int(height))
 
-    def get_state(self):
+    def get_state(self, wait=False):
         """
         Return current state according to events on keyboard (and timer).
         """
-        state = get_state()
+        state = get_state(wait=wait)
+        if state == STATE_SOURCE_MOUNTED:
+            return None
+        if state in [STATE_AUTOPLAY, STATE_AUTOPLAY_PREPARE]:
+            if not self.autoplay_clock.running:
+                # event of already stopped autoplay
+                return None
+            if state == STATE_AUTOPLAY:
+                # leader of synchronized slideshow show next image a while after the deadline
+                sync = self.display.sync
+                self.autoplay_clock.fired(sync.lead if sync is not None and sync.is_leader() else 0)
+            return state
+        if state in [STATE_SOURCE_CHANGED, STATE_LONG_ACTION, STATE_SYNC, STATE_ANIMATION]:
+            # not user action (or zoom), autoplay stays as it is
+            return state
         if state == STATE_ACTION:
             self.autoplay = not self.autoplay
         if state is not None:
             if state == STATE_ACTION and not self.autoplay:
-                pygame.time.set_timer(pygame.USEREVENT, 0)
+                self.set_autoplay_timer(False)
             else:
                 self.autoplay = True
-                pygame.time.set_timer(pygame.USEREVENT, 0)
-                pygame.time.set_timer(pygame.USEREVENT, self.config['delay'])
+                self.set_autoplay_timer()
 
         return state
 
-    def render_screen(self, imgpath, title):
+    def set_autoplay_timer(self, enabled=True):
+        """
+        Start (or stop) autoplay clock, next image is shown `delay` from now. Followers of
+        synchronized slideshow never advance by themselves, they wait for the leader.
+        """
+        sync = self.display.sync
+        if enabled and (sync is None or not sync.is_follower()):
+            self.autoplay_clock.start()
+        else:
+            self.autoplay_clock.stop()
+
+    def get_target_size(self):
         """
-        Render provided image on screen.
+        Return size of screen area available for image.
         """
         display_width, display_height = self.display.size
+        return (display_width - self.x_spacing, display_height - self.y_spacing)
 
-        # open and resize source image
-        print(imgpath, flush=True)
-        img = pygame.image.load(imgpath)
-        img_size = img.get_rect().size
+    def get_layout(self):
+        """
+        Return gallery settings which affect scaled images (besides display size), including
+        resolved scaler backend.
+        """
+        return (self.config['margin'], self.config['fontsize'], self.config['decode_limit'],
+                scaler.get_backend(self.config['scaler']), list(self.config['screen_background']))
+
+    def load_image(self, imgpath):
+        """
+        Open source image and resize it to optimal size. Called from prefetch worker threads.
+
+        Image is taken from frame pack of the gallery if there is one. If persistent render cache is
+        available, already scaled image is taken from it, freshly scaled images are stored into it.
+        """
+        if self.pack is not None:
+            with tracer.span('gallery.pack'):
+                img = self.pack.get(imgpath)
+            if img is not None:
+                return img
+
+        render_cache = self.display.render_cache
+        key = None
+        if render_cache is not None:
+            with tracer.span('gallery.cache_get'):
+                try:
+                    key = render_cache.get_key(imgpath, extra=(self.config['margin'], self.config['fontsize'],
+                                                               tuple(self.display.size),
+                                                               scaler.get_backend(self.config['scaler']),
+                                                               self.config['screen_background']))
+                    img = render_cache.get(key)
+                except OSError:
+                    # image disappeared in the meantime, handle it like cache miss
+                    img = None
+            if img is not None:
+                return scaler.convert(img)
+
+        # dimensions from header allow to decode JPEGs directly in reduced resolution
+        with tracer.span('gallery.open'):
+            img_size = get_image_size(imgpath)
+        draft_size = self.get_optimal_size(img_size[0], img_size[1]) if img_size else None
+        try:
+            with tracer.span('gallery.decode'):
+                img = load_image(imgpath, draft_size, limit=self.config['decode_limit'] * 1000000,
+                                 background=self.config['screen_background'])
+        except DecodeLimitError as e:
+            print('Warning: image {} not displayed, {}'.format(imgpath, e), flush=True)
+            return self.render_placeholder(img_size, 'Obrázek je příliš velký.')
+        except (pygame.error, OSError) as e:
+            print('Warning: image {} not displayed, {}'.format(imgpath, e), flush=True)
+            return self.render_placeholder(img_size, 'Obrázek nelze zobrazit.')
+        if img_size is None:
+            img_size = img.get_rect().size
         optimal_size = self.get_optimal_size(img_size[0], img_size[1])
-        img = pygame.transform.smoothscale(img, optimal_size)
+        with tracer.span('gallery.scale'):
+            img = scaler.scale(img, optimal_size, self.config['scaler'])
 
-        # put image on screen (centered, bg color)
-        self.display.screen.fill(self.config['screen_background'])
+        if key is not None:
+            with tracer.span('gallery.cache_put'):
+                render_cache.put(key, img)
+        return img
+
+    def render_placeholder(self, img_size, msg):
+        """
+        Return surface with message shown instead of image which can't be decoded. It has the same
+        size as the image would have, placeholders are never stored in render cache.
+        """
+        if img_size is not None:
+            size = self.get_optimal_size(img_size[0], img_size[1])
+        else:
+            size = self.get_target_size()
+        img = pygame.Surface(size)
+        img.fill((64, 64, 64))
+        text = self.display.render_text(msg, self.config['fontsize'], self.config['screen_color'])
+        text_size = text.get_rect().size
+        img.blit(text, ((size[0] - text_size[0]) / 2, (size[1] - text_size[1]) / 2))
+        return img
+
+    def prefetch(self, files, idx):
+        """
+        Schedule background loading of images around given index, nearest first.
+        """
+        paths = []
+        for distance in range(1, self.config['prefetch'] + 1):
+            for i in [idx + distance, idx - distance]:
+                if 0 <= i < len(files):
+                    paths.append(os.path.join(self.dirpath, files[i]))
+        self.prefetcher.prefetch(paths)
+
+    def compose(self, imgpath, title):
+        """
+        Return layers (image, title) of frame with given image.
+        """
+        display_width, display_height = self.display.size
+
+        # get resized source image (from cache if it was already prefetched)
+        with tracer.span('gallery.get_image'):
+            img = self.prefetcher.get(imgpath)
+        optimal_size = img.get_rect().size
+
+        # image layer (centered)
         x = math.ceil((display_width - optimal_size[0]) / 2)
         y = math.ceil(self.config['margin'] + (display_height - self.y_spacing - optimal_size[1]) / 2)
-        self.display.screen.blit(img, (x, y))
-
-        # pause symbol on screen
-        if not self.autoplay:
-            pause = self.display.pause
-            self.display.screen.blit(pause['img'], (pause['x'], pause['y']))
+        layers = [(img, (x, y))]
 
-        # optional title
+        # optional title layer
         if title:
-            text = self.font.render(title, True, self.config['screen_color'])
+            with tracer.span('gallery.title'):
+                text = self.display.render_text(title, self.config['fontsize'], self.config['screen_color'])
             text_size = text.get_rect().size
             text_x = display_width / 2 - text_size[0] / 2
             text_y = display_height - self.y_spacing + self.config['margin'] + round(self.config['fontsize'] * 0.1)
-            self.display.screen.blit(text, (text_x, text_y))
-            # self.display.screen.blit(text, (1000, 0))
+            layers.append((text, (text_x, text_y)))
+        return layers
+
+    def prepare(self, imgpath, title):
+        """
+        Compose frame of given image in advance (before autoplay deadline), so it can be shown
+        without waiting for decoding.
+        """
+        with tracer.span('gallery.prepare'):
+            self.prepared = (imgpath, title, self.compose(imgpath, title))
+
+    def render_screen(self, imgpath, title, direction=1):
+        """
+        Render provided image on screen (through transition animation if it is configured).
+
+        Composed frame is kept as layers (image, title), so overlays like pause symbol can be
+        drawn or removed later without loading and scaling image again (see `render_pause`).
+        Moment when the image appeared is stored in `shown_at`.
+        """
+        transition = self.transition if self.layers else None
+
+        print(imgpath, flush=True)
+        if self.prepared is not None and self.prepared[:2] == (imgpath, title):
+            self.layers = self.prepared[2]
+        else:
+            self.layers = self.compose(imgpath, title)
+        self.prepared = None
+
+        # put layers on screen or into transition frame (bg color)
+        target = transition.frame if transition else self.display.screen
+        self.draw_layers(target=target)
 
+        # pause symbol on screen
+        if not self.autoplay:
+            pause = self.display.pause
+            target.blit(pause['img'], (pause['x'], pause['y']))
+
+        if transition:
+            self.shown_at = time.monotonic()
+            with tracer.span('gallery.transition'):
+                transition.run(direction)
+            print('Transition {}: {frames} frames in {duration:.3f} s, {fps:.1f} fps'.format(
+                self.config['transition'], **transition.stats), flush=True)
+        else:
+            with tracer.span('gallery.update'):
+                pygame.display.update()
+            self.shown_at = time.monotonic()
+
+    def draw_layers(self, rect=None, target=None):
+        """
+        Draw background and composed frame layers on screen (or given target surface), optionally
+        only inside given rect.
+        """
+        if target is None:
+            target = self.display.screen
+        target.set_clip(rect)
+        with tracer.span('gallery.fill'):
+            target.fill(self.config['screen_background'])
+        with tracer.span('gallery.blit'):
+            for surface, position in self.layers:
+                target.blit(surface, position)
+        target.set_clip(None)
+
+    def render_pause(self):
+        """
+        Show or hide pause symbol according to autoplay state. Only area under symbol is redrawn
+        and pushed to display.
+        """
+        pause = self.display.pause
+        rect = pause['img'].get_rect().move(pause['x'], pause['y'])
+        if self.autoplay:
+            self.draw_layers(rect)
+        else:
+            self.display.screen.blit(pause['img'], rect)
+        pygame.display.update(rect)
+
+    def start_animation(self, imgpath):
+        """
+        Start playback of given GIF if it is animated. Its first frame is already on screen (as
+        still image), next frames replace image layer in the same size.
+        """
+        self.stop_animation()
+        if not imgpath.lower().endswith('.gif'):
+            return
+        img, position = self.layers[0]
+        self.animation = Animation.open(imgpath, img.get_size(), limit=self.config['decode_limit'] * 1000000,
+                                        scaler_mode=self.config['scaler'], background=self.config['screen_background'])
+        if self.animation is not None:
+            self.animation.start()
+            self.frame_deadline = time.monotonic() + self.animation.first_duration
+            scheduler.set_deadline(EVENT_ANIMATION, self.frame_deadline)
+
+    def stop_animation(self):
+        if self.animation is not None:
+            self.animation.stop()
+            self.animation = None
+            scheduler.set_deadline(EVENT_ANIMATION, None)
+
+    def render_frame(self):
+        """
+        Show next frame of animation and plan the one after it. If the frame isn't decoded yet,
+        animation post EVENT_ANIMATION when it is. Frames after late one are shown at least half of
+        their duration apart, so playback catch up gradually instead of flashing buffered frames.
+        """
+        if self.animation is None:
+            return
+        frame = self.animation.get_frame()
+        if frame is None:
+            return
+        surface, duration = frame
+        position = self.layers[0][1]
+        self.layers[0] = (surface, position)
+
+        rect = self.display.screen.blit(surface, position)
+        if not self.autoplay:
+            pause = self.display.pause
+            rect.union_ip(self.display.screen.blit(pause['img'], (pause['x'], pause['y'])))
+        with tracer.span('gallery.animation_update'):
+            pygame.display.update(rect)
+
+        self.frame_deadline = max(self.frame_deadline + duration, time.monotonic() + duration / 2)
+        scheduler.set_deadline(EVENT_ANIMATION, self.frame_deadline)
+
+    def get_pyramid(self, imgpath):
+        """
+        Return tile pyramid of given image. Image above decode limit is decoded right now in reduced
+        resolution (if its format allow it), so the pyramid has smaller base.
+        """
+        limit = self.config['decode_limit'] * 1000000
+        background = self.config['screen_background']
+        img_size = get_image_size(imgpath)
+        source = None
+        if img_size is None or img_size[0] * img_size[1] > limit:
+            size = None
+            if img_size is not None:
+                reduction = 1
+                while img_size[0] * img_size[1] > limit * reduction ** 2:
+                    reduction *= 2
+                size = (img_size[0] // reduction, img_size[1] // reduction)
+            source = load_image(imgpath, size, limit=limit, background=background)
+            img_size = source.get_size()
+        return TilePyramid(imgpath, img_size, self.display.size,
+                           lambda: load_image(imgpath, limit=limit, background=background),
+                           self.display.tile_cache, self.display.render_cache, source, background)
+
+    def zoom(self, imgpath):
+        """
+        Zoom-and-pan mode of given image: `up/down` move viewport, `ok` zoom in, `back` (or long press
+        of `ok`) return to gallery. Return state which end the gallery (or None).
+        """
+        try:
+            pyramid = self.get_pyramid(imgpath)
+        except (DecodeLimitError, pygame.error, OSError) as e:
+            print('Warning: zoom of {} not available, {}'.format(imgpath, e), flush=True)
+            return None
+        if pyramid.top == 0:
+            print('Image {} is not bigger than screen, nothing to zoom'.format(imgpath), flush=True)
+            return None
+
+        print('Zoom of {}'.format(imgpath), flush=True)
+        self.set_autoplay_timer(False)
+        self.stop_animation()
+        zoom = Zoom(self.display.screen, pyramid, self.config['screen_background'])
+        zoom.render()
+
+        state = None
+        while state not in [STATE_QUIT, STATE_MISSING_SOURCE, STATE_SOURCE_CHANGED]:
+            self.display.set_status('zoom', file=os.path.basename(imgpath), level=zoom.level,
+                                    position=zoom.position, positions=len(zoom.positions))
+            state = get_state(wait=True)
+            if state in [STATE_BACK, STATE_LONG_ACTION]:
+                state = None
+                break
+            elif state == STATE_NEXT:
+                zoom.move(1)
+            elif state == STATE_PREV:
+                zoom.move(-1)
+            elif state == STATE_ACTION:
+                zoom.cycle_level()
+
+        pyramid.release()
+        if self.autoplay:
+            self.set_autoplay_timer()
+        return state
+
+    def redraw(self, imgpath):
+        """
+        Draw current image again (after zoom), with pause sign and animation.
+        """
+        self.draw_layers()
+        if not self.autoplay:
+            pause = self.display.pause
+            self.display.screen.blit(pause['img'], (pause['x'], pause['y']))
         pygame.display.update()
+        if self.animation is None:
+            self.start_animation(imgpath)
 
     def run(self):
         # get images 
-        files = get_entries(self.dirpath, condition=check_file)
-        files = self.filter_files(files)
+        files = self.get_files()
         if not files:
             return STATE_MISSING_SOURCE
 
         # load configuration files
         self.config = self.load_config()
         titles = self.load_titles()
+        self.display.prerender_texts(list(titles.values()), self.config['fontsize'], self.config['screen_color'])
+        self.pack = FramePack.open(self.dirpath, self.display.size, self.get_layout())
+        self.prefetcher = Prefetcher(self.load_image, self.display.image_cache, self.get_target_size())
+        self.layers = None
+        self.transition = None
+        if self.config['transition'] != 'none':
+            self.transition = Transition(self.display.screen, self.config['transition'],
+                                         self.config['transition_duration'], self.config['transition_backend'])
+        self.prepared = None
+        self.shown_at = None
+        self.autoplay_clock = AutoplayClock(self.config['delay'])
 
         # initialize main loop
-        clock = pygame.time.Clock()
-        idx = 0
+        idx = min(self.position, len(files) - 1)
         old_filepath = None
         old_autoplay = None
         files_len = len(files)
         state = None
 
         if self.autoplay:
-            # USEREVENT is same as STATE_NEXT state
-            pygame.time.set_timer(pygame.USEREVENT, self.config['delay'])
+            # STATE_AUTOPLAY is the same as STATE_NEXT, next frame is prepared before (STATE_AUTOPLAY_PREPARE)
+            self.set_autoplay_timer()
+
+        # synchronized slideshow, commands are matched by gallery directory name
+        sync = self.display.sync
+        dirname = os.path.basename(os.path.abspath(self.dirpath))
+        # index announced by leader but not shown yet, next presses step from it
+        announced = None
+        if sync is not None:
+            sync.pop_commands()
 
-        # main loop
+        # main loop, sleeping until key is pressed, timer expire or content change (first image is rendered immediately)
         while state not in [STATE_QUIT, STATE_MISSING_SOURCE, STATE_BACK]:
-            clock.tick(self.fps)
-            state = self.get_state()
+            if old_filepath is not None:
+                self.display.set_status('gallery', dir=dirname, index=idx, count=files_len, file=files[idx],
+                                        autoplay=self.autoplay, autoplay_stats=self.autoplay_clock.stats())
+            state = self.get_state(wait=old_filepath is not None)
 
-            if state == STATE_NEXT:
+            zoomed = False
+            if state == STATE_LONG_ACTION and old_filepath is not None:
+                state = self.zoom(old_filepath)
+                zoomed = True
+                if state is None:
+                    self.redraw(old_filepath)
+                    continue
+
+            if state == STATE_SOURCE_CHANGED:
+                changes = self.display.watcher.pop_changes()
+                if self.display.index is not None:
+                    self.display.index.invalidate(changes)
+                if os.path.abspath(self.dirpath) not in changes:
+                    if zoomed:
+                        # change elsewhere ended zoom, gallery itself is the same
+                        self.redraw(old_filepath)
+                    continue
+                # reload gallery content, stay on the same image if it still exists
+                filename = files[idx]
+                files = self.get_files()
+                if not files:
+                    state = STATE_MISSING_SOURCE
+                    continue
+                idx = files.index(filename) if filename in files else min(idx, len(files) - 1)
+                files_len = len(files)
+                titles = self.load_titles()
+                old_filepath = None
+            elif state == STATE_ANIMATION:
+                self.render_frame()
+                continue
+            elif state == STATE_AUTOPLAY_PREPARE:
+                if idx + 1 < files_len:
+                    self.prepare(os.path.join(self.dirpath, files[idx + 1]), titles.get(files[idx + 1]))
+                continue
+            elif state == STATE_SYNC:
+                for action, name, index in sync.pop_commands():
+                    if name != dirname:
+                        continue
+                    if action == 'prepare':
+                        self.prefetcher.prefetch([os.path.join(self.dirpath, files[index % files_len])])
+                    else:
+                        idx = index % files_len
+                        if index == announced:
+                            announced = None
+            elif state in [STATE_NEXT, STATE_PREV, STATE_AUTOPLAY] and sync is not None and sync.is_leader():
+                # leader doesn't flip immediately, next image is shown on all devices at once
+                current = announced if announced is not None else idx
+                index = min(max(current + (-1 if state == STATE_PREV else 1), 0), files_len - 1)
+                if index != current:
+                    sync.announce(dirname, index)
+                    announced = index
+                continue
+            elif state in [STATE_NEXT, STATE_AUTOPLAY]:
                 idx += 1
                 if idx > files_len - 1:
                     idx = files_len - 1
@@ -161,15 +562,33 @@ class Gallery(View):
             if state or old_filepath is None:
                 filepath = os.path.join(self.dirpath, files[idx])
                 if os.path.exists(filepath):
-                    if old_filepath != filepath or self.autoplay != old_autoplay:
-                        self.render_screen(filepath, titles.get(files[idx]))
+                    if old_filepath != filepath:
+                        self.stop_animation()
+                        with tracer.span('gallery.render_screen'):
+                            self.render_screen(filepath, titles.get(files[idx]), -1 if state == STATE_PREV else 1)
+                        self.autoplay_clock.flipped(self.shown_at)
+                        self.start_animation(filepath)
+                        self.prefetch(files, idx)
+                    elif self.autoplay != old_autoplay:
+                        self.render_pause()
                     old_filepath = filepath
                     old_autoplay = self.autoplay
                 else:
                     state = STATE_MISSING_SOURCE
 
+        self.position = idx
+        self.display.back_pressed_at = time.perf_counter()
+        self.stop_animation()
+        self.prefetcher.shutdown()
+        if self.pack is not None:
+            self.pack.close()
+            self.pack = None
+        self.display.stop_prerender()
         self.display.screen.fill(self.config['screen_background'])
-        pygame.time.set_timer(pygame.USEREVENT, 0)
+        self.set_autoplay_timer(False)
+        stats = self.autoplay_clock.stats()
+        if stats['flips']:
+            print('Autoplay: {}'.format(', '.join('{}={}'.format(k, v) for k, v in sorted(stats.items()))), flush=True)
         # pygame.display.quit()  # TODO: ???
 
         return state
@@ -0,0 +1,245 @@
+"""
+Thumbnail grid of gallery images.
+
+* Grid show gallery images as thumbnails, selected image is opened in Gallery
+* Thumbnails are generated lazily by worker threads (visible ones first) and kept in memory and
+  in render cache, grid is shown immediately with empty cells which are filled as soon as their
+  thumbnails are ready
+
+Only rows visible on screen are rendered, cursor move redraw just two cells.
+"""
+
+import os
+import pygame
+import time
+
+from . import scheduler
+from .decoder import get_image_size, load_image, DecodeLimitError
+from .gallery import Gallery
+from .prefetch import Prefetcher
+from .scaler import scaler
+from .states import get_state, EVENT_REDRAW, STATE_ACTION, STATE_BACK, STATE_LONG_ACTION, STATE_MISSING_SOURCE, \
+    STATE_NEXT, STATE_PREV, STATE_QUIT, STATE_SOURCE_CHANGED
+from .trace import tracer
+
+
+class Grid(Gallery):
+    """
+    Controls: `up/down` move cursor, `ok` open selected image in gallery (`back` return to grid),
+    long press of `ok` jump to next page.
+    """
+    cell_ratio = 3 / 4
+    cursor_width = 4
+    empty_color = (48, 48, 48)
+
+    def layout(self):
+        """
+        Calculate cell size, number of visible rows and position of the grid.
+        """
+        margin = self.config['margin']
+        width, height = self.display.size
+        self.columns = max(1, self.config['grid_columns'])
+        self.cell_w = (width - margin * (self.columns + 1)) // self.columns
+        self.cell_h = int(self.cell_w * self.cell_ratio)
+        self.rows = max(1, (height - margin) // (self.cell_h + margin))
+        self.x = (width - self.columns * (self.cell_w + margin) + margin) // 2
+        self.y = (height - self.rows * (self.cell_h + margin) + margin) // 2
+        self.top = 0
+
+    def get_thumb_size(self):
+        return (self.cell_w - 2 * self.cursor_width, self.cell_h - 2 * self.cursor_width)
+
+    def load_thumbnail(self, imgpath):
+        """
+        Decode image in reduced resolution and scale it into cell. Called from worker threads.
+        """
+        render_cache = self.display.render_cache
+        thumb_size = self.get_thumb_size()
+        key = None
+        if render_cache is not None:
+            try:
+                key = render_cache.get_key(imgpath, extra=('thumb', thumb_size,
+                                                           scaler.get_backend(self.config['scaler']),
+                                                           self.config['screen_background']))
+                img = render_cache.get(key)
+            except OSError:
+                # image disappeared in the meantime, handle it like cache miss
+                img = None
+            if img is not None:
+                return scaler.convert(img)
+
+        img_size = get_image_size(imgpath)
+        size = self.fit(img_size, thumb_size) if img_size else None
+        try:
+            with tracer.span('grid.thumbnail'):
+                img = load_image(imgpath, size, limit=self.config['decode_limit'] * 1000000,
+                                 background=self.config['screen_background'])
+                img = scaler.scale(img, self.fit(img.get_size(), thumb_size), self.config['scaler'])
+        except (DecodeLimitError, pygame.error, OSError) as e:
+            print('Warning: thumbnail of {} not available, {}'.format(imgpath, e), flush=True)
+            img = pygame.Surface(thumb_size)
+            img.fill(self.empty_color)
+            return img
+
+        if key is not None:
+            render_cache.put(key, img)
+        return img
+
+    @staticmethod
+    def fit(size, area):
+        ratio = min(area[0] / size[0], area[1] / size[1])
+        return (max(1, int(size[0] * ratio)), max(1, int(size[1] * ratio)))
+
+    def thumbnail_ready(self, path, surface):
+        scheduler.post(pygame.event.Event(EVENT_REDRAW, path=path))
+
+    def get_path(self, idx):
+        return os.path.join(self.dirpath, self.files[idx])
+
+    def get_cell_rect(self, idx):
+        row = idx // self.columns - self.top
+        column = idx % self.columns
+        margin = self.config['margin']
+        return pygame.Rect(self.x + column * (self.cell_w + margin), self.y + row * (self.cell_h + margin),
+                           self.cell_w, self.cell_h)
+
+    def get_visible(self):
+        return range(self.top * self.columns, min(len(self.files), (self.top + self.rows) * self.columns))
+
+    def scroll(self):
+        """
+        Move window of visible rows so that cursor is inside. Return True if window moved.
+        """
+        row = self.position // self.columns
+        top = self.top
+        if row < top:
+            top = row
+        elif row >= top + self.rows:
+            top = row - self.rows + 1
+        moved = top != self.top
+        self.top = top
+        return moved
+
+    def render_cell(self, idx):
+        """
+        Draw thumbnail (or empty cell if it is not ready yet) and cursor. Return rect of the cell.
+        """
+        rect = self.get_cell_rect(idx)
+        screen = self.display.screen
+        screen.fill(self.config['screen_background'], rect)
+        thumb = self.prefetcher.cache.get(self.prefetcher.get_key(self.get_path(idx)))
+        inner = rect.inflate(-2 * self.cursor_width, -2 * self.cursor_width)
+        if thumb is None:
+            screen.fill(self.empty_color, inner)
+            self.missing.add(idx)
+        else:
+            thumb_rect = thumb.get_rect(center=inner.center)
+            screen.blit(thumb, thumb_rect)
+            self.missing.discard(idx)
+        if idx == self.position:
+            pygame.draw.rect(screen, self.config['screen_color'], rect, self.cursor_width)
+        return rect
+
+    def render(self):
+        """
+        Render visible rows and schedule thumbnails, visible first, then the following page.
+        """
+        with tracer.span('grid.render'):
+            self.scroll()
+            self.display.screen.fill(self.config['screen_background'])
+            self.missing = set()
+            for idx in self.get_visible():
+                self.render_cell(idx)
+        pygame.display.update()
+
+        page = self.rows * self.columns
+        end = min(len(self.files), (self.top + self.rows) * self.columns + page)
+        order = sorted(self.missing) + list(range((self.top + self.rows) * self.columns, end))
+        self.prefetcher.prefetch([self.get_path(idx) for idx in order])
+
+    def refresh(self):
+        """
+        Draw visible cells whose thumbnails became ready.
+        """
+        rects = []
+        for idx in sorted(self.missing):
+            if self.prefetcher.get_key(self.get_path(idx)) in self.prefetcher.cache:
+                rects.append(self.render_cell(idx))
+        if rects:
+            pygame.display.update(rects)
+
+    def move(self, offset):
+        old_position = self.position
+        self.position = min(max(self.position + offset, 0), len(self.files) - 1)
+        if self.position == old_position:
+            return
+        if self.scroll():
+            self.render()
+        else:
+            pygame.display.update([self.render_cell(old_position), self.render_cell(self.position)])
+
+    def open(self):
+        """
+        Show selected image in gallery, return state which end the grid (or None).
+        """
+        self.prefetcher.shutdown()
+        gallery = Gallery(self.dirpath, self.display, self.sleep, position=self.position)
+        state = gallery.run()
+        self.position = gallery.position
+        self.prefetcher = self.create_prefetcher()
+        if state == STATE_BACK:
+            self.render()
+            return None
+        return state
+
+    def create_prefetcher(self):
+        return Prefetcher(self.load_thumbnail, self.display.thumb_cache, self.get_thumb_size(),
+                          callback=self.thumbnail_ready)
+
+    def run(self):
+        self.files = self.get_files()
+        if not self.files:
+            return STATE_MISSING_SOURCE
+
+        self.config = self.load_config()
+        self.layout()
+        self.position = min(self.position, len(self.files) - 1)
+        self.prefetcher = self.create_prefetcher()
+        self.render()
+        self.display.report_back_latency()
+
+        state = None
+        while state not in [STATE_QUIT, STATE_MISSING_SOURCE, STATE_BACK]:
+            self.display.set_status('grid', dir=os.path.basename(os.path.abspath(self.dirpath)),
+                                    position=self.position, count=len(self.files))
+            state = get_state(wait=True)
+            if state == STATE_NEXT:
+                self.move(1)
+            elif state == STATE_PREV:
+                self.move(-1)
+            elif state == STATE_LONG_ACTION:
+                # next page, from the last one back to the beginning
+                page = self.rows * self.columns
+                self.move(page if self.position < len(self.files) - 1 else -self.position)
+            elif state == STATE_ACTION:
+                state = self.open()
+            elif state == STATE_SOURCE_CHANGED:
+                changes = self.display.watcher.pop_changes()
+                if self.display.index is not None:
+                    self.display.index.invalidate(changes)
+                if os.path.abspath(self.dirpath) in changes:
+                    filename = self.files[self.position]
+                    self.files = self.get_files()
+                    if not self.files:
+                        state = STATE_MISSING_SOURCE
+                        continue
+                    self.position = self.files.index(filename) if filename in self.files \
+                        else min(self.position, len(self.files) - 1)
+                    self.render()
+            else:
+                self.refresh()
+
+        self.display.back_pressed_at = time.perf_counter()
+        self.prefetcher.shutdown()
+        self.display.screen.fill(self.config['screen_background'])
+        return state
@@ -0,0 +1,176 @@
+"""
+Content index of source directory.
+
+* ContentIndex keep list of menu directories and for each of them list of files, appropriate view,
+  gallery config and titles, so the data tree don't need to be scanned again and again
+
+Directory records are validated by modification time of directory (and its config/titles files),
+so only changed directories are scanned again. Index can be serialized into cache file, so next
+boot can show menu without scanning unchanged directories.
+"""
+
+import json
+import os
+
+from .config import GalleryConfig, TitlesConfig
+from .trace import tracer
+
+
+def scan_dir(dirpath):
+    """
+    Return tuple (dirs, files) with sorted names of non hidden subdirectories and files in given
+    directory. Single os.scandir call, type of entries is known without extra stat calls.
+    """
+    dirs = []
+    files = []
+    with tracer.span('scan_dir'):
+        for entry in os.scandir(dirpath):
+            if entry.name.startswith('.'):
+                continue
+            if entry.is_dir():
+                dirs.append(entry.name)
+            elif entry.is_file():
+                files.append(entry.name)
+    return sorted(dirs), sorted(files)
+
+
+def get_mtime(path):
+    try:
+        return os.stat(path).st_mtime_ns
+    except OSError:
+        return None
+
+
+class ContentIndex:
+    """
+    Index of source directory.
+
+    Usage:
+        index = ContentIndex('/media/usb/data', views=[Video, Gallery], cache_path='/media/usb/cache/index.json')
+        choices = index.get_choices()     # menu directories
+        record = index.get_dir(choice)    # dict with files, view, config, titles
+        index.invalidate(paths)           # force rescan of given directories
+        index.save()
+
+    `views` is list of View classes, first one accepting some file in directory is used.
+    """
+    version = 6
+
+    def __init__(self, dirpath, views, cache_path=None):
+        self.dirpath = os.path.abspath(dirpath)
+        self.views = views
+        self.cache_path = cache_path
+        self.root = None
+        self.dirs = {}
+        self.dirty = False
+        self.load()
+
+    def load(self):
+        """
+        Load index from cache file (if there is any).
+        """
+        if not self.cache_path or not os.path.exists(self.cache_path):
+            return
+        try:
+            with open(self.cache_path) as f:
+                data = json.load(f)
+            if data['version'] != self.version or data['dirpath'] != self.dirpath:
+                return
+            self.root = data['root']
+            self.dirs = data['dirs']
+        except (OSError, ValueError, KeyError, TypeError) as e:
+            print('Ignoring content index {}: {}'.format(self.cache_path, e), flush=True)
+            return
+        print('Content index loaded, {} directories'.format(len(self.dirs)), flush=True)
+
+    def save(self):
+        """
+        Write index into cache file if it changed.
+        """
+        if not self.cache_path or not self.dirty:
+            return
+        data = {'version': self.version, 'dirpath': self.dirpath, 'root': self.root, 'dirs': self.dirs}
+        tmppath = self.cache_path + '.tmp'
+        try:
+            with open(tmppath, 'w') as f:
+                json.dump(data, f)
+            os.replace(tmppath, self.cache_path)
+            self.dirty = False
+        except OSError as e:
+            print('Unable to save content index: {}'.format(e), flush=True)
+
+    def invalidate(self, paths):
+        """
+        Forget records of given directories (absolute paths), they will be scanned on next access.
+        """
+        for path in paths:
+            if path == self.dirpath:
+                self.root = None
+            else:
+                self.dirs.pop(os.path.basename(path), None)
+
+    def get_choices(self):
+        """
+        Return sorted list of menu directories (or None if source directory is empty or missing).
+        """
+        mtime = get_mtime(self.dirpath)
+        if mtime is None:
+            return None
+        if self.root is None or self.root['mtime'] != mtime:
+            dirs, _ = scan_dir(self.dirpath)
+            self.root = {'mtime': mtime, 'dirs': dirs}
+            for name in list(self.dirs):
+                if name not in dirs:
+                    del self.dirs[name]
+            self.dirty = True
+        print('Found {} entries.'.format(len(self.root['dirs'])), flush=True)
+        return self.root['dirs'] or None
+
+    def get_dir(self, name):
+        """
+        Return record of given menu directory, ie. dict with keys
+            files -- sorted list of files
+            view -- name of appropriate view class (or None)
+            config -- tuple (status, config) of GalleryConfig
+            titles -- tuple (status, titles) of TitlesConfig
+        Return None if directory doesn't exist.
+        """
+        path = os.path.join(self.dirpath, name)
+        record = self.dirs.get(name)
+        if record is not None and record['mtimes'] == self.get_mtimes(path, record['files']):
+            return record
+
+        if get_mtime(path) is None:
+            self.dirs.pop(name, None)
+            return None
+        record = self.scan(path)
+        self.dirs[name] = record
+        self.dirty = True
+        return record
+
+    def get_mtimes(self, path, files):
+        """
+        Return modification times of directory and its config files.
+        """
+        mtimes = [get_mtime(path)]
+        for filename in [GalleryConfig.filename, TitlesConfig.filename]:
+            if filename in files:
+                mtimes.append(get_mtime(os.path.join(path, filename)))
+        return mtimes
+
+    def scan(self, path):
+        _, files = scan_dir(path)
+        view = None
+        for cls in self.views:
+            if len(cls.filter_files(files)):
+                view = cls.__name__
+                break
+        status, config = GalleryConfig(path).process()
+        titles = TitlesConfig(path).process()
+        return {
+            'mtimes': self.get_mtimes(path, files),
+            'files': files,
+            'view': view,
+            'config': [status, config],
+            'titles': list(titles),
+        }
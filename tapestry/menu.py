@@ -1,23 +1,73 @@
+import json
 import os
-from .states import get_state, STATE_ACTION, STATE_QUIT, STATE_MISSING_SOURCE, STATE_NEXT, STATE_PREV
+from .states import get_state, STATE_ACTION, STATE_LONG_ACTION, STATE_QUIT, STATE_MISSING_SOURCE, STATE_NEXT, \
+    STATE_PREV, STATE_SOURCE_CHANGED
 
 import pygame
 import pygame.locals
 import time
-from .detective import get_entries, check_dir, source_exist
+from . import boot
+from .detective import get_entries, check_dir
+from .trace import tracer
+
+# last saved (or loaded) snapshot for each path, the same snapshot is not written again
+saved_snapshots = {}
+
+
+def load_snapshot(path, dirpath):
+    """
+    Return menu snapshot saved in given path (see Menu.get_snapshot), or None if there is no
+    snapshot of given source directory.
+    """
+    try:
+        with open(path) as f:
+            snapshot = json.load(f)
+        if set(snapshot) != {'dirpath', 'choices', 'config', 'position'}:
+            raise ValueError('unknown format')
+        if snapshot['dirpath'] != os.path.abspath(dirpath) or not snapshot['choices']:
+            return None
+    except FileNotFoundError:
+        return None
+    except (OSError, ValueError, KeyError, TypeError) as e:
+        print('Ignoring menu snapshot {}: {}'.format(path, e), flush=True)
+        return None
+    saved_snapshots[path] = snapshot
+    return snapshot
+
+
+def save_snapshot(path, snapshot):
+    """
+    Write menu snapshot into given path (unless it is the same as the last one).
+    """
+    if saved_snapshots.get(path) == snapshot:
+        return
+    tmppath = path + '.tmp'
+    try:
+        with open(tmppath, 'w') as f:
+            json.dump(snapshot, f)
+        os.replace(tmppath, path)
+        saved_snapshots[path] = snapshot
+    except OSError as e:
+        print('Unable to save menu snapshot: {}'.format(e), flush=True)
 
 
 class Menu:
-    def __init__(self, dirpath, display, config, position=0, fps=50, sleep=3):
+    def __init__(self, dirpath, display, config, position=0, sleep=3, shown=None, snapshot_path=None):
+        """
+        `shown` is snapshot of menu which is already on screen (shown at boot), menu isn't rendered
+        again if it didn't change. If `snapshot_path` is given, snapshot is saved there when menu
+        is shown and when it is left, so next boot can show it immediately.
+        """
         self.dirpath = os.path.abspath(dirpath)
         self.display = display
         self.screen = display.screen
         self.font = display.font
         self.size = display.size
         self.config = config
-        self.fps = fps
         self.sleep = sleep
         self.initial_position = position
+        self.shown = shown
+        self.snapshot_path = snapshot_path
 
     def get_position(self):
         """
@@ -42,108 +92,193 @@ class Menu:
         else:
             self.position = idx
 
-    def render_choices(self):
+    def get_title(self, idx, color):
         """
-        Render individual titles from choices. They are not drawed on screen, just rendered to memory.
+        Return rendered title of choice with given index (from display text cache).
+        """
+        return self.display.render_text(self.choices[idx], self.config['fontsize'], color)
 
-        Return (titles, max_w, max_h), where
-            titles is list of rendered objects with individual choices
-            max_w is widest title in choices
-            max_h is tallest title in choices
+    def layout(self):
+        """
+        Calculate menu geometry: size of menu row, number of rows visible on screen and position
+        of the first row. Title sizes are only measured, not rendered.
         """
         max_w = 0
         max_h = 0
-        titles = []
+        for title in self.choices:
+            text_size = self.font.size(title)
+            max_w = max(max_w, text_size[0])
+            max_h = max(max_h, text_size[1])
 
-        for idx, title in enumerate(self.choices):
-            if idx == self.get_position():
-                color = self.config['cursor_color']
-            else:
-                color = self.config['screen_color']
-            text = self.font.render(title, True, color)
-            titles.append(text)
+        self.row_w = max_w
+        self.row_h = max_h + self.config['y_spacing']
+        available_h = self.size[1] - 2 * (self.config['y_spacing'] + self.config['y_padding'])
+        self.rows = max(1, min(len(self.choices), (available_h + self.config['y_spacing']) // self.row_h))
+        self.x = (self.size[0] - max_w) / 2
+        self.y = (self.size[1] - self.row_h * self.rows - self.config['y_spacing']) / 2
+        self.top = 0
 
-            # find biggest title
-            text_size = text.get_rect().size
-            if text_size[0] > max_w:
-                max_w = text_size[0]
-            if text_size[1] > max_h:
-                max_h = text_size[1]
+    def scroll(self):
+        """
+        Move window of visible rows so that cursor is inside. Return True if window moved.
+        """
+        position = self.get_position()
+        top = self.top
+        if position < top:
+            top = position
+        elif position >= top + self.rows:
+            top = position - self.rows + 1
+        moved = top != self.top
+        self.top = top
+        return moved
 
-        return titles, max_w, max_h
+    def render_row(self, idx):
+        """
+        Draw single menu row on screen (with bar if it is selected). Return updated rect.
+        """
+        y = self.y + (idx - self.top) * self.row_h
+        rect = pygame.Rect(self.x - self.config['x_padding'],
+                           y - self.config['y_padding'],
+                           self.row_w + 2 * self.config['x_padding'],
+                           self.row_h - self.config['y_spacing'] + 2 * self.config['y_padding'])
+        self.screen.fill(self.config['screen_background'], rect=rect)
+        if idx == self.get_position():
+            self.screen.fill(self.config['cursor_background'], rect=rect)
+            color = self.config['cursor_color']
+        else:
+            color = self.config['screen_color']
+        self.screen.blit(self.get_title(idx, color), (self.x, y))
+        return rect
 
     def render(self):
         """
-        Render screen with menu.
+        Render screen with menu, ie. rows visible in current window.
         """
-        # render titles
-        titles, max_w, max_h = self.render_choices()
+        with tracer.span('menu.render'):
+            self.scroll()
+            self.screen.fill(self.config['screen_background'])
+            for idx in range(self.top, min(self.top + self.rows, len(self.choices))):
+                self.render_row(idx)
+        with tracer.span('menu.update'):
+            pygame.display.update()
+        boot.mark('first_update')
 
-        # calculate initial position
-        x = (self.size[0] - max_w) / 2
-        y = (self.size[1] - (max_h + self.config['y_spacing']) * len(self.choices) - self.config['y_spacing']) / 2
+    def move(self, offset):
+        """
+        Helper method, move cursor by given offset. Only old and new cursor rows are redrawn,
+        whole screen is rendered only if visible window need to scroll.
+        """
+        old_position = self.get_position()
+        self.set_position(old_position + offset)
+        if self.get_position() == old_position:
+            return
+        if self.scroll():
+            self.render()
+        else:
+            with tracer.span('menu.move'):
+                pygame.display.update([self.render_row(old_position), self.render_row(self.get_position())])
 
-        # render screen
-        self.screen.fill(self.config['screen_background'])
-        for idx, title in enumerate(self.choices):
-            # render bar
-            if idx == self.get_position():
-                rect = [x - self.config['x_padding'],
-                        y - self.config['y_padding'],
-                        max_w + 2 * self.config['x_padding'],
-                        max_h + 2 * self.config['y_padding']]
-                self.screen.fill(self.config['cursor_background'], rect=rect)
-            self.screen.blit(titles[idx], (x, y))
-            y += max_h + self.config['y_spacing']
+    def get_snapshot(self):
+        """
+        Return what menu shows (choices, config, cursor position) as JSON serializable dict, so
+        it can be shown at next boot before source directory is scanned.
+        """
+        return json.loads(json.dumps({
+            'dirpath': self.dirpath,
+            'choices': self.choices,
+            'config': self.config,
+            'position': self.position,
+        }))
 
-        pygame.display.update()
+    def save_snapshot(self):
+        if self.snapshot_path:
+            save_snapshot(self.snapshot_path, self.get_snapshot())
 
-    def move_up(self):
+    def show(self, choices):
         """
-        Helper method, move cursor up and render whole menu screen.
+        Render given choices with cursor on initial position.
         """
-        self.set_position(self.get_position() - 1)
+        self.choices = choices
+        self.layout()
+        self.set_position(self.initial_position)
         self.render()
 
+    def publish_status(self):
+        self.display.set_status('menu', position=self.position, choice=self.get_choice(), count=len(self.choices))
+
+    def move_up(self):
+        """
+        Helper method, move cursor up.
+        """
+        self.move(-1)
+
     def move_down(self):
         """
-        Helper method, move cursor down and render whole menu screen.
+        Helper method, move cursor down.
         """
-        self.set_position(self.get_position() + 1)
+        self.move(1)
+
+    def get_choices(self):
+        """
+        Return sorted list of directories in source directory (from content index if available).
+        """
+        if self.display.index is not None:
+            return self.display.index.get_choices()
+        return get_entries(self.dirpath, condition=check_dir)
+
+    def rescan(self):
+        """
+        Reload choices after source directory changed, keep cursor on the same item if possible.
+        Return False if there are no choices anymore.
+        """
+        choice = self.get_choice()
+        choices = self.get_choices()
+        if not choices:
+            return False
+        self.choices = choices
+        self.layout()
+        self.set_position(choices.index(choice) if choice in choices else self.get_position())
         self.render()
+        return True
 
     def run(self):
         """
         Main method, take care about menu controls.
         """
-        self.choices = get_entries(self.dirpath, condition=check_dir)
+        self.choices = self.get_choices()
         if not self.choices:
             return STATE_MISSING_SOURCE
 
-        # initial render of menu screen
+        # initial render of menu screen (unless the same menu is already on screen)
+        self.layout()
         self.set_position(self.initial_position)
-        self.render()
+        if self.shown is None or self.shown != self.get_snapshot():
+            self.render()
+        self.shown = None
+        self.display.report_back_latency()
+        self.save_snapshot()
+        boot.mark('menu_ready')
 
-        # main loop
+        # main loop, sleeping until key is pressed or source directory change
         state = None
-        clock = pygame.time.Clock()
-        counter = 0
         while state not in [STATE_QUIT, STATE_MISSING_SOURCE, STATE_ACTION]:
-            clock.tick(self.fps)
-
             # control menu
-            state = get_state()
-            if state == STATE_NEXT:
+            self.publish_status()
+            state = get_state(wait=True)
+            if state == STATE_LONG_ACTION:
+                # no special meaning in menu, long press select item as well
+                state = STATE_ACTION
+            elif state == STATE_NEXT:
                 self.move_down()
             elif state == STATE_PREV:
                 self.move_up()
+            elif state == STATE_SOURCE_CHANGED:
+                changes = self.display.watcher.pop_changes()
+                if self.display.index is not None:
+                    self.display.index.invalidate(changes)
+                if self.dirpath in changes and not self.rescan():
+                    state = STATE_MISSING_SOURCE
 
-            # check presence of source dir
-            if counter == self.sleep * self.fps:
-                if not source_exist(self.dirpath):
-                    return STATE_MISSING_SOURCE
-                counter = 0
-            else:
-                counter += 1
-
+        if state != STATE_MISSING_SOURCE:
+            self.save_snapshot()
         return state
@@ -0,0 +1,168 @@
+"""
+Pack of already scaled gallery frames.
+
+* FramePack is optional file in gallery directory with all images of the gallery already scaled
+  for given display size and stored as raw pixels, gallery maps it into memory and images are
+  shown without decoding and scaling
+* build_pack create the pack (see pack.py tool)
+
+Pack layout: header (magic, offset and length of JSON index), frames as raw RGBX pixels aligned
+to memory pages, JSON index at the end. Index contains display size and gallery settings which
+affect scaled images (layout), and for every image its size, mtime and offset of pixels.
+
+Surfaces are created by `pygame.image.frombuffer` over memory mapped file and copied right away
+(plain copy when display itself use RGBX pixel format, other displays -- BGRX, 16 bit -- need one
+pass converting pixels into display format), which is still much cheaper than decoding and
+scaling. Returned surfaces never point into the mapping, so they can stay in image cache after
+the pack is closed (or USB disk is pulled out). Image which changed after the pack was built
+(different size or mtime) is not taken from pack.
+
+Usage:
+    pack = FramePack.open(dirpath, display_size, layout)  # None if there is no matching pack
+    surface = pack.get(path)                              # None if image is not in pack
+    pack.close()
+"""
+
+import json
+import mmap
+import os
+import struct
+import threading
+
+import pygame
+
+PACK_NAME = '.frames.pack'
+MAGIC = b'TPSTPACK'
+VERSION = 1
+HEADER = struct.Struct('<8sQQ')  # magic, index offset, index length
+PAGE = mmap.PAGESIZE
+# pixel format of frames and its masks (on little endian machine)
+FORMAT = 'RGBX'
+FORMAT_MASKS = (0xff, 0xff00, 0xff0000)
+
+
+def align(offset):
+    return (offset + PAGE - 1) // PAGE * PAGE
+
+
+def build_pack(gallery, dirpath, layout):
+    """
+    Write pack of all images of given gallery (with loaded config), return number of frames.
+    Images are loaded by `gallery.load_image`, ie. exactly as gallery would show them.
+    """
+    path = os.path.join(dirpath, PACK_NAME)
+    tmppath = path + '.tmp'
+    frames = {}
+    with open(tmppath, 'wb') as f:
+        offset = align(HEADER.size)
+        for filename in gallery.get_files():
+            imgpath = os.path.join(dirpath, filename)
+            stat = os.stat(imgpath)
+            surface = gallery.load_image(imgpath)
+            data = pygame.image.tostring(surface, FORMAT)
+            f.seek(offset)
+            f.write(data)
+            frames[filename] = {
+                'mtime_ns': stat.st_mtime_ns,
+                'bytes': stat.st_size,
+                'width': surface.get_width(),
+                'height': surface.get_height(),
+                'offset': offset,
+            }
+            offset = align(offset + len(data))
+
+        index = json.dumps({
+            'version': VERSION,
+            'size': list(gallery.display.size),
+            'layout': list(layout),
+            'format': FORMAT,
+            'frames': frames,
+        }).encode('utf-8')
+        f.seek(offset)
+        f.write(index)
+        f.seek(0)
+        f.write(HEADER.pack(MAGIC, offset, len(index)))
+    os.replace(tmppath, path)
+    return len(frames)
+
+
+class FramePack:
+    def __init__(self, path, index, mapped, native):
+        self.path = path
+        self.frames = index['frames']
+        self.mmap = mapped
+        self.native = native
+        self.lock = threading.Lock()  # prefetch threads may still read when gallery closes the pack
+
+    @classmethod
+    def open(cls, dirpath, size, layout):
+        """
+        Return pack of given gallery directory if it exists and it was built for given display
+        size and layout, otherwise None.
+        """
+        path = os.path.join(dirpath, PACK_NAME)
+        try:
+            with open(path, 'rb') as f:
+                magic, offset, length = HEADER.unpack(f.read(HEADER.size))
+                if magic != MAGIC:
+                    raise ValueError('not a frame pack')
+                f.seek(offset)
+                index = json.loads(f.read(length).decode('utf-8'))
+                if index['version'] != VERSION or index['format'] != FORMAT:
+                    raise ValueError('unsupported version or format')
+                if index['size'] != list(size) or index['layout'] != list(layout):
+                    print('Frame pack {} is for different display or layout, not used'.format(path), flush=True)
+                    return None
+                # private mapping is writable (pygame may ask for writable buffer), pages are
+                # copied only if someone write into them
+                mapped = mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_COPY)
+        except FileNotFoundError:
+            return None
+        except (OSError, ValueError, KeyError, struct.error) as e:
+            print('Frame pack {} not used: {}'.format(path, e), flush=True)
+            return None
+
+        screen = pygame.display.get_surface()
+        native = screen is None or (screen.get_bytesize() == 4 and screen.get_masks()[:3] == FORMAT_MASKS)
+        print('Frame pack {}: {} frames{}'.format(path, len(index['frames']), '' if native else ', converted'),
+              flush=True)
+        return cls(path, index, mapped, native)
+
+    def get(self, path):
+        """
+        Return surface of given image, or None if it is not in pack (or it changed since).
+        """
+        frame = self.frames.get(os.path.basename(path))
+        if frame is None:
+            return None
+        try:
+            stat = os.stat(path)
+        except OSError:
+            return None
+        if stat.st_mtime_ns != frame['mtime_ns'] or stat.st_size != frame['bytes']:
+            return None
+
+        size = (frame['width'], frame['height'])
+        end = frame['offset'] + size[0] * size[1] * 4
+        with self.lock:
+            if self.mmap is None:
+                return None
+            try:
+                with memoryview(self.mmap) as mapped, mapped[frame['offset']:end] as view:
+                    surface = pygame.image.frombuffer(view, size, FORMAT)
+                    copy = surface.copy() if self.native else surface.convert()
+                    del surface  # release the buffer, so the views can be released
+            except ValueError as e:
+                # pack truncated after it was opened
+                print('Frame pack {} not readable: {}'.format(self.path, e), flush=True)
+                return None
+        return copy
+
+    def close(self):
+        """
+        Unmap the pack, get returns None afterwards.
+        """
+        with self.lock:
+            if self.mmap is not None:
+                self.mmap.close()
+                self.mmap = None
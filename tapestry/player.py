@@ -0,0 +1,140 @@
+"""
+Video player controller.
+
+* Player keep mplayer process running in slave mode (idle, waiting for commands on stdin), so
+  starting of the video doesn't pay for player launch, and pygame display stays initialized
+
+Usage:
+    player = Player('mplayer')
+    player.start()                  # pre-spawn idle player
+    player.play([path1, path2])     # gapless looping playlist
+    player.volume(10)
+    player.pause()
+    player.stop()                   # player goes back to idle state
+
+Slave `loop` command repeats only the current file, so playlist of more files is looped by
+appending it again whenever its last file starts playing (player prints `Playing <path>.`), next
+round follows without a gap. Single file is looped by `loop 0`.
+
+If player process exit (or crash), EVENT_PLAYER event is posted into pygame queue and the process
+is started again for next playback. Any binary speaking mplayer slave protocol can be used, see
+tools/fake_mplayer.py.
+"""
+
+import subprocess
+import threading
+
+import pygame
+
+from . import scheduler
+from .states import EVENT_PLAYER
+
+
+class Player:
+    args = ['-slave', '-idle', '-quiet', '-fs', '-vo', 'fbdev', '-fixed-vo',
+            '-noconsolecontrols', '-input', 'nodefault-bindings']
+
+    def __init__(self, binary='mplayer'):
+        self.binary = binary
+        self.process = None
+        self.playing = False
+        self.playlist = []
+        self.lock = threading.Lock()
+        self.command_lock = threading.Lock()  # commands are sent also from output reading thread
+
+    def start(self):
+        """
+        Spawn idle player process (if it is not running already).
+        """
+        with self.lock:
+            if self.process is not None and self.process.poll() is None:
+                return
+            try:
+                self.process = subprocess.Popen([self.binary] + self.args, stdin=subprocess.PIPE,
+                                                stdout=subprocess.PIPE, stderr=subprocess.STDOUT,
+                                                universal_newlines=True, bufsize=1)
+            except OSError as e:
+                print('Unable to start player {}: {}'.format(self.binary, e), flush=True)
+                self.process = None
+                return
+            print('Player started, pid={}'.format(self.process.pid), flush=True)
+            threading.Thread(target=self.read_output, args=(self.process,), daemon=True).start()
+
+    def read_output(self, process):
+        """
+        Read player output (so the pipe never gets full), post EVENT_PLAYER when player exit.
+        """
+        for line in process.stdout:
+            line = line.strip()
+            if line:
+                print('Player: {}'.format(line), flush=True)
+            playlist = self.playlist
+            if self.playing and len(playlist) > 1 and line == 'Playing {}.'.format(playlist[-1]):
+                self.enqueue(playlist, append=True)
+        process.wait()
+        print('Player exited with code {}'.format(process.returncode), flush=True)
+        if self.playing:
+            scheduler.post(pygame.event.Event(EVENT_PLAYER, action='exit'))
+
+    def command(self, cmd):
+        """
+        Send slave command to player. Return False if player is not running.
+        """
+        if self.process is None or self.process.poll() is not None:
+            return False
+        try:
+            with self.command_lock:
+                self.process.stdin.write(cmd + '\n')
+                self.process.stdin.flush()
+        except (BrokenPipeError, OSError, ValueError):
+            return False
+        return True
+
+    @staticmethod
+    def quote(path):
+        return '"{}"'.format(path.replace('\\', '\\\\').replace('"', '\\"'))
+
+    def enqueue(self, paths, append=False):
+        """
+        Load given files into player playlist, first one replace current playlist unless `append`.
+        """
+        ok = True
+        for idx, path in enumerate(paths):
+            ok = ok and self.command('loadfile {} {}'.format(self.quote(path), 1 if idx or append else 0))
+        return ok
+
+    def play(self, paths):
+        """
+        Play given files as looping playlist. Return False if player couldn't be started.
+        """
+        self.start()
+        self.playlist = list(paths)
+        self.playing = True
+        ok = self.enqueue(self.playlist)
+        # loop applies to current file only: single file repeats, playlist is appended again
+        ok = ok and self.command('loop {} 1'.format(0 if len(self.playlist) == 1 else -1))
+        if not ok:
+            self.playing = False
+        return ok
+
+    def volume(self, step):
+        self.command('pausing_keep volume {}'.format(step))
+
+    def pause(self):
+        self.command('pause')
+
+    def stop(self):
+        """
+        Stop playback, player stays running in idle mode.
+        """
+        self.playing = False
+        self.command('stop')
+
+    def quit(self):
+        self.playing = False
+        if self.command('quit'):
+            try:
+                self.process.wait(timeout=3)
+            except subprocess.TimeoutExpired:
+                self.process.kill()
+        self.process = None
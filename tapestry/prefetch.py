@@ -0,0 +1,103 @@
+"""
+Background loading of gallery images.
+
+* Prefetcher decode and scale images on worker threads and store results in SurfaceCache
+"""
+
+import os
+import threading
+from concurrent.futures import ThreadPoolExecutor
+
+
+class Prefetcher:
+    """
+    Load images in background threads, so they are ready in cache before user ask for them.
+
+    Usage:
+        prefetcher = Prefetcher(gallery.load_image, cache, target_size)
+        surface = prefetcher.get(path)        # cache hit or synchronous load
+        prefetcher.prefetch([next, prev...])  # schedule loading of neighbours
+        prefetcher.shutdown()
+
+    `loader` is function accepting image path and returning scaled surface. `target_size` is
+    part of the cache key, so images scaled for different area are never mixed up. Optional
+    `callback` is called with path and surface whenever an image is loaded (from worker thread).
+    """
+
+    def __init__(self, loader, cache, target_size, workers=2, callback=None):
+        self.loader = loader
+        self.callback = callback
+        self.cache = cache
+        self.target_size = tuple(target_size)
+        self.executor = ThreadPoolExecutor(max_workers=workers)
+        self.pending = {}
+        self.lock = threading.Lock()
+
+    def get_key(self, path):
+        """
+        Return cache key for given image path, ie. (path, mtime, target_size).
+        """
+        try:
+            mtime = os.path.getmtime(path)
+        except OSError:
+            mtime = None
+        return (path, mtime, self.target_size)
+
+    def get(self, path):
+        """
+        Return scaled surface for given path. If image is not in cache and it is not loading right
+        now, it is loaded synchronously.
+        """
+        key = self.get_key(path)
+        surface = self.cache.get(key)
+        if surface is not None:
+            return surface
+
+        with self.lock:
+            future = self.pending.get(key)
+        if future is not None:
+            try:
+                return future.result()
+            except Exception as e:
+                print('Prefetch of {} failed: {}'.format(path, e), flush=True)
+
+        return self.load(key)
+
+    def prefetch(self, paths):
+        """
+        Schedule background loading of given paths (in given order). Paths which are already cached
+        or loading are skipped, pending loads of paths which are not requested anymore are cancelled.
+        """
+        keys = [self.get_key(path) for path in paths]
+        with self.lock:
+            for key, future in list(self.pending.items()):
+                if key not in keys and future.cancel():
+                    del self.pending[key]
+            for key in keys:
+                if key in self.pending or key in self.cache:
+                    continue
+                self.pending[key] = self.executor.submit(self.load, key)
+
+    def load(self, key):
+        """
+        Load image for given key and store it in cache.
+        """
+        try:
+            surface = self.loader(key[0])
+            self.cache.put(key, surface)
+            if self.callback is not None:
+                self.callback(key[0], surface)
+            return surface
+        finally:
+            with self.lock:
+                self.pending.pop(key, None)
+
+    def shutdown(self):
+        """
+        Cancel all pending loads and stop worker threads.
+        """
+        with self.lock:
+            for future in self.pending.values():
+                future.cancel()
+            self.pending.clear()
+        self.executor.shutdown(wait=False)
@@ -0,0 +1,241 @@
+"""
+Scaling of images to display size.
+
+* Scaler scale decoded images with selected backend and convert them to pixel format of the
+  display, so blitting them on screen doesn't need conversion
+* scaler is shared instance (like tracer), calibration result is stored if cache path is set
+
+Backends:
+
+* `smooth` -- `pygame.transform.smoothscale` from full source, the reference quality
+* `twopass` -- nearest neighbour scale to twice the target size, then smoothscale
+* `pil` -- Pillow bilinear resampling (only if Pillow is installed)
+
+Modes (`scaler` option of gallery config): `quality` (default) always use `smooth`, `fast`
+always use `twopass`, `auto` use the fastest backend whose result differ from `smooth` at most by
+QUALITY_THRESHOLD. Backends are measured on synthetic photo-like image (on the device itself,
+in half of display resolution to keep it short), result is kept in cache file, so it is measured
+only once for given display.
+
+Usage:
+    from tapestry.scaler import scaler
+
+    scaler.set_cache('/media/usb/cache/scaler.json')
+    scaler.get_auto_backend()                          # calibrate now (otherwise at first use of auto)
+    img = scaler.scale(img, (1880, 1040), mode='auto')
+"""
+
+import json
+import os
+import random
+import threading
+import time
+
+import pygame
+
+try:
+    from PIL import Image
+except ImportError:
+    Image = None
+
+from .trace import tracer
+
+# mean absolute difference of pixel channels (0-255) from `smooth` backend accepted by `auto`,
+# about 1 % of the range (bilinear and two-pass results of photos differ by 2.3-2.9)
+QUALITY_THRESHOLD = 3.0
+# calibration image is this times bigger than target size (big PNGs, or photos above the largest
+# JPEG reduction)
+CALIBRATION_RATIO = 3
+CALIBRATION_REPEAT = 2
+VERSION = 2
+
+
+def scale_smooth(surface, size):
+    return pygame.transform.smoothscale(surface, size)
+
+
+def scale_twopass(surface, size):
+    """
+    Cheap nearest neighbour reduction to twice the target size first, so smoothscale average
+    only 4 source pixels per target pixel.
+    """
+    width, height = surface.get_size()
+    if width > size[0] * 2 and height > size[1] * 2:
+        surface = pygame.transform.scale(surface, (size[0] * 2, size[1] * 2))
+    return pygame.transform.smoothscale(surface, size)
+
+
+def scale_pil(surface, size):
+    img = Image.frombuffer('RGB', surface.get_size(), pygame.image.tostring(surface, 'RGB'), 'raw', 'RGB', 0, 1)
+    img = img.resize(size, Image.BILINEAR)
+    return pygame.image.frombuffer(img.tobytes(), img.size, 'RGB')
+
+
+BACKENDS = {
+    'smooth': scale_smooth,
+    'twopass': scale_twopass,
+}
+if Image is not None:
+    BACKENDS['pil'] = scale_pil
+
+
+def create_test_image(size, seed=0):
+    """
+    Return surface resembling a photo: smooth gradients and sharp edges of random shapes.
+    """
+    rnd = random.Random(seed)
+    surface = pygame.Surface(size, 0, 24)
+    for y in range(0, size[1], 4):
+        surface.fill((y * 255 // size[1], 96, 255 - y * 255 // size[1]), (0, y, size[0], 4))
+    for _ in range(200):
+        color = (rnd.randrange(256), rnd.randrange(256), rnd.randrange(256))
+        rect = (rnd.randrange(size[0]), rnd.randrange(size[1]), rnd.randrange(size[0] // 4), rnd.randrange(size[1] // 4))
+        surface.fill(color, rect)
+    for _ in range(50):
+        color = (rnd.randrange(256), rnd.randrange(256), rnd.randrange(256))
+        center = (rnd.randrange(size[0]), rnd.randrange(size[1]))
+        pygame.draw.circle(surface, color, center, rnd.randrange(4, max(5, size[1] // 8)), rnd.randrange(1, 4))
+    return surface
+
+
+def get_error(reference, surface):
+    """
+    Return mean absolute difference of pixel channels (0-255) of two surfaces of the same size.
+    """
+    a = pygame.Surface(reference.get_size(), 0, 32)
+    a.blit(reference, (0, 0))
+    b = pygame.Surface(reference.get_size(), 0, 32)
+    b.blit(surface, (0, 0))
+    diff = a.copy()
+    diff.blit(b, (0, 0), special_flags=pygame.BLEND_SUB)
+    b.blit(a, (0, 0), special_flags=pygame.BLEND_SUB)
+    # one of saturated differences is zero, so their sum is absolute difference
+    diff.blit(b, (0, 0), special_flags=pygame.BLEND_ADD)
+    # average_color is rounded to integers, channels are summed exactly instead
+    width, height = diff.get_size()
+    return sum(pygame.image.tostring(diff, 'RGB')) / (width * height * 3)
+
+
+def calibrate(size, threshold=QUALITY_THRESHOLD):
+    """
+    Measure all backends on test image scaled to given size, return dict with name of the fastest
+    backend meeting the threshold and results (milliseconds and error) of all backends.
+    """
+    source = create_test_image((size[0] * CALIBRATION_RATIO, size[1] * CALIBRATION_RATIO))
+    reference = scale_smooth(source, size)
+    results = {}
+    for name, backend in sorted(BACKENDS.items()):
+        best = None
+        for _ in range(CALIBRATION_REPEAT):
+            start = time.perf_counter()
+            surface = backend(source, size)
+            elapsed = time.perf_counter() - start
+            best = elapsed if best is None else min(best, elapsed)
+        results[name] = {'ms': round(best * 1000, 1), 'error': round(get_error(reference, surface), 3)}
+    eligible = [name for name in results if results[name]['error'] <= threshold]
+    return {
+        'backend': min(eligible, key=lambda name: results[name]['ms']),
+        'results': results,
+    }
+
+
+class Scaler:
+    def __init__(self):
+        self.path = None
+        self.calibrated = {}  # display size (like "1920x1080") -> name of backend
+        self.lock = threading.Lock()
+
+    def set_cache(self, path):
+        """
+        Keep calibration results in given file.
+        """
+        self.path = path
+
+    def load_calibration(self, key):
+        if self.path is None:
+            return None
+        try:
+            with open(self.path) as f:
+                data = json.load(f)
+            if data['version'] != VERSION or data['pygame'] != pygame.version.ver:
+                return None
+            backend = data['sizes'][key]['backend']
+        except (OSError, ValueError, KeyError, TypeError):
+            return None
+        return backend if backend in BACKENDS else None
+
+    def save_calibration(self, key, calibration):
+        if self.path is None:
+            return
+        data = {'version': VERSION, 'pygame': pygame.version.ver, 'sizes': {}}
+        try:
+            with open(self.path) as f:
+                data['sizes'] = json.load(f)['sizes']
+        except (OSError, ValueError, KeyError, TypeError):
+            pass
+        data['sizes'][key] = calibration
+        tmppath = self.path + '.tmp'
+        try:
+            with open(tmppath, 'w') as f:
+                json.dump(data, f, indent=2, sort_keys=True)
+            os.replace(tmppath, self.path)
+        except OSError as e:
+            print('Unable to save scaler calibration: {}'.format(e), flush=True)
+
+    def get_auto_backend(self):
+        """
+        Return name of backend selected by calibration for current display (calibrate now if it
+        wasn't done yet).
+        """
+        screen = pygame.display.get_surface()
+        size = tuple(screen.get_size()) if screen is not None else (1920, 1080)
+        key = '{}x{}'.format(*size)
+        with self.lock:
+            backend = self.calibrated.get(key)
+            if backend is None:
+                backend = self.load_calibration(key)
+            if backend is None:
+                with tracer.span('scaler.calibrate'):
+                    calibration = calibrate((size[0] // 2, size[1] // 2))
+                backend = calibration['backend']
+                print('Scaler calibrated for {}: {} ({})'.format(key, backend, ', '.join(
+                    '{}={ms} ms/{error}'.format(name, **result)
+                    for name, result in sorted(calibration['results'].items()))), flush=True)
+                self.save_calibration(key, calibration)
+            self.calibrated[key] = backend
+        return backend
+
+    def get_backend(self, mode):
+        """
+        Return name of backend for given mode (names of backends are accepted as modes too).
+        """
+        if mode in BACKENDS:
+            return mode
+        if mode == 'fast':
+            return 'twopass'
+        if mode == 'auto':
+            return self.get_auto_backend()
+        return 'smooth'
+
+    def scale(self, surface, size, mode='quality'):
+        """
+        Return surface scaled to given size with backend selected by mode, in display pixel format
+        (if display is initialized).
+        """
+        size = (int(size[0]), int(size[1]))
+        backend = self.get_backend(mode)
+        with tracer.span('scaler.' + backend):
+            surface = BACKENDS[backend](surface, size)
+        return self.convert(surface)
+
+    def convert(self, surface):
+        """
+        Return surface in display pixel format (unchanged if display is not initialized).
+        """
+        if pygame.display.get_surface() is None:
+            return surface
+        with tracer.span('scaler.convert'):
+            return surface.convert()
+
+
+scaler = Scaler()
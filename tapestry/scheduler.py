@@ -0,0 +1,168 @@
+"""
+Event scheduler for main loops.
+
+Menu and Gallery don't poll keyboard in fixed frame rate, they sleep until something happen:
+button is pressed, timer (autoplay, source presence check) expire, or other thread post an event.
+
+`pygame.event.wait` is not used for sleeping, since SDL implement it by polling (every 1 ms in SDL2
+without native support in video driver, every 10 ms in SDL1.2) and pygame 1.9 doesn't support
+timeout. Instead, process sleeps in `select` on input devices (/dev/input/event*) and wakeup pipe,
+with timeout set to the nearest timer deadline. If input devices are not accessible, it falls back
+to sleeping in short intervals (still interrupted by wakeup pipe).
+
+Usage:
+    from tapestry import scheduler
+
+    scheduler.set_timer(EVENT_LONG_PRESS, 700)  # same semantics as pygame.time.set_timer
+    scheduler.set_deadline(EVENT_AUTOPLAY, t)   # post event once at given time.monotonic() value
+    events = scheduler.wait()                  # sleep until there are some events in pygame queue
+    scheduler.post(event)                      # thread safe post, wakes main loop
+"""
+
+import glob
+import os
+import selectors
+import threading
+import time
+
+import pygame
+
+
+class Scheduler:
+    # sleep interval when input devices are not available (ie. max input latency)
+    poll_interval = 0.05
+    # how long to wait for SDL to receive key event which woke us up through input device
+    input_grace = 0.02
+
+    def __init__(self):
+        self.timers = {}  # event type -> [deadline, interval], interval is None for one-shot timers
+        self.lock = threading.Lock()
+        self.selector = None
+        self.input_fds = []
+        self.wakeups = 0
+
+    def open(self):
+        """
+        Open input devices and wakeup pipe. Called lazily on first wait.
+        """
+        self.selector = selectors.DefaultSelector()
+        self.pipe = os.pipe()
+        os.set_blocking(self.pipe[0], False)
+        os.set_blocking(self.pipe[1], False)
+        self.selector.register(self.pipe[0], selectors.EVENT_READ)
+
+        for path in sorted(glob.glob('/dev/input/event*')):
+            try:
+                fd = os.open(path, os.O_RDONLY | os.O_NONBLOCK)
+            except OSError:
+                continue
+            self.input_fds.append(fd)
+            self.selector.register(fd, selectors.EVENT_READ)
+        print('Scheduler: {} input devices, {}'.format(
+            len(self.input_fds), 'select' if self.input_fds else 'fallback polling'), flush=True)
+
+    def set_timer(self, event_type, millis):
+        """
+        Post event of given type every `millis` milliseconds, value 0 disables timer.
+        """
+        with self.lock:
+            if millis:
+                self.timers[event_type] = [time.monotonic() + millis / 1000, millis / 1000]
+            else:
+                self.timers.pop(event_type, None)
+        self.wake()
+
+    def set_deadline(self, event_type, deadline):
+        """
+        Post event of given type once at absolute time (`time.monotonic`), None cancels it.
+        """
+        with self.lock:
+            if deadline is not None:
+                self.timers[event_type] = [deadline, None]
+            else:
+                self.timers.pop(event_type, None)
+        self.wake()
+
+    def fire_timers(self):
+        """
+        Post events of expired timers, return number of seconds to the nearest deadline (or None).
+        """
+        now = time.monotonic()
+        timeout = None
+        with self.lock:
+            for event_type, timer in list(self.timers.items()):
+                if timer[0] <= now:
+                    pygame.event.post(pygame.event.Event(event_type))
+                    if timer[1] is None:
+                        del self.timers[event_type]
+                        continue
+                    timer[0] = max(timer[0] + timer[1], now)
+                remaining = timer[0] - now
+                if timeout is None or remaining < timeout:
+                    timeout = remaining
+        return timeout
+
+    def post(self, event):
+        """
+        Post event into pygame queue and wake up main loop. Can be called from any thread.
+        """
+        pygame.event.post(event)
+        self.wake()
+
+    def wake(self):
+        if self.selector is not None:
+            try:
+                os.write(self.pipe[1], b'.')
+            except BlockingIOError:
+                pass
+
+    def drain(self, fd):
+        try:
+            while os.read(fd, 4096):
+                pass
+        except BlockingIOError:
+            pass
+
+    def wait(self):
+        """
+        Sleep until there are some events in pygame event queue, return them (like pygame.event.get).
+        """
+        if self.selector is None:
+            self.open()
+
+        while True:
+            self.wakeups += 1
+            timeout = self.fire_timers()
+            events = pygame.event.get()
+            if events:
+                return events
+
+            if not self.input_fds:
+                # wakeup pipe still interrupt the sleep, so events posted by threads aren't delayed
+                for key, _ in self.selector.select(self.poll_interval if timeout is None
+                                                   else min(timeout, self.poll_interval)):
+                    self.drain(key.fd)
+                continue
+
+            input_ready = False
+            for key, _ in self.selector.select(timeout):
+                self.drain(key.fd)
+                input_ready = input_ready or key.fd != self.pipe[0]
+
+            if input_ready:
+                # SDL read input by itself, give it a while to receive the same key press
+                deadline = time.monotonic() + self.input_grace
+                while time.monotonic() < deadline:
+                    events = pygame.event.get()
+                    if events:
+                        return events
+                    time.sleep(0.002)
+
+
+# shared scheduler instance for all main loops
+scheduler = Scheduler()
+
+set_timer = scheduler.set_timer
+set_deadline = scheduler.set_deadline
+post = scheduler.post
+wait = scheduler.wait
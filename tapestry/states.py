@@ -1,31 +1,112 @@
 import pygame
+import pygame.locals
+
+from . import scheduler
 
 STATE_BACK = 'back'
 STATE_NEXT = 'next'
 STATE_PREV = 'prev'
 STATE_ACTION = 'action'
+STATE_LONG_ACTION = 'long_action'
 STATE_MISSING_SOURCE = 'missing'
 STATE_QUIT = 'quit'
+STATE_SOURCE_MOUNTED = 'mounted'
+STATE_SOURCE_CHANGED = 'changed'
+STATE_SYNC = 'sync'
+STATE_AUTOPLAY = 'autoplay'
+STATE_AUTOPLAY_PREPARE = 'autoplay_prepare'
+STATE_ANIMATION = 'animation'
+
+# USEREVENT is deadline of the next autoplay flip in gallery (see autoplay module)
+EVENT_AUTOPLAY = pygame.USEREVENT
+# source directory events posted by watcher, attribute `action` is 'mount', 'unmount' or 'change'
+EVENT_SOURCE = pygame.USEREVENT + 1
+SOURCE_STATES = {
+    'mount': STATE_SOURCE_MOUNTED,
+    'unmount': STATE_MISSING_SOURCE,
+    'change': STATE_SOURCE_CHANGED,
+}
+# video player process exited (see player module), playback can't continue
+EVENT_PLAYER = pygame.USEREVENT + 2
+# `ok` button is held down long enough (long press)
+EVENT_LONG_PRESS = pygame.USEREVENT + 3
+LONG_PRESS_DELAY = 700
+# background job (like thumbnail generation) finished, it only wakes up main loop (no state)
+EVENT_REDRAW = pygame.USEREVENT + 4
+# commands from synchronization leader are waiting (see sync module)
+EVENT_SYNC = pygame.USEREVENT + 5
+# command from control API, attribute `state` is the state to be returned (see control module)
+EVENT_CONTROL = pygame.USEREVENT + 6
+# a while before autoplay deadline, next frame should be prepared
+EVENT_AUTOPLAY_PREPARE = pygame.USEREVENT + 7
+# next frame of animated GIF should be shown (deadline of its duration, or it was just decoded)
+EVENT_ANIMATION = pygame.USEREVENT + 8
+
+# `ok` button is down and its long press timer is running
+action_pressed = False
+# events taken from pygame queue after the one which produced last state, they are processed first next time
+pending_events = []
+
 
+def get_state(wait=False):
+    """
+    Return state according to events on keyboard and timers, or None if there is no such event.
+
+    If wait is True, sleep until some event arrive instead of returning immediately, so main loops
+    don't need to poll (see scheduler module).
+
+    `ok` button is reported when it is released (STATE_ACTION), or when it is held down for
+    LONG_PRESS_DELAY milliseconds (STATE_LONG_ACTION). Only one state is returned, events which
+    arrived together with it are kept for next calls (so autoplay deadline isn't lost when it
+    comes right after its preparation).
+    """
+    global action_pressed, pending_events
+    events = pending_events + pygame.event.get()
+    if wait and not events:
+        events = scheduler.wait()
 
-def get_state():
     state = None
-    for event in pygame.event.get():
+    pending_events = []
+    for i, event in enumerate(events):
         if event.type == pygame.locals.QUIT:
             state = STATE_QUIT
-        elif event.type == pygame.USEREVENT:
-            state = STATE_NEXT
+        elif event.type == EVENT_AUTOPLAY:
+            state = STATE_AUTOPLAY
+        elif event.type == EVENT_AUTOPLAY_PREPARE:
+            state = STATE_AUTOPLAY_PREPARE
+        elif event.type == EVENT_ANIMATION:
+            state = STATE_ANIMATION
+        elif event.type == EVENT_SOURCE:
+            state = SOURCE_STATES[event.action]
+        elif event.type == EVENT_PLAYER:
+            state = STATE_BACK
+        elif event.type == EVENT_SYNC:
+            state = STATE_SYNC
+        elif event.type == EVENT_CONTROL:
+            state = event.state
+        elif event.type == EVENT_LONG_PRESS:
+            scheduler.set_timer(EVENT_LONG_PRESS, 0)
+            if action_pressed:
+                action_pressed = False
+                state = STATE_LONG_ACTION
+        elif event.type == pygame.locals.KEYUP:
+            if event.key == pygame.K_SPACE and action_pressed:
+                scheduler.set_timer(EVENT_LONG_PRESS, 0)
+                action_pressed = False
+                state = STATE_ACTION
         elif event.type == pygame.locals.KEYDOWN:
             if event.key == pygame.K_0:
                 state = STATE_NEXT
             elif event.key == pygame.K_9:
                 state = STATE_PREV
             elif event.key == pygame.K_SPACE:
-                state = STATE_ACTION
+                scheduler.set_timer(EVENT_LONG_PRESS, LONG_PRESS_DELAY)
+                action_pressed = True
             elif event.key == pygame.K_ESCAPE:
                 state = STATE_QUIT
             elif event.key == pygame.K_q:
                 state = STATE_BACK
         if state is not None:
+            pending_events = events[i + 1:]
             break
     return state
@@ -0,0 +1,203 @@
+"""
+Synchronized slideshow of several devices.
+
+* Sync thread exchange messages with other devices over UDP multicast: leader announce which
+  image will be shown and when, followers estimate offset of leader's clock and show the same
+  image at the same moment
+
+Leader announce "show image N of gallery D at time T" `lead` seconds ahead, so followers (and
+leader itself) have time to prefetch the image and only flip the screen at time T. Followers
+estimate offset of leader's clock NTP-like: they periodically send ping, leader replies with its
+clock, offset is taken from the sample with the shortest round trip.
+
+Usage:
+    sync = Sync('leader', group='239.255.42.42', port=5042)
+    sync.start()
+    sync.announce('gallery', 5)          # leader only
+    ...
+    commands = sync.pop_commands()       # list of (action, dirname, index), action is 'prepare' or 'show'
+
+EVENT_SYNC is posted into pygame queue whenever there are new commands.
+"""
+
+import collections
+import heapq
+import json
+import os
+import select
+import socket
+import struct
+import threading
+import time
+
+import pygame
+
+from . import scheduler
+from .states import EVENT_SYNC
+
+GROUP = '239.255.42.42'
+PORT = 5042
+
+
+def clock():
+    return time.monotonic()
+
+
+class Sync(threading.Thread):
+    """
+    Background thread of leader or follower. Gallery directories are matched by name, images by
+    index (so the same content should be on all devices).
+    """
+    version = 1
+    # how long ahead leader announce next image
+    lead = 0.5
+    # how often follower measure clock offset
+    ping_interval = 2
+    # number of offset samples from which the best one is taken
+    samples = 8
+    max_commands = 16
+
+    def __init__(self, role, group=GROUP, port=PORT, interface='0.0.0.0'):
+        super().__init__(daemon=True)
+        if role not in ['leader', 'follower']:
+            raise ValueError('Unknown sync role {}'.format(role))
+        self.role = role
+        self.group = group
+        self.port = port
+        self.interface = interface
+        self.id = '{}-{}'.format(socket.gethostname(), os.getpid())
+        self.lock = threading.Lock()
+        self.commands = []
+        self.timers = []  # heap of (local time, dirname, index)
+        self.offsets = collections.deque(maxlen=self.samples)  # (round trip, offset)
+        self.offset = None  # leader clock - local clock
+        self.seq = 0
+        self.pipe = os.pipe()
+        self.sock = self.open_socket()
+
+    def open_socket(self):
+        sock = socket.socket(socket.AF_INET, socket.SOCK_DGRAM, socket.IPPROTO_UDP)
+        sock.setsockopt(socket.SOL_SOCKET, socket.SO_REUSEADDR, 1)
+        if hasattr(socket, 'SO_REUSEPORT'):
+            # more instances on one host (testing on localhost)
+            sock.setsockopt(socket.SOL_SOCKET, socket.SO_REUSEPORT, 1)
+        sock.bind(('', self.port))
+        membership = struct.pack('4s4s', socket.inet_aton(self.group), socket.inet_aton(self.interface))
+        sock.setsockopt(socket.IPPROTO_IP, socket.IP_ADD_MEMBERSHIP, membership)
+        sock.setsockopt(socket.IPPROTO_IP, socket.IP_MULTICAST_IF, socket.inet_aton(self.interface))
+        sock.setsockopt(socket.IPPROTO_IP, socket.IP_MULTICAST_TTL, 1)
+        sock.setsockopt(socket.IPPROTO_IP, socket.IP_MULTICAST_LOOP, 1)
+        return sock
+
+    def is_leader(self):
+        return self.role == 'leader'
+
+    def is_follower(self):
+        return self.role == 'follower'
+
+    def send(self, message):
+        message.update({'v': self.version, 'id': self.id})
+        try:
+            self.sock.sendto(json.dumps(message).encode('utf-8'), (self.group, self.port))
+        except OSError as e:
+            print('Sync: unable to send message: {}'.format(e), flush=True)
+
+    def pop_commands(self):
+        """
+        Return list of commands (action, dirname, index) received since last call and forget them.
+        """
+        with self.lock:
+            commands = self.commands
+            self.commands = []
+        return commands
+
+    def add_command(self, action, dirname, index):
+        with self.lock:
+            self.commands.append((action, dirname, index))
+            # nobody could be reading commands (menu is on screen), keep only recent ones
+            del self.commands[:-self.max_commands]
+        scheduler.post(pygame.event.Event(EVENT_SYNC))
+
+    def schedule(self, at, dirname, index):
+        """
+        Post 'show' command at given local time.
+        """
+        with self.lock:
+            heapq.heappush(self.timers, (at, dirname, index))
+        os.write(self.pipe[1], b'.')
+
+    def announce(self, dirname, index):
+        """
+        Leader: tell followers (and itself) to show given image `lead` seconds from now.
+        """
+        now = clock()
+        self.seq += 1
+        self.send({'type': 'show', 'seq': self.seq, 'dir': dirname, 'index': index, 'now': now, 'at': now + self.lead})
+        self.add_command('prepare', dirname, index)
+        self.schedule(now + self.lead, dirname, index)
+
+    def get_offset(self):
+        if not self.offsets:
+            return None
+        return min(self.offsets)[1]
+
+    def handle(self, message, received):
+        if message.get('v') != self.version or message.get('id') == self.id:
+            return
+        kind = message.get('type')
+        if self.is_leader():
+            if kind == 'ping':
+                self.send({'type': 'pong', 'to': message['id'], 't0': message['t0'], 't1': clock()})
+            return
+
+        if kind == 'pong' and message.get('to') == self.id:
+            rtt = received - message['t0']
+            self.offsets.append((rtt, message['t1'] - (message['t0'] + received) / 2))
+            self.offset = self.get_offset()
+        elif kind == 'show':
+            if self.offset is not None:
+                at = message['at'] - self.offset
+            else:
+                # offset not known yet, assume zero network latency
+                at = received + message['at'] - message['now']
+            self.add_command('prepare', message['dir'], message['index'])
+            self.schedule(at, message['dir'], message['index'])
+
+    def fire_timers(self):
+        """
+        Post due 'show' commands, return seconds to the next one (or None).
+        """
+        while True:
+            with self.lock:
+                if not self.timers:
+                    return None
+                at, dirname, index = self.timers[0]
+                remaining = at - clock()
+                if remaining > 0:
+                    return remaining
+                heapq.heappop(self.timers)
+            self.add_command('show', dirname, index)
+
+    def run(self):
+        print('Sync: {} in group {}:{}, id {}'.format(self.role, self.group, self.port, self.id), flush=True)
+        next_ping = clock()
+        while True:
+            timeout = self.fire_timers()
+            if self.is_follower():
+                now = clock()
+                if now >= next_ping:
+                    self.send({'type': 'ping', 't0': now})
+                    next_ping = now + self.ping_interval
+                timeout = min(timeout, next_ping - now) if timeout is not None else next_ping - now
+
+            ready, _, _ = select.select([self.sock, self.pipe[0]], [], [], timeout)
+            if self.pipe[0] in ready:
+                os.read(self.pipe[0], 4096)
+            if self.sock in ready:
+                data, _ = self.sock.recvfrom(65536)
+                received = clock()
+                try:
+                    message = json.loads(data.decode('utf-8'))
+                    self.handle(message, received)
+                except (ValueError, KeyError, TypeError) as e:
+                    print('Sync: invalid message: {}'.format(e), flush=True)
@@ -0,0 +1,156 @@
+"""
+Timing instrumentation of hot paths.
+
+* Tracer measure duration of named spans (stages of image rendering, menu rendering, directory
+  scanning), keep last spans in ring buffer and per-span histograms, and dump them into JSON file
+
+Tracing is disabled by default and disabled span cost only one method call, so instrumentation
+stays in production code. When enabled, timings are dumped into configured path on demand, on
+SIGUSR1 signal and at the end of program (root filesystem is read-only, use USB disk or tmpfs).
+
+Usage:
+    from tapestry.trace import tracer
+
+    with tracer.span('gallery.decode'):
+        img = load_image(path)
+
+    tracer.enable('/media/usb/cache/trace.json')   # start collecting, dump on SIGUSR1
+    tracer.dump()                                   # dump now
+
+    kill -USR1 $(pgrep -f tapestry.py)              # dump from shell
+"""
+
+import bisect
+import collections
+import json
+import os
+import signal
+import threading
+import time
+
+# upper bounds of histogram buckets in milliseconds, last bucket is for everything slower
+BUCKETS = [0.1, 0.25, 0.5, 1, 2.5, 5, 10, 25, 50, 100, 250, 500, 1000]
+
+
+class NullSpan:
+    """
+    Span of disabled tracer, does nothing.
+    """
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *args):
+        return False
+
+
+NULL_SPAN = NullSpan()
+
+
+class Span:
+    __slots__ = ('tracer', 'name', 'start')
+
+    def __init__(self, tracer, name):
+        self.tracer = tracer
+        self.name = name
+
+    def __enter__(self):
+        self.start = time.perf_counter()
+        return self
+
+    def __exit__(self, *args):
+        self.tracer.record(self.name, time.perf_counter() - self.start)
+        return False
+
+
+class Tracer:
+    """
+    Collector of span timings. Spans can be recorded from any thread.
+    """
+    capacity = 4096
+
+    def __init__(self):
+        self.enabled = False
+        self.path = None
+        self.spans = collections.deque(maxlen=self.capacity)  # (timestamp, name, milliseconds)
+        self.histograms = {}  # name -> {'count', 'total', 'max', 'buckets'}
+        # reentrant, signal handler could interrupt main thread while it is recording
+        self.lock = threading.RLock()
+
+    def enable(self, path, capacity=None):
+        """
+        Start collecting timings, dump them into given path on SIGUSR1.
+        """
+        self.path = path
+        if capacity:
+            self.spans = collections.deque(maxlen=capacity)
+        self.enabled = True
+        try:
+            signal.signal(signal.SIGUSR1, lambda signum, frame: self.dump())
+        except (ValueError, AttributeError):
+            # not in main thread or platform without SIGUSR1
+            pass
+        print('Tracing enabled, dump into {}'.format(path), flush=True)
+
+    def span(self, name):
+        """
+        Return context manager measuring duration of its block.
+        """
+        if not self.enabled:
+            return NULL_SPAN
+        return Span(self, name)
+
+    def record(self, name, seconds):
+        millis = seconds * 1000
+        bucket = bisect.bisect_left(BUCKETS, millis)
+        with self.lock:
+            self.spans.append((time.time(), name, millis))
+            histogram = self.histograms.get(name)
+            if histogram is None:
+                histogram = {'count': 0, 'total': 0, 'max': 0, 'buckets': [0] * (len(BUCKETS) + 1)}
+                self.histograms[name] = histogram
+            histogram['count'] += 1
+            histogram['total'] += millis
+            histogram['max'] = max(histogram['max'], millis)
+            histogram['buckets'][bucket] += 1
+
+    def snapshot(self, spans=True):
+        """
+        Return collected timings as JSON serializable dict (without last spans if `spans` is False).
+        """
+        with self.lock:
+            spans = list(self.spans) if spans else []
+            histograms = {}
+            for name, histogram in self.histograms.items():
+                histograms[name] = {
+                    'count': histogram['count'],
+                    'mean': round(histogram['total'] / histogram['count'], 3),
+                    'max': round(histogram['max'], 3),
+                    'buckets': list(histogram['buckets']),
+                }
+        return {
+            'buckets': BUCKETS + [None],
+            'histograms': histograms,
+            'spans': [{'at': round(at, 3), 'name': name, 'ms': round(millis, 3)} for at, name, millis in spans],
+        }
+
+    def dump(self, path=None):
+        """
+        Write collected timings into given (or configured) path.
+        """
+        path = path or self.path
+        if not self.enabled or not path:
+            return
+        tmppath = path + '.tmp'
+        try:
+            with open(tmppath, 'w') as f:
+                json.dump(self.snapshot(), f, indent=1)
+            os.replace(tmppath, path)
+        except OSError as e:
+            print('Unable to dump trace: {}'.format(e), flush=True)
+            return
+        print('Trace dumped into {}'.format(path), flush=True)
+
+
+# shared tracer instance
+tracer = Tracer()
@@ -0,0 +1,147 @@
+"""
+Animated transitions between gallery images.
+
+* Transition animate change of screen content from current frame to the next one (crossfade,
+  slide); all buffers are allocated once, so no memory is allocated during animation
+
+Crossfade has two backends (`transition_backend` option of gallery config):
+
+* `pygame` -- alpha blending by SDL blit (SIMD optimized), default since it is usually the fastest
+  one (compare them on the device by benchmarks/transition.py)
+* `numpy` -- blending computed by NumPy directly in 32 bit screen pixels (`pygame.surfarray`);
+  pixels are not split into channels, two 8 bit channels are blended at once in one 32 bit
+  integer (R+B and G+X lanes); used only if NumPy is installed and screen is 32 bit, otherwise
+  `pygame` backend is used
+
+Slide is plain blitting of both frames with offset, it is the same for both backends.
+
+Progress of animation is derived from elapsed time, so slow hardware simply drops frames and
+transition always takes configured duration.
+"""
+
+import time
+
+import pygame
+
+try:
+    import numpy
+    import pygame.surfarray
+except ImportError:
+    numpy = None
+
+
+class Transition:
+    """
+    Usage:
+        transition = Transition(screen, 'crossfade', 500, backend='numpy')
+        frame = transition.frame               # draw next screen content here
+        transition.run(direction=1)            # animate screen content into frame
+        print(transition.stats)
+
+    `stats` contain number of rendered frames, duration and achieved frame rate of last transition,
+    `backend` is crossfade backend really used.
+    """
+    # frame rate limit, there is no reason to render more frames than display can show
+    fps = 50
+    # lanes of 32 bit pixel blended together, (channel * 256) fit into 16 bit lane
+    lo_mask = 0x00ff00ff
+    hi_mask = 0xff00ff00
+
+    def __init__(self, screen, kind, duration, backend='pygame'):
+        self.screen = screen
+        self.kind = kind
+        self.duration = duration / 1000
+        self.stats = None
+
+        size = screen.get_size()
+        self.frame = pygame.Surface(size, 0, screen)
+        self.previous = pygame.Surface(size, 0, screen)
+
+        self.arrays = None
+        self.backend = 'pygame'
+        if kind == 'crossfade' and backend == 'numpy':
+            if numpy is None or screen.get_bytesize() != 4:
+                print('NumPy crossfade not available (NumPy missing or screen is not 32 bit), using pygame', flush=True)
+            else:
+                self.backend = 'numpy'
+                self.arrays = {}
+                for name in ['a_lo', 'a_hi', 'b_lo', 'b_hi', 'lo', 'hi', 'tmp']:
+                    self.arrays[name] = numpy.empty(size, dtype=numpy.uint32)
+
+    def run(self, direction=1):
+        """
+        Animate screen content into `frame`. Direction (1 or -1) matter for slide transition.
+        """
+        self.previous.blit(self.screen, (0, 0))
+        if self.kind == 'crossfade':
+            prepare, step = self.prepare_crossfade, self.step_crossfade
+        else:
+            prepare, step = None, self.step_slide
+
+        if prepare is not None:
+            prepare()
+
+        frames = 0
+        start = time.perf_counter()
+        while True:
+            progress = (time.perf_counter() - start) / self.duration
+            if progress >= 1:
+                break
+            step(progress, direction)
+            pygame.display.update()
+            frames += 1
+            # wait for next frame, slow hardware doesn't wait at all
+            remaining = start + frames / self.fps - time.perf_counter()
+            if remaining > 0:
+                time.sleep(max(0, min(remaining, start + self.duration - time.perf_counter())))
+
+        self.screen.blit(self.frame, (0, 0))
+        pygame.display.update()
+        elapsed = time.perf_counter() - start
+        self.stats = {'frames': frames, 'duration': elapsed, 'fps': frames / elapsed if elapsed else 0}
+
+    def prepare_crossfade(self):
+        """
+        Split pixels of previous (a) and next (b) frame into lanes.
+        """
+        if self.arrays is None:
+            return
+        for name, surface in [('a', self.previous), ('b', self.frame)]:
+            view = pygame.surfarray.pixels2d(surface)
+            numpy.bitwise_and(view, self.lo_mask, out=self.arrays[name + '_lo'])
+            numpy.right_shift(view, 8, out=self.arrays[name + '_hi'])
+            numpy.bitwise_and(self.arrays[name + '_hi'], self.lo_mask, out=self.arrays[name + '_hi'])
+            del view
+
+    def step_crossfade(self, progress, direction):
+        if self.arrays is None:
+            # pygame alpha blending fallback
+            self.screen.blit(self.previous, (0, 0))
+            self.frame.set_alpha(int(progress * 255))
+            self.screen.blit(self.frame, (0, 0))
+            self.frame.set_alpha(None)
+            return
+
+        # screen = (a * (256 - alpha) + b * alpha) / 256 for both lanes, in preallocated buffers
+        alpha = int(progress * 256)
+        arrays = self.arrays
+        lo, hi, tmp = arrays['lo'], arrays['hi'], arrays['tmp']
+        numpy.multiply(arrays['a_lo'], 256 - alpha, out=lo)
+        numpy.multiply(arrays['b_lo'], alpha, out=tmp)
+        numpy.add(lo, tmp, out=lo)
+        numpy.right_shift(lo, 8, out=lo)
+        numpy.bitwise_and(lo, self.lo_mask, out=lo)
+        numpy.multiply(arrays['a_hi'], 256 - alpha, out=hi)
+        numpy.multiply(arrays['b_hi'], alpha, out=tmp)
+        numpy.add(hi, tmp, out=hi)
+        numpy.bitwise_and(hi, self.hi_mask, out=hi)
+        view = pygame.surfarray.pixels2d(self.screen)
+        numpy.bitwise_or(lo, hi, out=view)
+        del view
+
+    def step_slide(self, progress, direction):
+        width = self.screen.get_width()
+        # ease out, movement slows down at the end
+        offset = int(width * (1 - (1 - progress) ** 2)) * direction
+        self.screen.blit(self.previous, (-offset, 0))
+        self.screen.blit(self.frame, (width * direction - offset, 0))
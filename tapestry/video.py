@@ -2,27 +2,54 @@ import os
 import re
 import pygame
 import pygame.locals
-import subprocess
+import time
 
-from .detective import get_entries, check_file
-from .states import STATE_BACK
+from .states import get_state, STATE_ACTION, STATE_BACK, STATE_LONG_ACTION, STATE_MISSING_SOURCE, STATE_NEXT, \
+    STATE_PREV, STATE_QUIT, STATE_SOURCE_CHANGED
 from .view import View
 
 
 class Video(View):
     """
-    Play first video in provided directory through mplayer.
+    Play all videos in provided directory as looping playlist through persistent player process
+    (see player module). Pygame display stays initialized, buttons are mapped to player commands:
+    `up/down` change volume, `ok` pause/play, `back` stop playback.
     """
     filename_re = re.compile(r'^[^.].+\.(mp4|avi|mpg|mpeg)$', re.IGNORECASE)
+    volume_step = 10
+
+    def play(self, player):
+        files = self.get_files()
+        if not len(files):
+            return False
+        print('Playing {} videos from {}'.format(len(files), self.dirpath), flush=True)
+        return player.play([os.path.join(self.dirpath, f) for f in files])
 
     def run(self):
-        files = self.filter_files(get_entries(self.dirpath, condition=check_file))
-        if len(files):
-            self.display.screen.fill((0, 0, 0))
-            pygame.display.quit()
+        player = self.display.player
+        self.display.screen.fill((0, 0, 0))
+        pygame.display.update()
+        if not self.play(player):
+            self.display.back_pressed_at = time.perf_counter()
+            return STATE_BACK
+
+        state = None
+        while state not in [STATE_QUIT, STATE_BACK, STATE_MISSING_SOURCE]:
+            self.display.set_status('video', dir=os.path.basename(os.path.abspath(self.dirpath)))
+            state = get_state(wait=True)
+            if state == STATE_PREV:
+                player.volume(self.volume_step)
+            elif state == STATE_NEXT:
+                player.volume(-self.volume_step)
+            elif state in [STATE_ACTION, STATE_LONG_ACTION]:
+                player.pause()
+            elif state == STATE_SOURCE_CHANGED:
+                changes = self.display.watcher.pop_changes()
+                if self.display.index is not None:
+                    self.display.index.invalidate(changes)
+                if os.path.abspath(self.dirpath) in changes and not self.play(player):
+                    state = STATE_BACK
 
-            # take first video file in directory and play it
-            videofile = os.path.join(self.dirpath, files[0])
-            subprocess.run(['mplayer', '-fs', '-vo', 'fbdev', videofile])
-        
-        return STATE_BACK
+        player.stop()
+        self.display.back_pressed_at = time.perf_counter()
+        return state
@@ -1,12 +1,36 @@
+import os
+
+from .detective import get_entries, check_file
+
+
 class View:
     filename_re = None
 
-    def __init__(self, dirpath, display, fps=50, sleep=3):
+    def __init__(self, dirpath, display, sleep=3):
         self.dirpath = dirpath
         self.display = display
-        self.fps = fps
         self.sleep = sleep
 
     @classmethod
     def filter_files(cls, files):
         return sorted([f for f in files if cls.filename_re.match(f)])
+
+    def get_record(self):
+        """
+        Return content index record of view directory, or None if there is no index.
+        """
+        index = self.display.index
+        if index is None:
+            return None
+        return index.get_dir(os.path.basename(self.dirpath)) or {'files': []}
+
+    def get_files(self):
+        """
+        Return sorted list of files in view directory, which are acceptable for view.
+        """
+        record = self.get_record()
+        if record is not None:
+            files = record['files']
+        else:
+            files = get_entries(self.dirpath, condition=check_file) or []
+        return self.filter_files(files)
@@ -0,0 +1,249 @@
+"""
+Watching of source directory.
+
+* Watcher thread detect (un)mounting of USB disk and changes in data directories and post
+  EVENT_SOURCE events into pygame queue, so menu and galleries can react immediately
+
+On Linux inotify is used for directory changes (source directory and all its subdirectories)
+and /proc/self/mounts is watched for mount table changes. Elsewhere (or if inotify is not
+available), source directory is polled in regular interval.
+"""
+
+import ctypes
+import ctypes.util
+import os
+import select
+import struct
+import threading
+import time
+
+import pygame
+
+from . import scheduler
+from .detective import check_dir, source_exist
+from .states import EVENT_SOURCE
+
+
+IN_MODIFY = 0x00000002
+IN_ATTRIB = 0x00000004
+IN_CLOSE_WRITE = 0x00000008
+IN_MOVED_FROM = 0x00000040
+IN_MOVED_TO = 0x00000080
+IN_CREATE = 0x00000100
+IN_DELETE = 0x00000200
+IN_DELETE_SELF = 0x00000400
+IN_MOVE_SELF = 0x00000800
+IN_UNMOUNT = 0x00002000
+IN_IGNORED = 0x00008000
+IN_ISDIR = 0x40000000
+
+WATCH_MASK = IN_CLOSE_WRITE | IN_MOVED_FROM | IN_MOVED_TO | IN_CREATE | IN_DELETE | IN_DELETE_SELF | \
+    IN_MOVE_SELF | IN_ATTRIB
+
+EVENT_HEADER = struct.Struct('iIII')  # wd, mask, cookie, len
+
+
+def get_inotify():
+    """
+    Return libc with inotify functions, or None if inotify is not available.
+    """
+    path = ctypes.util.find_library('c')
+    if path is None:
+        return None
+    try:
+        libc = ctypes.CDLL(path, use_errno=True)
+        libc.inotify_init1
+        libc.inotify_add_watch
+    except (OSError, AttributeError):
+        return None
+    return libc
+
+
+class Watcher(threading.Thread):
+    """
+    Background thread watching source directory.
+
+    Usage:
+        watcher = Watcher('/media/usb/data')
+        watcher.start()
+        ...
+        changes = watcher.pop_changes()  # set of directories changed since last call
+
+    Posted EVENT_SOURCE events have attribute `action` with value 'mount', 'unmount' or 'change'.
+    Changes are debounced, ie. copying of many files result in single event.
+    """
+    debounce = 0.5
+    poll_interval = 3
+
+    def __init__(self, dirpath):
+        super().__init__(daemon=True)
+        self.dirpath = os.path.abspath(dirpath)
+        self.changes = set()
+        self.lock = threading.Lock()
+        self.mounted = source_exist(self.dirpath)
+        self.watches = {}  # watch descriptor -> path
+        self.libc = get_inotify()
+
+    def pop_changes(self):
+        """
+        Return set of changed directories (absolute paths) and forget them.
+        """
+        with self.lock:
+            changes = self.changes
+            self.changes = set()
+        return changes
+
+    def post(self, action, paths=None):
+        if paths:
+            with self.lock:
+                self.changes.update(paths)
+        print('Source {}: {}'.format(action, ', '.join(sorted(paths)) if paths else self.dirpath), flush=True)
+        scheduler.post(pygame.event.Event(EVENT_SOURCE, action=action))
+
+    def set_mounted(self, mounted):
+        """
+        Post mount/unmount event if presence of source directory changed.
+        """
+        if mounted == self.mounted:
+            return
+        self.mounted = mounted
+        if mounted:
+            self.post('mount', [self.dirpath])
+        else:
+            self.post('unmount')
+
+    def run(self):
+        if self.libc is None:
+            print('Watcher: inotify not available, polling every {} s'.format(self.poll_interval), flush=True)
+            self.run_polling()
+            return
+        self.run_inotify()
+
+    # inotify
+
+    def add_watch(self, path):
+        wd = self.libc.inotify_add_watch(self.fd, os.fsencode(path), WATCH_MASK)
+        if wd >= 0:
+            self.watches[wd] = path
+
+    def add_watches(self):
+        """
+        Watch source directory and all its subdirectories (ie. galleries).
+        """
+        if not source_exist(self.dirpath):
+            return
+        self.add_watch(self.dirpath)
+        for entry in os.scandir(self.dirpath):
+            if check_dir(self.dirpath, entry.name):
+                self.add_watch(entry.path)
+
+    def read_events(self):
+        """
+        Read pending inotify events, return set of changed directories.
+        """
+        changed = set()
+        try:
+            data = os.read(self.fd, 64 * 1024)
+        except BlockingIOError:
+            return changed
+
+        offset = 0
+        while offset + EVENT_HEADER.size <= len(data):
+            wd, mask, _, length = EVENT_HEADER.unpack_from(data, offset)
+            name = data[offset + EVENT_HEADER.size:offset + EVENT_HEADER.size + length].rstrip(b'\0')
+            offset += EVENT_HEADER.size + length
+
+            path = self.watches.get(wd)
+            if path is None:
+                continue
+            if mask & (IN_IGNORED | IN_UNMOUNT):
+                self.watches.pop(wd, None)
+                if mask & IN_UNMOUNT:
+                    continue
+            changed.add(path)
+            if mask & IN_ISDIR and mask & (IN_CREATE | IN_MOVED_TO) and path == self.dirpath:
+                # new gallery directory
+                self.add_watch(os.path.join(path, os.fsdecode(name)))
+        return changed
+
+    def check_mounts(self):
+        """
+        Called when mount table changed or source directory disappeared.
+        """
+        mounted = source_exist(self.dirpath)
+        if mounted and not self.watches:
+            self.add_watches()
+        self.set_mounted(mounted)
+
+    def run_inotify(self):
+        self.fd = self.libc.inotify_init1(os.O_NONBLOCK | os.O_CLOEXEC)
+        if self.fd < 0:
+            self.run_polling()
+            return
+        self.add_watches()
+
+        poller = select.poll()
+        poller.register(self.fd, select.POLLIN)
+        try:
+            mounts = open('/proc/self/mounts')
+            poller.register(mounts.fileno(), select.POLLPRI | select.POLLERR)
+        except OSError:
+            mounts = None
+
+        pending = set()
+        deadline = None
+        while True:
+            timeout = None
+            if deadline is not None:
+                timeout = max(0, (deadline - time.monotonic()) * 1000)
+            elif mounts is None or not self.watches:
+                timeout = self.poll_interval * 1000
+
+            for fd, _ in poller.poll(timeout):
+                if fd == self.fd:
+                    pending.update(self.read_events())
+                    if deadline is None:
+                        deadline = time.monotonic() + self.debounce
+                elif mounts is not None and fd == mounts.fileno():
+                    mounts.seek(0)
+                    mounts.read()
+                    self.check_mounts()
+
+            if not self.watches or (mounts is None and deadline is None):
+                self.check_mounts()
+
+            if deadline is not None and time.monotonic() >= deadline:
+                deadline = None
+                if self.dirpath in pending and not source_exist(self.dirpath):
+                    pending.clear()
+                    self.check_mounts()
+                elif pending and self.mounted:
+                    self.post('change', pending)
+                pending = set()
+
+    # polling fallback
+
+    def snapshot(self):
+        """
+        Return dict {path: mtime} of source directory and its subdirectories.
+        """
+        out = {}
+        try:
+            out[self.dirpath] = os.stat(self.dirpath).st_mtime
+            for entry in os.scandir(self.dirpath):
+                if check_dir(self.dirpath, entry.name):
+                    out[entry.path] = entry.stat().st_mtime
+        except OSError:
+            pass
+        return out
+
+    def run_polling(self):
+        old = self.snapshot()
+        while True:
+            time.sleep(self.poll_interval)
+            self.set_mounted(source_exist(self.dirpath))
+            new = self.snapshot()
+            changed = set(p for p in new if old.get(p) != new[p]) | (set(old) - set(new))
+            if changed and self.mounted:
+                self.post('change', changed)
+            old = new
@@ -0,0 +1,204 @@
+"""
+Zoom-and-pan view of gallery image.
+
+* TilePyramid split image into 256 px tiles in several resolution levels (mipmaps), tiles are
+  created lazily, only when they become visible, and cached in memory (and in render cache)
+* Zoom show part of the image in one of pyramid levels, viewport moves over the image by half
+  of the screen in raster order (left to right, top to bottom)
+
+Level 0 is image in full resolution, every next level has half width and height. Source image is
+decoded only if some visible tile is not cached, so repeated zooming of the same image doesn't
+decode it at all (with render cache).
+"""
+
+import math
+import os
+
+import pygame
+
+from .trace import tracer
+
+TILE_SIZE = 256
+
+
+class TilePyramid:
+    """
+    Usage:
+        pyramid = TilePyramid(path, size, loader, cache, render_cache, background=(0, 0, 0))
+        pyramid.top                        # first level which fits into screen
+        pyramid.get_level_size(level)
+        tile = pyramid.get_tile(level, tx, ty)
+        pyramid.release()                  # forget decoded source image
+
+    `size` is size of level 0, `loader` is function returning source surface of this size (it
+    is called lazily). Source can be also provided directly, if it was already decoded.
+    `background` is only part of cache keys, loader compose transparent images onto it.
+    """
+
+    def __init__(self, path, size, screen_size, loader, cache, render_cache=None, source=None, background=None):
+        self.path = path
+        self.size = tuple(size)
+        self.loader = loader
+        self.cache = cache
+        self.render_cache = render_cache
+        self.source = source
+        self.background = background
+        try:
+            self.mtime = os.path.getmtime(path)
+        except OSError:
+            self.mtime = None
+
+        self.top = 0
+        while True:
+            width, height = self.get_level_size(self.top)
+            if width <= screen_size[0] and height <= screen_size[1]:
+                break
+            self.top += 1
+
+    def get_level_size(self, level):
+        scale = 2 ** level
+        return (math.ceil(self.size[0] / scale), math.ceil(self.size[1] / scale))
+
+    def get_source(self):
+        if self.source is None:
+            with tracer.span('zoom.decode'):
+                self.source = self.loader()
+        if self.source.get_bitsize() < 24:
+            # smoothscale need 24 or 32 bit surface
+            self.source = self.source.convert(24)
+        return self.source
+
+    def release(self):
+        self.source = None
+
+    def get_tile(self, level, tx, ty):
+        """
+        Return surface of given tile (from cache or freshly created from source image).
+        """
+        key = (self.path, self.mtime, self.size, self.background, level, tx, ty)
+        tile = self.cache.get(key)
+        if tile is not None:
+            return tile
+
+        disk_key = None
+        if self.render_cache is not None:
+            try:
+                disk_key = self.render_cache.get_key(self.path, extra=('tile', self.size, self.background, level, tx, ty))
+                tile = self.render_cache.get(disk_key)
+            except OSError:
+                disk_key = None
+        if tile is None:
+            with tracer.span('zoom.tile'):
+                tile = self.render_tile(level, tx, ty)
+            if disk_key is not None:
+                self.render_cache.put(disk_key, tile)
+        self.cache.put(key, tile)
+        return tile
+
+    def render_tile(self, level, tx, ty):
+        """
+        Cut tile area out of the source image and scale it down to level resolution.
+        """
+        source = self.get_source()
+        scale = 2 ** level
+        side = TILE_SIZE * scale
+        rect = pygame.Rect(tx * side, ty * side, side, side).clip(source.get_rect())
+        area = source.subsurface(rect)
+        if level == 0:
+            return area.copy()
+        return pygame.transform.smoothscale(area, (math.ceil(rect.width / scale), math.ceil(rect.height / scale)))
+
+
+class Zoom:
+    """
+    Usage:
+        zoom = Zoom(screen, pyramid, background)
+        zoom.render()
+        zoom.move(1)          # next viewport position (-1 previous)
+        zoom.cycle_level()    # zoom in, from full resolution back to the smallest zoom
+    """
+
+    def __init__(self, screen, pyramid, background):
+        self.screen = screen
+        self.pyramid = pyramid
+        self.background = background
+        self.level = pyramid.top - 1
+        self.positions = self.get_positions()
+        # start in the middle of the image
+        self.position = self.find_position(self.get_level_center())
+
+    @staticmethod
+    def get_axis(length, view):
+        """
+        Return viewport offsets along one axis, neighbours overlap by half of the viewport. Image
+        smaller than viewport is centered (ie. offset is negative).
+        """
+        if length <= view:
+            return [-((view - length) // 2)]
+        step = max(1, view // 2)
+        offsets = list(range(0, length - view, step))
+        offsets.append(length - view)
+        return offsets
+
+    def get_positions(self):
+        width, height = self.pyramid.get_level_size(self.level)
+        screen_width, screen_height = self.screen.get_size()
+        xs = self.get_axis(width, screen_width)
+        ys = self.get_axis(height, screen_height)
+        return [(x, y) for y in ys for x in xs]
+
+    def get_level_center(self):
+        width, height = self.pyramid.get_level_size(self.level)
+        return (width / 2, height / 2)
+
+    def get_center(self):
+        """
+        Return center of viewport in coordinates of current level.
+        """
+        x, y = self.positions[self.position]
+        screen_width, screen_height = self.screen.get_size()
+        return (x + screen_width / 2, y + screen_height / 2)
+
+    def find_position(self, center):
+        """
+        Return index of viewport position whose center is the nearest to given point.
+        """
+        screen_width, screen_height = self.screen.get_size()
+        distances = [((x + screen_width / 2 - center[0]) ** 2 + (y + screen_height / 2 - center[1]) ** 2, idx)
+                     for idx, (x, y) in enumerate(self.positions)]
+        return min(distances)[1]
+
+    def move(self, offset):
+        position = min(max(self.position + offset, 0), len(self.positions) - 1)
+        if position != self.position:
+            self.position = position
+            self.render()
+
+    def cycle_level(self):
+        """
+        Zoom in by one level, after full resolution start again from the smallest zoom. The same
+        point of image stays in the middle of the screen.
+        """
+        center = self.get_center()
+        level = self.level - 1 if self.level > 0 else self.pyramid.top - 1
+        scale = 2 ** (self.level - level)
+        self.level = level
+        self.positions = self.get_positions()
+        self.position = self.find_position((center[0] * scale, center[1] * scale))
+        self.render()
+
+    def render(self):
+        """
+        Draw visible tiles of current viewport and push them to display.
+        """
+        with tracer.span('zoom.render'):
+            x, y = self.positions[self.position]
+            screen_width, screen_height = self.screen.get_size()
+            width, height = self.pyramid.get_level_size(self.level)
+            self.screen.fill(self.background)
+            for ty in range(max(0, y) // TILE_SIZE, (min(height, y + screen_height) - 1) // TILE_SIZE + 1):
+                for tx in range(max(0, x) // TILE_SIZE, (min(width, x + screen_width) - 1) // TILE_SIZE + 1):
+                    tile = self.pyramid.get_tile(self.level, tx, ty)
+                    self.screen.blit(tile, (tx * TILE_SIZE - x, ty * TILE_SIZE - y))
+        with tracer.span('zoom.update'):
+            pygame.display.update()
@@ -0,0 +1,147 @@
+#!/usr/bin/env python3
+"""
+Fake video player speaking (subset of) mplayer slave protocol, for testing without mplayer and
+framebuffer.
+
+Player reads commands from stdin, prints mplayer-like messages and optionally logs every received
+command. Behaviour is scripted by environment variables:
+
+* `FAKE_MPLAYER_LOG` -- append received commands into this file (one per line)
+* `FAKE_MPLAYER_DURATION` -- duration of every "video" in seconds (default 5), after that next
+  file in playlist is played (or the same one again, if it is looped by `loop` command -- like
+  mplayer, loop applies to the current file, player goes idle after the last file)
+* `FAKE_MPLAYER_EXIT_AFTER` -- exit with code 1 after given number of seconds of playback,
+  simulating player crash
+
+Usage:
+    FAKE_MPLAYER_LOG=/tmp/player.log python3 tapestry.py /media/usb/data --player tools/fake_mplayer.py
+"""
+
+import os
+import select
+import shlex
+import sys
+import time
+
+
+class FakePlayer:
+    def __init__(self):
+        self.log_path = os.environ.get('FAKE_MPLAYER_LOG')
+        self.duration = float(os.environ.get('FAKE_MPLAYER_DURATION', 5))
+        exit_after = os.environ.get('FAKE_MPLAYER_EXIT_AFTER')
+        self.exit_after = float(exit_after) if exit_after else None
+        self.playlist = []
+        self.position = None
+        self.loop = -1  # loops of current file: -1 none, 0 forever, n times
+        self.paused_at = None
+        self.volume = 50
+        self.started = None  # start of playback of current file
+        self.playing_since = None  # start of playback of playlist
+
+    def log(self, cmd):
+        if self.log_path:
+            with open(self.log_path, 'a') as f:
+                f.write(cmd + '\n')
+
+    def out(self, msg):
+        print(msg, flush=True)
+
+    def play(self, position):
+        self.position = position
+        self.started = time.monotonic()
+        self.out('Playing {}.'.format(self.playlist[position]))
+
+    def stop(self):
+        self.playlist = []
+        self.position = None
+        self.playing_since = None
+        self.paused_at = None
+
+    def handle(self, line):
+        self.log(line)
+        args = shlex.split(line)
+        if not args:
+            return True
+        cmd, args = args[0], args[1:]
+        if cmd == 'pausing_keep' and args:
+            cmd, args = args[0], args[1:]
+
+        if cmd == 'loadfile':
+            if len(args) > 1 and args[1] == '1' and self.playlist:
+                self.playlist.append(args[0])
+            else:
+                self.playlist = [args[0]]
+                self.playing_since = time.monotonic()
+                self.paused_at = None
+                self.play(0)
+        elif cmd == 'loop':
+            self.loop = int(args[0])
+        elif cmd == 'volume':
+            value = float(args[0])
+            absolute = len(args) > 1 and args[1] == '1'
+            self.volume = max(0, min(100, value if absolute else self.volume + value))
+            self.out('ANS_volume={:.1f}'.format(self.volume))
+        elif cmd == 'pause':
+            if self.position is None:
+                pass
+            elif self.paused_at is None:
+                self.paused_at = time.monotonic()
+                self.out('  =====  PAUSE  =====')
+            else:
+                # paused time doesn't count into duration of video
+                self.started += time.monotonic() - self.paused_at
+                self.paused_at = None
+        elif cmd == 'stop':
+            self.stop()
+        elif cmd == 'quit':
+            return False
+        else:
+            self.out('Command {} not supported by fake player'.format(cmd))
+        return True
+
+    def tick(self):
+        """
+        Advance playlist according to wall clock.
+        """
+        if self.position is None:
+            return
+        now = time.monotonic()
+        if self.exit_after is not None and now - self.playing_since >= self.exit_after:
+            self.out('Fake player crashed')
+            sys.exit(1)
+        if self.paused_at is not None:
+            return
+        if now - self.started >= self.duration:
+            if self.loop >= 0:
+                if self.loop > 0:
+                    self.loop -= 1
+                    if self.loop == 0:
+                        self.loop = -1
+                self.play(self.position)
+                return
+            position = self.position + 1
+            if position >= len(self.playlist):
+                self.stop()
+                return
+            self.play(position)
+
+    def run(self):
+        self.out('MPlayer fake (slave mode), pid={}'.format(os.getpid()))
+        buffer = b''
+        running = True
+        while running:
+            ready, _, _ = select.select([sys.stdin], [], [], 0.1)
+            if ready:
+                data = os.read(sys.stdin.fileno(), 4096)
+                if not data:
+                    break
+                buffer += data
+                while running and b'\n' in buffer:
+                    line, buffer = buffer.split(b'\n', 1)
+                    running = self.handle(line.decode().strip())
+            self.tick()
+        self.out('Exiting... (Quit)')
+
+
+if __name__ == '__main__':
+    FakePlayer().run()